@@ -0,0 +1,138 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+asyncioランタイム for お世話ぬいぐるみプロジェクト
+ステータス出力・空腹度の減少・電圧チェックを1つのイベントループのタイマーで動かす
+NFCの読み取りはブロッキングなのでexecutorで動かし、タグ検知はループ側で処理する
+
+定期処理の予定時刻を共通の基準時刻からの間隔の倍数に揃えるので、
+同じ時刻に来る処理は1回の起床でまとめて実行される
+"""
+
+import math
+import time
+import asyncio
+import threading
+from typing import Callable, Union
+import config
+import event_log
+
+LOG = event_log.get_logger("runtime")
+
+
+class AsyncRuntime:
+    """1つのイベントループで全ての定期処理を動かすランタイム"""
+
+    def __init__(self, app, battery):
+        self.app = app
+        self.battery = battery
+        self.loop = None
+        self.wakeups = 0     # タイマーによる起床回数 (同時刻の処理はまとめて1回)
+        self.task_runs = {}  # 処理名 -> 実行回数
+        self._epoch = None
+        self._last_wakeup = None
+        self._started_at = None
+
+    def run(self):
+        """イベントループを開始 (app.stop()されるまで戻らない)"""
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self._epoch = self.loop.time()
+        self._started_at = time.monotonic()
+        # ミキサーの開き直しはイベントループのスレッドでやる
+        self.app.player.call_on_main = self.loop.call_soon_threadsafe
+
+        tasks = [
+            asyncio.create_task(self._periodic(
+                "status", config.STATUS_PRINT_INTERVAL, self._print_status)),
+            asyncio.create_task(self._periodic(
+                "decay", config.STATUS_DECAY_INTERVAL, self.app.decay_tick, immediate=False)),
+            # 電圧チェックの間隔は状態に応じて変わる
+            asyncio.create_task(self._periodic(
+                "battery", lambda: self.battery.interval, self.battery.check)),
+        ]
+        # タグ検知はイベントループのスレッドでon_tag_readを呼ぶ
+        reader = self.loop.run_in_executor(
+            None, self.app.reader.run, self._on_tag_from_reader, self._on_event_from_reader)
+        try:
+            await reader
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.app.player.call_on_main = None
+            self.app.stop()
+
+    def _on_tag_from_reader(self, uid: bytes):
+        if self.app.running:
+            self.loop.call_soon_threadsafe(self.app.on_tag_read, uid)
+
+    def _on_event_from_reader(self, event):
+        if self.app.running:
+            self.loop.call_soon_threadsafe(self.app.on_tag_event, event)
+
+    async def _periodic(self, name: str, interval: Union[float, Callable[[], float]],
+                        func: Callable[[], None], immediate: bool = True):
+        """intervalごとにfuncを呼ぶ
+
+        Args:
+            name: 処理名 (統計用)
+            interval: 間隔[秒] (毎回間隔を決める関数でもよい)
+            func: 呼び出す処理
+            immediate: Trueなら開始直後にも1回呼ぶ
+        """
+        get_interval = interval if callable(interval) else (lambda: interval)
+        when = self._epoch if immediate else self._epoch + get_interval()
+        while self.app.running:
+            await self._sleep_until(when)
+            if not self.app.running:
+                break
+            self.task_runs[name] = self.task_runs.get(name, 0) + 1
+            try:
+                func()
+            except Exception as e:
+                LOG.error("task_error", task=name, error=e)
+            when = self._next_deadline(get_interval())
+
+    def _next_deadline(self, interval: float) -> float:
+        # 基準時刻からintervalの倍数の時刻に揃え、他の処理と起床をまとめる
+        count = math.floor((self.loop.time() - self._epoch) / interval) + 1
+        return self._epoch + count * interval
+
+    async def _sleep_until(self, when: float):
+        future = self.loop.create_future()
+        handle = self.loop.call_at(when, self._wake, future, when)
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    def _wake(self, future, when: float):
+        if when != self._last_wakeup:
+            self._last_wakeup = when
+            self.wakeups += 1
+        if not future.done():
+            future.set_result(None)
+
+    def _print_status(self):
+        self.app.print_status()
+        if LOG.enabled(event_log.DEBUG):
+            stats = self.get_wakeup_stats()
+            LOG.debug("wakeups", per_min=stats['wakeups_per_min'],
+                      threads=threading.active_count(), **stats['task_runs'])
+
+    def get_wakeup_stats(self) -> dict:
+        """タイマーによる起床回数の統計
+
+        Returns:
+            dict: 起床回数・1分あたりの起床回数・処理ごとの実行回数
+        """
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        minutes = max(elapsed / 60.0, 1e-9)
+        return {
+            'wakeups': self.wakeups,
+            'wakeups_per_min': self.wakeups / minutes if elapsed else 0.0,
+            'task_runs': dict(self.task_runs),
+        }
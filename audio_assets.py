@@ -0,0 +1,95 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+音声アセットモジュール for お世話ぬいぐるみプロジェクト
+コンパイル済み音声(audio_compiler.py)のマニフェストを読み、再生するファイルを決める
+"""
+
+import json
+from pathlib import Path
+from typing import Optional
+import config
+
+_manifest = None
+
+
+def load_manifest(path: Path = config.AUDIO_MANIFEST_FILE) -> Optional[dict]:
+    """コンパイル済み音声のマニフェストを読み込む
+
+    Args:
+        path: マニフェストのパス
+
+    Returns:
+        dict or None: マニフェストがない・壊れている場合はNone
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def activate(mixer_init: Optional[tuple]) -> bool:
+    """ミキサーの出力形式と一致するコンパイル済み音声を有効にする
+
+    Args:
+        mixer_init: pygame.mixer.get_init() の戻り値 (周波数, サイズ, チャンネル数)
+
+    Returns:
+        bool: コンパイル済み音声を使うかどうか
+    """
+    global _manifest
+    _manifest = None
+    if not config.USE_COMPILED_AUDIO or not mixer_init:
+        return False
+    manifest = load_manifest()
+    if manifest is None:
+        return False
+    fmt = manifest.get("format", {})
+    if (fmt.get("frequency"), fmt.get("size"), fmt.get("channels")) != tuple(mixer_init):
+        if config.DEBUG:
+            print(f"コンパイル済み音声の形式がミキサーと異なるため使用しません: {fmt}")
+        return False
+    _manifest = manifest
+    if config.DEBUG:
+        print(f"コンパイル済み音声: {len(manifest.get('clips', {}))}件")
+    return True
+
+
+def resolve(audio_file: str) -> Path:
+    """再生に使う音声ファイルのパスを取得
+
+    Args:
+        audio_file: AUDIO_DIRからの相対パス
+
+    Returns:
+        Path: コンパイル済みがあればそのパス、なければ元のパス
+    """
+    if _manifest is not None:
+        clip = _manifest["clips"].get(audio_file)
+        if clip is not None:
+            return config.AUDIO_COMPILED_DIR / clip["file"]
+    return config.AUDIO_DIR / audio_file
+
+
+def get_clip_info(audio_file: str) -> Optional[dict]:
+    """マニフェストに記録された音声の情報を取得
+
+    Returns:
+        dict or None: 長さ・バイト数・チェックサムなど
+    """
+    if _manifest is None:
+        return None
+    return _manifest["clips"].get(audio_file)
+
+
+def resolve_tail(audio_file: str) -> Optional[Path]:
+    """先頭を除いた残りの部分 (ストリーミング用) のパスを取得
+
+    Returns:
+        Path or None: コンパイル時に書き出していなければNone
+    """
+    clip = get_clip_info(audio_file)
+    if clip is None or not clip.get("tail"):
+        return None
+    return config.AUDIO_COMPILED_DIR / clip["tail"]
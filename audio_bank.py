@@ -0,0 +1,246 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+音声バンクモジュール for お世話ぬいぐるみプロジェクト
+全音声の生PCMを1つのファイルにまとめ、mmapして音声ごとのファイルI/Oなしで読み込む
+
+ファイル形式 (リトルエンディアン):
+    ヘッダ  : マジック(8) バージョン(u32) 周波数(i32) サイズ(i32) チャンネル数(u32)
+              件数(u32) データ開始位置(u64) 索引CRC32(u32)
+    索引    : 名前長(u16) 名前(UTF-8) オフセット(u64) 長さ(u64) CRC32(u32) を件数分
+    データ  : ページ境界から各音声のPCMを16バイト境界で並べる
+
+    python audio_bank.py build   # バンクを作成
+    python audio_bank.py verify  # バンクを検査
+"""
+
+import os
+import sys
+import mmap
+import zlib
+import struct
+import argparse
+from pathlib import Path
+from typing import Optional
+import config
+
+BANK_MAGIC = b"TCBANK\x00\x01"
+BANK_VERSION = 1
+HEADER = struct.Struct("<8sIiiIIQI")
+ENTRY = struct.Struct("<QQI")
+NAME_LEN = struct.Struct("<H")
+DATA_ALIGN = 16
+
+
+class BankError(Exception):
+    """音声バンクが壊れている・形式が合わない"""
+
+
+def _align(value: int, alignment: int) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+
+def build_bank(path: Path = config.AUDIO_BANK_FILE) -> dict:
+    """設定で参照している全音声から音声バンクを作成
+
+    Args:
+        path: 書き出すバンクのパス
+
+    Returns:
+        dict: 件数・サイズなどの概要
+    """
+    import audio_compiler
+
+    fmt = audio_compiler.mixer_format()
+    clips = []
+    for audio_file in config.get_all_audio_files():
+        if not (config.AUDIO_DIR / audio_file).exists():
+            print(f"[SKIP] 音声ファイルが見つかりません: {audio_file}")
+            continue
+        frames, _ = audio_compiler.load_pcm(audio_file, fmt)
+        clips.append((audio_file.encode("utf-8"), frames))
+
+    index_size = sum(NAME_LEN.size + len(name) + ENTRY.size for name, _ in clips)
+    data_start = _align(HEADER.size + index_size, mmap.PAGESIZE)
+    index = bytearray()
+    offsets = []
+    offset = data_start
+    for name, frames in clips:
+        index += NAME_LEN.pack(len(name)) + name
+        index += ENTRY.pack(offset, len(frames), zlib.crc32(frames))
+        offsets.append(offset)
+        offset = _align(offset + len(frames), DATA_ALIGN)
+
+    header = HEADER.pack(BANK_MAGIC, BANK_VERSION, fmt["frequency"], fmt["size"],
+                         fmt["channels"], len(clips), data_start, zlib.crc32(index))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(index)
+        for (_, frames), offset in zip(clips, offsets):
+            f.seek(offset)
+            f.write(frames)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+    return {"clips": len(clips), "bytes": path.stat().st_size}
+
+
+class AudioBank:
+    """mmapした音声バンク"""
+
+    def __init__(self, path: Path = config.AUDIO_BANK_FILE):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # 空ファイル
+            self._file.close()
+            raise BankError(f"音声バンクが空です: {self.path}")
+        self.entries = {}  # 名前 -> (オフセット, 長さ, CRC32)
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self):
+        if len(self._mm) < HEADER.size:
+            raise BankError("ヘッダが不完全です")
+        (magic, version, frequency, size, channels,
+         count, data_start, index_crc) = HEADER.unpack_from(self._mm, 0)
+        if magic != BANK_MAGIC or version != BANK_VERSION:
+            raise BankError("音声バンクの形式が違います")
+        self.format = (frequency, size, channels)
+
+        entries = {}
+        pos = HEADER.size
+        try:
+            for _ in range(count):
+                (name_len,) = NAME_LEN.unpack_from(self._mm, pos)
+                pos += NAME_LEN.size
+                name = self._mm[pos:pos + name_len].decode("utf-8")
+                pos += name_len
+                entries[name] = ENTRY.unpack_from(self._mm, pos)
+                pos += ENTRY.size
+        except (struct.error, UnicodeDecodeError):
+            raise BankError("索引が壊れています")
+        if pos > data_start or zlib.crc32(self._mm[HEADER.size:pos]) != index_crc:
+            raise BankError("索引が壊れています")
+        for name, (offset, length, _) in entries.items():
+            if offset < data_start or offset + length > len(self._mm):
+                raise BankError(f"索引が範囲外です: {name}")
+        self.entries = entries
+
+    def __contains__(self, audio_file: str) -> bool:
+        return audio_file in self.entries
+
+    def get_buffer(self, audio_file: str) -> memoryview:
+        """音声のPCMをコピーせずに参照
+
+        Args:
+            audio_file: AUDIO_DIRからの相対パス
+
+        Returns:
+            memoryview: mmap上のPCM (使い終わったらrelease()すること)
+        """
+        offset, length, _ = self.entries[audio_file]
+        return memoryview(self._mm)[offset:offset + length]
+
+    def get_sound(self, audio_file: str):
+        """バンクのPCMからSoundを作成
+
+        Args:
+            audio_file: AUDIO_DIRからの相対パス
+
+        Returns:
+            pygame.mixer.Sound: デコード済みの音声
+        """
+        import pygame
+
+        with self.get_buffer(audio_file) as view:
+            return pygame.mixer.Sound(buffer=view)
+
+    def verify(self) -> list:
+        """全音声のCRC32を検査
+
+        Returns:
+            list: CRCが一致しなかった音声名
+        """
+        broken = []
+        for name, (_, _, crc) in self.entries.items():
+            with self.get_buffer(name) as view:
+                if zlib.crc32(view) != crc:
+                    broken.append(name)
+        return broken
+
+    def close(self):
+        """mmapとファイルを閉じる"""
+        self._mm.close()
+        self._file.close()
+
+
+def open_bank(mixer_init: Optional[tuple],
+              path: Path = config.AUDIO_BANK_FILE) -> Optional[AudioBank]:
+    """ミキサーの出力形式と一致する音声バンクを開く
+
+    Args:
+        mixer_init: pygame.mixer.get_init() の戻り値
+        path: バンクのパス
+
+    Returns:
+        AudioBank or None: 使えるバンクがなければNone
+    """
+    if not config.USE_AUDIO_BANK or not mixer_init or not Path(path).exists():
+        return None
+    try:
+        bank = AudioBank(path)
+    except (OSError, BankError) as e:
+        if config.DEBUG:
+            print(f"音声バンクを開けません: {e}")
+        return None
+    if bank.format != tuple(mixer_init):
+        if config.DEBUG:
+            print(f"音声バンクの形式がミキサーと異なるため使用しません: {bank.format}")
+        bank.close()
+        return None
+    if config.AUDIO_BANK_VERIFY:
+        broken = bank.verify()
+        if broken:
+            if config.DEBUG:
+                print(f"音声バンクが壊れています: {broken}")
+            bank.close()
+            return None
+    if config.DEBUG:
+        print(f"音声バンク: {len(bank.entries)}件 ({bank.path})")
+    return bank
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="音声バンクの作成・検査")
+    parser.add_argument("command", choices=("build", "verify"))
+    parser.add_argument("--path", type=Path, default=config.AUDIO_BANK_FILE,
+                        help="音声バンクのパス")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        summary = build_bank(args.path)
+        print(f"{summary['clips']}件 {summary['bytes'] // 1024}KB -> {args.path}")
+        return 0
+
+    try:
+        bank = AudioBank(args.path)
+    except (OSError, BankError) as e:
+        print(f"[NG] {e}")
+        return 1
+    broken = bank.verify()
+    bank.close()
+    for name in broken:
+        print(f"[NG] CRC不一致: {name}")
+    print(f"{'[NG]' if broken else '[OK]'} {len(bank.entries)}件 形式={bank.format}")
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
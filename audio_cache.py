@@ -0,0 +1,145 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+音声キャッシュモジュール for お世話ぬいぐるみプロジェクト
+デコード済みの音声(pygame.mixer.Sound)をメモリ上に保持する
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+import pygame
+import config
+import audio_assets
+
+
+def load_sound(audio_file: str):
+    """音声ファイルをデコードしてSoundを作成 (コンパイル済みがあればそちら)
+
+    Args:
+        audio_file: AUDIO_DIRからの相対パス
+
+    Returns:
+        pygame.mixer.Sound: デコード済みの音声
+    """
+    return pygame.mixer.Sound(str(audio_assets.resolve(audio_file)))
+
+
+def sound_nbytes(sound) -> int:
+    """Soundが占有するおおよそのバイト数を取得"""
+    frequency, fmt, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * frequency) * channels * (abs(fmt) // 8)
+
+
+class AudioCache:
+    """容量上限付きLRU音声キャッシュ"""
+
+    def __init__(self, max_bytes: int = config.AUDIO_CACHE_MAX_BYTES,
+                 loader: Callable[[str], object] = load_sound):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._sounds = OrderedDict()  # audio_file -> (sound, nbytes)
+        self._lock = threading.Lock()
+        self._preload_thread = None
+
+    def get(self, audio_file: str):
+        """キャッシュから音声を取得
+
+        Args:
+            audio_file: AUDIO_DIRからの相対パス
+
+        Returns:
+            pygame.mixer.Sound or None: キャッシュにない場合はNone
+        """
+        with self._lock:
+            entry = self._sounds.get(audio_file)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._sounds.move_to_end(audio_file)
+            self.hits += 1
+            return entry[0]
+
+    def load(self, audio_file: str) -> bool:
+        """音声をデコードしてキャッシュに追加
+
+        Args:
+            audio_file: AUDIO_DIRからの相対パス
+
+        Returns:
+            bool: キャッシュに格納できたかどうか
+        """
+        with self._lock:
+            if audio_file in self._sounds:
+                return True
+        try:
+            sound = self.loader(audio_file)
+            nbytes = sound_nbytes(sound)
+        except Exception as e:
+            if config.DEBUG:
+                print(f"キャッシュ読み込みエラー: {audio_file}: {e}")
+            return False
+        if nbytes > self.max_bytes:
+            return False
+
+        with self._lock:
+            if audio_file in self._sounds:
+                return True
+            # 上限を超える分だけ古いものから追い出す
+            while self._sounds and self.total_bytes + nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._sounds.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+                self.evictions += 1
+            self._sounds[audio_file] = (sound, nbytes)
+            self.total_bytes += nbytes
+        return True
+
+    def preload(self, audio_files: Iterable[str], background: bool = True):
+        """音声をまとめて先読み
+
+        Args:
+            audio_files: 先読みする音声ファイルのリスト
+            background: Trueならバックグラウンドスレッドで読み込む
+        """
+        audio_files = list(audio_files)
+        if not background:
+            self._preload(audio_files)
+            return
+        self._preload_thread = threading.Thread(
+            target=self._preload,
+            args=(audio_files,),
+            daemon=True
+        )
+        self._preload_thread.start()
+
+    def _preload(self, audio_files):
+        loaded = sum(1 for audio_file in audio_files if self.load(audio_file))
+        if config.DEBUG:
+            print(f"音声キャッシュ: {loaded}/{len(audio_files)}件を先読み "
+                  f"({self.total_bytes // 1024}KB)")
+
+    def clear(self):
+        """キャッシュを空にする"""
+        with self._lock:
+            self._sounds.clear()
+            self.total_bytes = 0
+
+    def get_stats(self) -> dict:
+        """キャッシュの統計情報を取得
+
+        Returns:
+            dict: ヒット数・ミス数・使用量などの統計
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._sounds),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+            }
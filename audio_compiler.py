@@ -0,0 +1,257 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+音声コンパイラ for お世話ぬいぐるみプロジェクト
+config.pyで参照している音声をミキサーの出力形式に変換し、前後の無音を削って
+AUDIO_COMPILED_DIR に書き出す。長さ・サイズ・チェックサムはマニフェストに記録する
+長い音声は先頭を除いた残り (tail) も書き出し、先頭だけ常駐・残りはストリーミングで再生できるようにする
+
+    python audio_compiler.py [--force]
+"""
+
+import sys
+import json
+import wave
+import hashlib
+import argparse
+import warnings
+from pathlib import Path
+import config
+import audio_policy
+import mixer_profile
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:  # Python 3.13以降は標準ライブラリから削除
+    audioop = None
+
+MANIFEST_VERSION = 1
+
+
+def sha256_file(path: Path) -> str:
+    """ファイルのSHA-256を計算"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def convert(frames: bytes, width: int, channels: int, rate: int,
+            out_width: int, out_channels: int, out_rate: int) -> bytes:
+    """PCMを指定の形式に変換
+
+    Args:
+        frames: 入力PCM
+        width, channels, rate: 入力のバイト幅・チャンネル数・周波数
+        out_width, out_channels, out_rate: 出力の形式
+
+    Returns:
+        bytes: 変換後のPCM
+    """
+    if width == 1:
+        # 8bit WAVは符号なしなので符号付きに直す
+        frames = audioop.bias(frames, 1, -128)
+    if width != out_width:
+        frames = audioop.lin2lin(frames, width, out_width)
+    if channels == 2 and out_channels == 1:
+        frames = audioop.tomono(frames, out_width, 0.5, 0.5)
+    elif channels == 1 and out_channels == 2:
+        frames = audioop.tostereo(frames, out_width, 1.0, 1.0)
+    elif channels != out_channels:
+        raise ValueError(f"未対応のチャンネル数: {channels} -> {out_channels}")
+    if rate != out_rate:
+        frames, _ = audioop.ratecv(frames, out_width, out_channels, rate, out_rate, None)
+    if out_width == 1:
+        frames = audioop.bias(frames, 1, 128)
+    return frames
+
+
+def trim_silence(frames: bytes, width: int, channels: int, rate: int,
+                 threshold: int = config.SILENCE_THRESHOLD,
+                 padding_ms: int = config.SILENCE_PADDING_MS) -> bytes:
+    """前後の無音を削る
+
+    Args:
+        frames: 符号付きPCM
+        width, channels, rate: PCMの形式
+        threshold: 無音とみなす振幅 (16bit換算)
+        padding_ms: 音の前後に残す余白[ミリ秒]
+
+    Returns:
+        bytes: 無音を削ったPCM (全体が無音なら元のまま)
+    """
+    frame_size = width * channels
+    window = max(1, rate // 100) * frame_size  # 10ms単位で判定
+    scaled = threshold * (1 << (8 * width)) // (1 << 16)
+    starts = range(0, len(frames), window)
+    loud = [i for i in starts if audioop.max(frames[i:i + window], width) > scaled]
+    if not loud:
+        return frames
+    padding = (rate * padding_ms // 1000) * frame_size
+    begin = max(0, loud[0] - padding)
+    end = min(len(frames), loud[-1] + window + padding)
+    return frames[begin:end]
+
+
+def mixer_format() -> dict:
+    """設定されたミキサーの出力形式 (校正したプロファイルがあればその周波数)"""
+    settings = mixer_profile.output_settings()
+    return {
+        "frequency": settings["frequency"],
+        "size": settings["size"],
+        "channels": settings["channels"],
+    }
+
+
+def load_pcm(audio_file: str, fmt: dict):
+    """音声を読み込んで出力形式のPCMに変換し、前後の無音を削る
+
+    Args:
+        audio_file: AUDIO_DIRからの相対パス
+        fmt: 出力形式 (frequency, size, channels)
+
+    Returns:
+        tuple: (PCM, 無音カット前のバイト数)
+    """
+    if audioop is None:
+        raise RuntimeError("audioopが使えないため音声を変換できません")
+    with wave.open(str(config.AUDIO_DIR / audio_file), "rb") as w:
+        width, channels, rate = w.getsampwidth(), w.getnchannels(), w.getframerate()
+        frames = w.readframes(w.getnframes())
+
+    out_width = abs(fmt["size"]) // 8
+    frames = convert(frames, width, channels, rate,
+                     out_width, fmt["channels"], fmt["frequency"])
+    before = len(frames)
+    if out_width > 1:
+        frames = trim_silence(frames, out_width, fmt["channels"], fmt["frequency"])
+    return frames, before
+
+
+def write_wav(path: Path, frames: bytes, fmt: dict):
+    """PCMをWAVとして書き出す (一時ファイルに書いてから置き換える)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with wave.open(str(tmp), "wb") as w:
+        w.setsampwidth(abs(fmt["size"]) // 8)
+        w.setnchannels(fmt["channels"])
+        w.setframerate(fmt["frequency"])
+        w.writeframes(frames)
+    tmp.replace(path)
+
+
+def compile_clip(audio_file: str, out_dir: Path, fmt: dict) -> dict:
+    """1つの音声を変換して書き出す
+
+    Args:
+        audio_file: AUDIO_DIRからの相対パス
+        out_dir: 出力先ディレクトリ
+        fmt: 出力形式 (frequency, size, channels)
+
+    Returns:
+        dict: マニフェストに記録する情報
+    """
+    src = config.AUDIO_DIR / audio_file
+    frames, before = load_pcm(audio_file, fmt)
+    out_width = abs(fmt["size"]) // 8
+
+    dst = out_dir / audio_file
+    write_wav(dst, frames, fmt)
+
+    frame_size = out_width * fmt["channels"]
+    duration = round(len(frames) / frame_size / fmt["frequency"], 4)
+    # 長い音声は先頭の終わり少し前から始まる残りを別に書き出す
+    # (再生時は先頭が終わる前にストリーミングで鳴らし始め、重なった分をクロスフェードする)
+    head = audio_policy.head_seconds(duration)
+    tail = tail_offset = None
+    if head is not None:
+        tail = Path(audio_file).with_suffix(".tail.wav").as_posix()
+        tail_offset = _tail_offset(head, fmt)
+        offset = int(round(tail_offset * fmt["frequency"])) * frame_size
+        write_wav(out_dir / tail, frames[offset:], fmt)
+    return {
+        "file": audio_file,
+        "duration": duration,
+        "head_seconds": head,
+        "tail": tail,
+        "tail_offset": tail_offset,
+        "bytes": dst.stat().st_size,
+        "pcm_bytes": len(frames),
+        "trimmed_bytes": before - len(frames),
+        "sha256": sha256_file(dst),
+        "source_sha256": sha256_file(src),
+    }
+
+
+def _tail_offset(head: float, fmt: dict) -> float:
+    """残りを書き出し始める位置[秒] (フレーム境界に揃える)"""
+    frames = int(audio_policy.tail_offset(head) * fmt["frequency"])
+    return round(frames / fmt["frequency"], 6)
+
+
+def compile_all(out_dir: Path = config.AUDIO_COMPILED_DIR, force: bool = False) -> dict:
+    """設定で参照している全音声をコンパイルしてマニフェストを書き出す
+
+    Args:
+        out_dir: 出力先ディレクトリ
+        force: Trueなら変更のない音声も作り直す
+
+    Returns:
+        dict: 書き出したマニフェスト
+    """
+    if audioop is None:
+        raise RuntimeError("audioopが使えないため音声をコンパイルできません")
+
+    fmt = mixer_format()
+    manifest_path = out_dir / config.AUDIO_MANIFEST_FILE.name
+    old = {}
+    if manifest_path.exists() and not force:
+        with open(manifest_path, encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous.get("format") == fmt and previous.get("version") == MANIFEST_VERSION:
+            old = previous.get("clips", {})
+
+    clips = {}
+    for audio_file in config.get_all_audio_files():
+        src = config.AUDIO_DIR / audio_file
+        if not src.exists():
+            print(f"[SKIP] 音声ファイルが見つかりません: {src}")
+            continue
+        entry = old.get(audio_file)
+        if (entry and (out_dir / entry["file"]).exists()
+                and entry.get("head_seconds") == audio_policy.head_seconds(entry["duration"])
+                and (not entry.get("tail") or ((out_dir / entry["tail"]).exists()
+                     and entry.get("tail_offset") == _tail_offset(entry["head_seconds"], fmt)))
+                and entry["source_sha256"] == sha256_file(src)):
+            clips[audio_file] = entry
+            continue
+        clips[audio_file] = compile_clip(audio_file, out_dir, fmt)
+        print(f"[BUILD] {audio_file} ({clips[audio_file]['duration']}秒)")
+
+    manifest = {"version": MANIFEST_VERSION, "format": fmt, "clips": clips}
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    tmp.replace(manifest_path)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="音声をミキサーの出力形式にコンパイル")
+    parser.add_argument("--force", action="store_true", help="すべての音声を作り直す")
+    parser.add_argument("--out", type=Path, default=config.AUDIO_COMPILED_DIR,
+                        help="出力先ディレクトリ")
+    args = parser.parse_args(argv)
+
+    manifest = compile_all(args.out, force=args.force)
+    total = sum(clip["bytes"] for clip in manifest["clips"].values())
+    print(f"{len(manifest['clips'])}件 {total // 1024}KB -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
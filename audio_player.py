@@ -7,29 +7,284 @@
 
 import os
 import time
+import contextlib
+import functools
+import itertools
+import wave
+import heapq
 import threading
+from collections import deque
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 import pygame
 import config
+import audio_assets
+import audio_policy
+import metrics
+import event_log
+import mixer_profile
+from audio_bank import open_bank
+from audio_cache import AudioCache, load_sound
+from clip_selector import RingBuffer
+
+
+AUDIO_LOAD_SECONDS = metrics.histogram(
+    "audio_load_seconds", "音声の読み込み (デコード・ストリーミング準備) にかかった時間")
+AUDIO_UNDERRUNS = metrics.counter(
+    "audio_underruns_total", "鳴り終わりが音声の長さより遅れた (出力が途切れた) 回数")
+LOG = event_log.get_logger("audio")
+
+
+class PlaybackEventDispatcher:
+    """再生終了イベントを1本の常駐スレッドで処理するディスパッチャ
+
+    pygame.mixer.music.set_endevent / Channel.set_endevent で通知される
+    イベントを受け取り、登録されたハンドラを呼び出す
+
+    pygame.event.wait() は SDL の中で1ミリ秒ごとに起きるので使わない。
+    再生を始めた側が arm() で鳴り終わる見込みの時刻を渡し、スレッドはその時刻まで眠ってから
+    イベントを取り出す。何も鳴っていない間は起きない
+
+    終了イベントはSDLのキューに積まれるだけで、このスレッドを起こす手段がない
+    (待てるのは pygame.event.wait() だけ)。そのため次の場合だけ
+    AUDIO_END_POLL_INTERVAL ごとにキューを確かめる:
+        - 長さが分からない音声 (マニフェストになく、WAVでもないもの)
+        - 見込みの時刻を過ぎてもまだ鳴っている時 (出力が途切れて遅れた時など)
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._handlers = {}
+        self._ready = threading.Event()
+        self._thread = None
+        self._cond = threading.Condition()
+        self._deadlines = []  # イベントを確かめる時刻 (ヒープ)
+        self._timers = []  # (呼ぶ時刻, 順番, 関数) のヒープ (call_later)
+        self._timer_seq = itertools.count()
+        # イベントの取り出し・再生中かの確認の間はミキサーを開き直させない (paused() を参照)
+        self._mixer_lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> 'PlaybackEventDispatcher':
+        """プロセス共通のディスパッチャを取得 (初回に起動)"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+                cls._instance._start()
+            return cls._instance
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._run,
+            name="audio-events",
+            daemon=True
+        )
+        self._thread.start()
+        self._ready.wait(timeout=5.0)
+
+    def register(self, handler: Callable[[], None]) -> int:
+        """ハンドラを登録してイベント種別を払い出す
+
+        Args:
+            handler: イベント受信時に呼ぶ関数
+
+        Returns:
+            int: set_endevent に渡すイベント種別
+        """
+        event_type = pygame.event.custom_type()
+        self._handlers[event_type] = handler
+        pygame.event.set_allowed(event_type)
+        return event_type
+
+    def arm(self, duration: float = 0.0):
+        """再生を始めたので、鳴り終わる頃に起きるようにする
+
+        Args:
+            duration: 鳴り終わるまでの見込み[秒] (分からなければ0。その間は短い間隔で確かめる)
+        """
+        deadline = time.monotonic() + max(0.0, duration) + config.AUDIO_END_POLL_INTERVAL
+        with self._cond:
+            heapq.heappush(self._deadlines, deadline)
+            if self._deadlines[0] == deadline:
+                self._cond.notify()
+
+    def wake(self):
+        """今すぐイベントを確かめる (終了を知っている側から呼ぶ。ベンチマーク用の偽のミキサーなど)"""
+        with self._cond:
+            heapq.heappush(self._deadlines, time.monotonic())
+            self._cond.notify()
+
+    def call_later(self, delay: float, func: Callable[[], None]):
+        """delay秒後にスレッドから func を呼ぶ (長い音声の残りを先頭が終わる前に鳴らし始める時など)"""
+        due = time.monotonic() + max(0.0, delay)
+        with self._cond:
+            heapq.heappush(self._timers, (due, next(self._timer_seq), func))
+            heapq.heappush(self._deadlines, due)
+            if self._deadlines[0] == due:
+                self._cond.notify()
+
+    @contextlib.contextmanager
+    def paused(self):
+        """ミキサーを開き直す間、スレッドがミキサーに触らないようにする
+
+        ハンドラの呼び出し中は持たないので、プレイヤーのロックを持ったまま使ってよい
+        """
+        with self._mixer_lock:
+            yield
+
+    def _sleep_until_due(self):
+        with self._cond:
+            while True:
+                if not self._deadlines:
+                    self._cond.wait()  # 何も鳴っていない
+                    continue
+                delay = self._deadlines[0] - time.monotonic()
+                if delay <= 0:
+                    return
+                self._cond.wait(delay)
+
+    def _run(self):
+        # pygame.eventの利用にはビデオの初期化が必要 (ヘッドレスではダミー)
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        pygame.display.init()
+        # 登録したイベント以外はキューに溜めない
+        pygame.event.set_blocked(None)
+        self._ready.set()
+        while True:
+            self._sleep_until_due()
+            # 取り出した後に積まれた時刻 (wake() など) は消さずに残す
+            checked = time.monotonic()
+            with self._cond:
+                due = []
+                while self._timers and self._timers[0][0] <= checked:
+                    due.append(heapq.heappop(self._timers)[2])
+            for func in due:
+                try:
+                    func()
+                except Exception as e:
+                    LOG.error("timer_error", error=e)
+            try:
+                with self._mixer_lock:
+                    events = pygame.event.get()
+                for event in events:
+                    handler = self._handlers.get(event.type)
+                    if handler is None:
+                        continue
+                    try:
+                        handler()
+                    except Exception as e:
+                        LOG.error("end_event_error", error=e)
+                with self._mixer_lock:
+                    busy = pygame.mixer.get_init() is not None and (
+                        pygame.mixer.get_busy() or pygame.mixer.music.get_busy())
+            except Exception as e:
+                # pygameのエラーでスレッドを終わらせない (少し後にまた確かめる)
+                LOG.error("dispatch_error", error=e)
+                events, busy = (), True
+            now = time.monotonic()
+            with self._cond:
+                while self._deadlines and self._deadlines[0] <= checked:
+                    heapq.heappop(self._deadlines)
+                if events or (busy and not self._deadlines):
+                    # ハンドラが続きを鳴らし始めた時や、見込みより長く鳴っている時は少し後にまた確かめる
+                    heapq.heappush(self._deadlines, now + config.AUDIO_END_POLL_INTERVAL)
+
 
 class AudioPlayer:
     """音声再生クラス"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[AudioCache] = None,
+                 on_finished: Optional[Callable[[str], None]] = None,
+                 channels: tuple = (0, 1), pan: Optional[float] = None,
+                 streaming: bool = True):
+        """
+        Args:
+            cache: 音声キャッシュ (省略時は新しく作る。複数台モードでは全員で共有する)
+            on_finished: 再生が最後まで終わった時に呼ぶ関数
+            channels: (メイン, 重ねて再生用) に使うミキサーのチャンネル番号
+            pan: 左右の振り分け (-1.0=左〜1.0=右、Noneなら振り分けない。ステレオ出力時のみ)
+            streaming: Falseならキャッシュにない音声もデコードしてチャンネルで再生する
+                (musicのストリーミングはプロセスに1本しかないため、複数台モードではFalse)
+        """
         self.current_audio = None
         self.is_playing = False
-        self.play_thread = None
-        self.play_history = []
+        self.play_history = RingBuffer(config.PLAY_HISTORY_SIZE)
+        self.volume = config.AUDIO_VOLUME
+        # 再生が最後まで終わった時に音声ファイル名を渡して呼ばれる
+        self.on_finished = on_finished
+        # 重ねて再生した音声 (play_overlay) が終わった時に呼ばれる
+        self.on_overlay_finished: Optional[Callable[[str], None]] = None
+        self.overlay_audio = None
+        self.is_overlay_playing = False
+        self._duck = 1.0  # ダッキング中の音量の倍率
+        self.pan = pan
+        self.streaming = streaming
+        self._source = None  # "music" or "channel"
+        # 長い音声は先頭だけデコードしておき、鳴らし終わったら残りをストリーミングで続ける
+        self._heads = {}  # 音声ファイル -> (先頭のSound, 残りのパス, 重なっている長さ[秒])
+        self._head_bytes = 0
+        self._durations = {}  # コンパイルしていない音声の長さ[秒] (終了を確かめる時刻の見込み用)
+        self._streamed = set()  # 長いがコンパイル済みの残りがないので、全体をストリーミングする音声
+        self._tail = None  # 先頭を再生中の音声の、次に鳴らす残りのパス
+        self._generation = 0  # 再生するたびに増やす (前の音声のタイマーを読み捨てる)
+        self._expected_end = None  # チャンネルで鳴らしている音声が鳴り終わるはずの時刻
+        self._underrun_times = deque()
+        self.underruns = 0
+        self._fallback_buffer = None  # 切り替え待ちのバッファサイズ
+        # ミキサーを開き直す処理をメイン (ランタイム) のスレッドで呼ぶ関数
+        # (ディスパッチャのスレッドからミキサーを閉じないため。Noneなら次の起動から反映する)
+        self.call_on_main: Optional[Callable[[Callable[[], None]], None]] = None
+        self._lock = threading.RLock()
+
+        # PyGameを初期化 (コンパイル済み音声と同じ形式なら再生時の変換が不要)
+        # 校正したプロファイルがあれば、その周波数・バッファサイズで初期化する
+        # 複数台モードでは先に初期化したミキサーを共有する
+        settings = mixer_profile.output_settings()
+        self.mixer_buffer = settings["buffer"]
+        self._owns_mixer = pygame.mixer.get_init() is None
+        if self._owns_mixer:
+            pygame.mixer.init(**settings)
+        audio_assets.activate(pygame.mixer.get_init())
+        # 音声バンクがあればmmapして、音声ごとのファイルI/Oなしで読み込む
+        self.bank = open_bank(pygame.mixer.get_init())
 
-        # PyGameを初期化
-        pygame.mixer.init()
-        self.set_volume(config.AUDIO_VOLUME)
+        # 再生終了はポーリングせずミキサーのイベントで受け取る
+        dispatcher = PlaybackEventDispatcher.get()
+        self._dispatcher = dispatcher
+        self._music_event = (dispatcher.register(lambda: self._on_playback_end("music"))
+                             if self.streaming else None)
+        self._channel_event = dispatcher.register(lambda: self._on_playback_end("channel"))
+        self._overlay_event = dispatcher.register(self._on_overlay_end)
+        self._channel_ids = channels
+        self._open_channels()
+
+        # 音声キャッシュ (ミス時は従来どおりストリーミング再生)
+        self.cache = cache
+        self._known_paths = {}  # 音声ファイル -> 確認済みの再生パス
+        if self.cache is None and config.AUDIO_CACHE_ENABLED:
+            self.cache = AudioCache(config.AUDIO_CACHE_MAX_BYTES, loader=self.load_sound)
 
         
         if config.DEBUG:
             print("音声バックエンド: Pygame")
         
+    def _open_channels(self):
+        """再生用のチャンネルを確保して終了イベントを設定 (ミキサーを開き直した時も呼ぶ)"""
+        # キャッシュ済み音声の再生用と、重ねて再生する用にチャンネルを確保
+        reserved = max(self._channel_ids) + 1
+        if pygame.mixer.get_num_channels() < reserved:
+            pygame.mixer.set_num_channels(reserved)
+        pygame.mixer.set_reserved(reserved)
+        self.channel = pygame.mixer.Channel(self._channel_ids[0])
+        self.overlay_channel = pygame.mixer.Channel(self._channel_ids[1])
+        self.set_volume(self.volume)
+        if self._music_event is not None:
+            pygame.mixer.music.set_endevent(self._music_event)
+        self.channel.set_endevent(self._channel_event)
+        self.overlay_channel.set_endevent(self._overlay_event)
+
     def set_volume(self, volume: float):
         """音量を設定 (0.0〜1.0)
         
@@ -38,18 +293,153 @@ class AudioPlayer:
         """
         # 0.0〜1.0の範囲に制限
         volume = max(0.0, min(1.0, volume))
-        pygame.mixer.music.set_volume(volume)
+        self.volume = volume
+        self._apply_volume()
+        self._set_channel_volume(self.overlay_channel, volume)
         
         if config.DEBUG:
             print(f"音量設定: {volume}")
     
+    def _apply_volume(self):
+        volume = self.volume * self._duck
+        if self.streaming:
+            pygame.mixer.music.set_volume(volume)
+        self._set_channel_volume(self.channel, volume)
+
+    def _set_channel_volume(self, channel, volume: float):
+        if self.pan is None:
+            channel.set_volume(volume)
+        else:
+            # 左右の音量で振り分ける (複数のぬいぐるみのスピーカーを左右に繋ぐ時)
+            channel.set_volume(volume * min(1.0, 1.0 - self.pan),
+                               volume * min(1.0, 1.0 + self.pan))
+
+    def duck(self, level: float):
+        """メインの音声の音量を一時的に下げる
+
+        Args:
+            level: 元の音量に対する倍率 (0.0〜1.0)
+        """
+        self._duck = max(0.0, min(1.0, level))
+        self._apply_volume()
+
+    def unduck(self):
+        """duck() で下げた音量を元に戻す"""
+        self._duck = 1.0
+        self._apply_volume()
+
     def get_volume(self) -> float:
         """現在の音量を取得
         
         Returns:
             float: 現在の音量 (0.0〜1.0)
         """
-        return pygame.mixer.music.get_volume()
+        return self.volume
+
+    def preload(self, audio_files=None, background: bool = True):
+        """音声をキャッシュに先読み
+
+        Args:
+            audio_files: 先読みする音声ファイルのリスト (省略時は設定の全音声)
+            background: Trueならバックグラウンドで読み込む
+        """
+        if audio_files is None:
+            audio_files = config.get_all_audio_files()
+        if self.streaming:
+            # 長い音声 (HYBRID) は全体をキャッシュしない。コンパイル済みの残りがあれば先頭だけ読んでおき、
+            # なければ全体をストリーミングで鳴らす
+            resident = []
+            for audio_file in audio_files:
+                plan = audio_policy.plan_clip(audio_file)
+                if plan is None or plan.mode == audio_policy.RESIDENT:
+                    resident.append(audio_file)
+                elif not self._load_head(audio_file):
+                    self._streamed.add(audio_file)
+            audio_files = resident
+            if config.DEBUG and (self._heads or self._streamed):
+                print(f"長い音声: 先頭のみ {len(self._heads)}件 ({self._head_bytes // 1024}KB)"
+                      f"、ストリーミング {len(self._streamed)}件")
+        if self.cache is None:
+            return
+        self.cache.preload(audio_files, background=background)
+
+    def _load_head(self, audio_file: str) -> bool:
+        """長い音声の先頭をデコードしておく
+
+        Returns:
+            bool: 先頭と残りに分けて再生する音声かどうか
+        """
+        if audio_file in self._heads:
+            return True
+        tail = audio_assets.resolve_tail(audio_file)
+        if tail is None or not tail.exists():
+            return False
+        nbytes = audio_policy.head_bytes(audio_assets.get_clip_info(audio_file)["head_seconds"])
+        try:
+            if self.bank is not None and audio_file in self.bank:
+                with self.bank.get_buffer(audio_file) as view, view[:nbytes] as head:
+                    sound = pygame.mixer.Sound(buffer=head)
+            else:
+                # コンパイル済みのWAVはミキサーの出力形式なのでそのまま使える
+                with wave.open(str(audio_assets.resolve(audio_file)), "rb") as w:
+                    frames = w.readframes(nbytes // (w.getsampwidth() * w.getnchannels()))
+                sound = pygame.mixer.Sound(buffer=frames)
+        except Exception as e:
+            LOG.warn("head_load_error", file=audio_file, error=e)
+            return False
+        info = audio_assets.get_clip_info(audio_file)
+        offset = info.get("tail_offset")
+        overlap = 0.0 if offset is None else max(0.0, info["head_seconds"] - offset)
+        self._heads[audio_file] = (sound, tail, overlap)
+        self._head_bytes += nbytes
+        return True
+
+    def register_known_files(self, audio_files) -> list:
+        """再生する音声のパスを先に解決・確認しておく (再生時のファイル確認を省く)
+
+        Args:
+            audio_files: AUDIO_DIRからの相対パスのリスト
+
+        Returns:
+            list: 見つからなかった音声ファイル
+        """
+        missing = []
+        for audio_file in audio_files:
+            audio_path = audio_assets.resolve(audio_file)
+            if audio_path.exists():
+                self._known_paths[audio_file] = audio_path
+            else:
+                missing.append(audio_file)
+        return missing
+
+    def load_sound(self, audio_file: str):
+        """音声をデコードしてSoundを作成 (音声バンクにあればそこから)
+
+        Args:
+            audio_file: AUDIO_DIRからの相対パス
+
+        Returns:
+            pygame.mixer.Sound: デコード済みの音声
+        """
+        started = time.perf_counter()
+        if self.bank is not None and audio_file in self.bank:
+            sound = self.bank.get_sound(audio_file)
+        else:
+            sound = load_sound(audio_file)
+        AUDIO_LOAD_SECONDS.observe(time.perf_counter() - started)
+        return sound
+
+    def get_cache_stats(self) -> Optional[dict]:
+        """音声キャッシュの統計情報を取得
+
+        Returns:
+            dict or None: キャッシュ無効時はNone
+        """
+        if self.cache is None:
+            return None
+        stats = self.cache.get_stats()
+        stats['head_bytes'] = self._head_bytes
+        return stats
     
 
     def play(self, audio_file: str) -> bool:
@@ -61,66 +451,255 @@ class AudioPlayer:
         Returns:
             bool: 再生開始に成功したかどうか
         """
+        with self._lock:
+            return self._play(audio_file)
+
+    def _play(self, audio_file: str) -> bool:
         # 既に再生中なら停止
         self.stop()
-        
-        # 音声ファイルのパスを取得
-        audio_path = config.AUDIO_DIR / audio_file
-        
-        # ファイルが存在するか確認
-        if not audio_path.exists():
-            if config.DEBUG:
-                print(f"エラー: 音声ファイルが見つかりません: {audio_path}")
-            return False
+
+        # 長い音声は先頭から、短い音声はキャッシュにあればファイルを確認せずにそのまま再生
+        head = self._heads.get(audio_file) if self.streaming else None
+        sound = None
+        if head is None and self.cache and audio_file not in self._streamed:
+            sound = self.cache.get(audio_file)
+
+        # 音声ファイルのパスを取得 (起動時に確認済みならファイルを見に行かない)
+        audio_path = None
+        if sound is None and head is None:
+            audio_path = self._known_paths.get(audio_file)
+            if audio_path is None:
+                # コンパイル済みがあればそちら
+                audio_path = audio_assets.resolve(audio_file)
+                # ファイルが存在するか確認
+                if not audio_path.exists():
+                    LOG.warn("file_missing", path=audio_path)
+                    return False
         
         self.is_playing = True
         self.current_audio = audio_file
         self.play_history.append(audio_file) 
-        if config.DEBUG:
-            print(f"再生: {audio_file}")
+        LOG.debug("play", file=audio_file, cached=sound is not None, head=head is not None)
         try:
-            # PyGameで再生
-            pygame.mixer.music.load(str(audio_path))
-            pygame.mixer.music.play()
-            
-            # 再生完了を監視するスレッドを開始
-            self.play_thread = threading.Thread(
-                target=self._pygame_wait_done, 
-                daemon=True
-            )
-            self.play_thread.start()
+            if head is not None:
+                # 先頭をすぐ鳴らし、その間に残りのストリーミングを準備する
+                self._source = "channel"
+                self.channel.play(head[0])
+                self._expected_end = time.monotonic() + head[0].get_length()
+                self._dispatcher.arm(head[0].get_length())
+                started = time.perf_counter()
+                pygame.mixer.music.load(str(head[1]))
+                AUDIO_LOAD_SECONDS.observe(time.perf_counter() - started)
+                self._tail = head[1]
+                # 終了イベントを待つと継ぎ目が途切れるので、先頭が終わる少し前に残りを鳴らし始める
+                self._generation += 1
+                self._dispatcher.call_later(
+                    head[0].get_length() - head[2],
+                    functools.partial(self._start_tail, self._generation, head[2]))
+                return True
+            if sound is None and not self.streaming:
+                # ストリーミングを使わない時は、その場でデコードしてチャンネルで再生
+                sound = self.load_sound(audio_file)
+            if sound is not None:
+                self._source = "channel"
+                self.channel.play(sound)
+                self._expected_end = time.monotonic() + sound.get_length()
+                self._dispatcher.arm(sound.get_length())
+            else:
+                # PyGameでストリーミング再生
+                self._source = "music"
+                started = time.perf_counter()
+                pygame.mixer.music.load(str(audio_path))
+                AUDIO_LOAD_SECONDS.observe(time.perf_counter() - started)
+                pygame.mixer.music.play()
+                self._dispatcher.arm(self._stream_seconds(audio_file))
             return True
            
         except Exception as e:
-            if config.DEBUG:
-                print(f"再生エラー: {e}")
+            LOG.warn("play_error", file=audio_file, error=e)
             self.is_playing = False
             self.current_audio = None
+            self._tail = None
             return False
         
         
         
+    def play_overlay(self, audio_file: str) -> bool:
+        """メインの音声を止めずに、別チャンネルで重ねて再生
+
+        Args:
+            audio_file: 再生する音声ファイル名
+
+        Returns:
+            bool: 再生開始に成功したかどうか
+        """
+        with self._lock:
+            # チャンネル再生にはデコード済みの音声が必要
+            sound = self.cache.get(audio_file) if self.cache else None
+            try:
+                if sound is None:
+                    sound = self.load_sound(audio_file)
+                self.is_overlay_playing = True
+                self.overlay_audio = audio_file
+                self.play_history.append(audio_file)
+                LOG.debug("play_overlay", file=audio_file)
+                self.overlay_channel.play(sound)
+                self._dispatcher.arm(sound.get_length())
+                return True
+            except Exception as e:
+                LOG.warn("play_error", file=audio_file, error=e)
+                self.is_overlay_playing = False
+                self.overlay_audio = None
+                return False
+
+    def _on_overlay_end(self):
+        with self._lock:
+            if not self.is_overlay_playing or self.overlay_channel.get_busy():
+                return
+            finished = self.overlay_audio
+            self.is_overlay_playing = False
+            self.overlay_audio = None
+            if self._fallback_buffer is not None and not self.is_playing:
+                self.call_on_main(self.apply_fallback)
+        if self.on_overlay_finished:
+            self.on_overlay_finished(finished)
+
     def stop(self):
         """現在再生中の音声を停止"""
-        if not self.is_playing:
+        with self._lock:
+            if not self.is_playing:
+                return
+
+            # 再生停止 (停止による終了イベントは_on_playback_endで読み捨てる)
+            self.is_playing = False
+            self.current_audio = None
+            self._tail = None
+            if self._source == "music":
+                pygame.mixer.music.stop()
+                # 残りに切り替えた直後は、先頭がまだフェードアウトしている
+                self.channel.stop()
+            else:
+                self.channel.stop()
+            self._source = None
+
+    def _on_playback_end(self, source: str):
+        """再生終了イベントの処理 (ディスパッチャのスレッドから呼ばれる)"""
+        with self._lock:
+            if not self.is_playing or self._source != source:
+                return
+            # 停止済みの前の音声のイベントなら、今の音声はまだ再生中
+            busy = (pygame.mixer.music.get_busy() if source == "music"
+                    else self.channel.get_busy())
+            if busy:
+                return
+            if source == "channel" and self._expected_end is not None:
+                self._check_underrun(time.monotonic() - self._expected_end)
+                self._expected_end = None
+            if self._tail is not None:
+                # 先頭を鳴らし終わったので、準備しておいた残りを続けて鳴らす
+                self._tail = None
+                try:
+                    pygame.mixer.music.play()
+                    self._source = "music"
+                    self._dispatcher.arm(self._stream_seconds(self.current_audio, tail=True))
+                    return
+                except Exception as e:
+                    LOG.warn("play_error", file=self.current_audio, error=e)
+            finished = self.current_audio
+            self.is_playing = False
+            self._source = None
+            if self._fallback_buffer is not None:
+                # 前に頼んだ時は鳴っていて開き直せなかったので、もう一度頼む
+                self.call_on_main(self.apply_fallback)
+            elif len(self._underrun_times) >= config.MIXER_UNDERRUN_LIMIT:
+                self._fall_back()
+        if self.on_finished:
+            self.on_finished(finished)
+
+    def _start_tail(self, generation: int, overlap: float):
+        """先頭が終わる直前に残りを鳴らし始め、重なった分をクロスフェードする (ディスパッチャのスレッドから呼ばれる)"""
+        with self._lock:
+            if generation != self._generation or self._tail is None or self._source != "channel":
+                return  # 止められた、または先頭の終了イベントで鳴らし始めた後
+            self._tail = None
+            fade_ms = int(overlap * 1000)
+            try:
+                pygame.mixer.music.play(fade_ms=fade_ms)
+            except Exception as e:
+                # 先頭が鳴り終わったところで終わりにする
+                LOG.warn("play_error", file=self.current_audio, error=e)
+                return
+            if fade_ms:
+                self.channel.fadeout(fade_ms)
+            self._source = "music"
+            self._expected_end = None
+            self._dispatcher.arm(self._stream_seconds(self.current_audio, tail=True))
+
+    def _check_underrun(self, late: float):
+        """鳴り終わりの遅れから出力の途切れを数える"""
+        if late <= config.MIXER_UNDERRUN_TOLERANCE:
             return
-        
-        # 再生停止
-        pygame.mixer.music.stop()
-        self.is_playing = False
-        
-        # スレッドが終了するのを待つ
-        if self.play_thread and self.play_thread.is_alive():
-            self.play_thread.join(timeout=0.5)
-        
-        self.current_audio = None
-    
-    def _pygame_wait_done(self):
-        """PyGameの再生完了を待つ"""
-        while self.is_playing and pygame.mixer.music.get_busy():
-            time.sleep(0.1)
-        self.is_playing = False
+        now = time.monotonic()
+        self.underruns += 1
+        AUDIO_UNDERRUNS.inc()
+        self._underrun_times.append(now)
+        while self._underrun_times and now - self._underrun_times[0] > config.MIXER_UNDERRUN_WINDOW:
+            self._underrun_times.popleft()
+        LOG.warn("underrun", file=self.current_audio, late=late, buffer=self.mixer_buffer)
+
+    def _fall_back(self):
+        """途切れが続いたのでバッファを大きくする (開き直しはメインのスレッドに頼む)"""
+        self._underrun_times.clear()
+        buffer = mixer_profile.safer_buffer(self.mixer_buffer)
+        if buffer is None:
+            return
+        try:
+            mixer_profile.record_fallback(buffer, self.underruns)
+        except OSError as e:
+            LOG.warn("profile_save_error", error=e)
+        if not self._owns_mixer or self.call_on_main is None:
+            # 共有しているミキサーは開き直せないので、次の起動から反映する
+            self.mixer_buffer = buffer
+            LOG.warn("underrun_fallback", buffer=buffer, applied=False)
+            return
+        self._fallback_buffer = buffer
+        self.call_on_main(self.apply_fallback)
+
+    def apply_fallback(self):
+        """切り替え待ちのバッファサイズでミキサーを開き直す (call_on_main から呼ばれる)
+
+        鳴っている間は何もせず、次に鳴り終わった時にもう一度呼ばれる
+        """
+        with self._lock:
+            buffer = self._fallback_buffer
+            if buffer is None or self.is_playing or self.is_overlay_playing:
+                return
+            self._fallback_buffer = None
+            # 形式は変えずにバッファだけ変えるので、デコード済みの Sound はそのまま使える
+            # 開き直している間はディスパッチャのスレッドにミキサーを触らせない
+            frequency, size, channels = pygame.mixer.get_init()
+            with self._dispatcher.paused():
+                pygame.mixer.quit()
+                pygame.mixer.init(frequency=frequency, size=size, channels=channels, buffer=buffer)
+                self._open_channels()
+            self.mixer_buffer = buffer
+        LOG.warn("underrun_fallback", buffer=buffer, applied=True)
     
+    def _stream_seconds(self, audio_file: str, tail: bool = False) -> float:
+        """ストリーミングで鳴らす長さの見込み (分からなければ0)"""
+        info = audio_assets.get_clip_info(audio_file)
+        if info is None:
+            # コンパイルしていないWAVはヘッダーから長さを読む (1回読んだら覚えておく)
+            if audio_file not in self._durations:
+                self._durations[audio_file] = audio_policy.clip_duration(audio_file)
+            return self._durations[audio_file] or 0.0
+        start = 0.0
+        if tail:
+            start = info.get("tail_offset")
+            if start is None:
+                start = info.get("head_seconds") or 0.0
+        return max(0.0, info["duration"] - start)
+
     def get_current_audio(self) -> Optional[str]:
         """現在再生中の音声ファイル名を取得
         
@@ -130,5 +709,5 @@ class AudioPlayer:
         return self.current_audio if self.is_playing else None
     
     def get_play_history(self):
-        return self.play_history
+        return self.play_history.to_list()
     
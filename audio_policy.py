@@ -0,0 +1,136 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+音声の読み込み方針 for お世話ぬいぐるみプロジェクト
+音声の長さで「全部メモリに置く」か「先頭だけ置いて残りはストリーミング」かを決める
+
+    RESIDENT : AUDIO_RESIDENT_MAX_SECONDS 以下の短い音声。デコードしてキャッシュに常駐させる
+    HYBRID   : それより長い音声 (お歌など)。先頭 AUDIO_STREAM_HEAD_SECONDS 秒だけデコードしておき、
+               すぐに鳴らし始めてから残りをストリーミングで続ける
+
+残りの部分 (tail) は音声コンパイラが書き出す。コンパイルしていない長い音声は、従来どおり全体をストリーミングする
+
+    python audio_policy.py   # 音声ごとの方針と常駐メモリの見積もりを表示
+"""
+
+import sys
+import wave
+from typing import Dict, Iterable, NamedTuple, Optional
+import config
+import audio_assets
+import mixer_profile
+
+RESIDENT = "resident"
+HYBRID = "hybrid"
+
+
+class ClipPlan(NamedTuple):
+    """1つの音声の読み込み方針"""
+    audio_file: str
+    mode: str             # RESIDENT / HYBRID
+    duration: float       # 長さ[秒]
+    decoded_bytes: int    # 全体をデコードした時のバイト数
+    resident_bytes: int   # 常駐させるバイト数 (HYBRIDは先頭のみ)
+
+
+def bytes_per_second() -> int:
+    """ミキサーの出力形式での1秒あたりのバイト数"""
+    fmt = mixer_profile.output_settings()
+    return fmt["frequency"] * fmt["channels"] * (abs(fmt["size"]) // 8)
+
+
+def head_bytes(head_seconds: float) -> int:
+    """先頭 head_seconds 秒分のバイト数 (フレーム境界に揃える)"""
+    fmt = mixer_profile.output_settings()
+    frame_size = fmt["channels"] * (abs(fmt["size"]) // 8)
+    return int(head_seconds * fmt["frequency"]) * frame_size
+
+
+def head_seconds(duration: float) -> Optional[float]:
+    """先頭だけ常駐させる長さ (全部常駐させる音声ならNone)"""
+    if duration <= config.AUDIO_RESIDENT_MAX_SECONDS:
+        return None
+    return config.AUDIO_STREAM_HEAD_SECONDS
+
+
+def tail_offset(head_seconds: float) -> float:
+    """残り (tail) を書き出し始める位置[秒] (先頭の終わりよりクロスフェードの分だけ前)"""
+    return max(0.0, head_seconds - config.AUDIO_TAIL_CROSSFADE)
+
+
+def clip_duration(audio_file: str) -> Optional[float]:
+    """音声の長さ[秒] (マニフェストにあればそこから、なければWAVのヘッダーから)"""
+    info = audio_assets.get_clip_info(audio_file)
+    if info is not None:
+        return info["duration"]
+    try:
+        with wave.open(str(config.AUDIO_DIR / audio_file), "rb") as w:
+            return w.getnframes() / w.getframerate()
+    except (OSError, EOFError, wave.Error):
+        return None
+
+
+def plan_clip(audio_file: str) -> Optional[ClipPlan]:
+    """1つの音声の方針を決める (長さが分からなければNone)"""
+    duration = clip_duration(audio_file)
+    if duration is None:
+        return None
+    decoded = int(duration * bytes_per_second())
+    head = head_seconds(duration)
+    if head is None:
+        return ClipPlan(audio_file, RESIDENT, duration, decoded, decoded)
+    return ClipPlan(audio_file, HYBRID, duration, decoded, min(decoded, head_bytes(head)))
+
+
+def scan_clips(audio_files: Optional[Iterable[str]] = None) -> Dict[str, ClipPlan]:
+    """音声をまとめて調べて方針を決める
+
+    Args:
+        audio_files: 調べる音声 (省略時は設定の全音声)
+
+    Returns:
+        dict: 音声ファイル -> ClipPlan (長さが分からない音声は含まない)
+    """
+    if audio_files is None:
+        audio_files = config.get_all_audio_files()
+    plans = {}
+    for audio_file in audio_files:
+        plan = plan_clip(audio_file)
+        if plan is not None:
+            plans[audio_file] = plan
+    return plans
+
+
+def footprint(plans: Dict[str, ClipPlan]) -> dict:
+    """常駐メモリの見積もり
+
+    Returns:
+        dict: 方針ごとの件数、常駐させるバイト数、全部デコードした場合のバイト数
+    """
+    hybrid = [p for p in plans.values() if p.mode == HYBRID]
+    return {
+        'resident_clips': len(plans) - len(hybrid),
+        'hybrid_clips': len(hybrid),
+        'resident_bytes': sum(p.resident_bytes for p in plans.values()),
+        'streamed_bytes': sum(p.decoded_bytes - p.resident_bytes for p in hybrid),
+        'all_decoded_bytes': sum(p.decoded_bytes for p in plans.values()),
+    }
+
+
+def main(argv=None):
+    fmt = mixer_profile.output_settings()
+    audio_assets.activate((fmt["frequency"], fmt["size"], fmt["channels"]))
+    plans = scan_clips()
+    for plan in sorted(plans.values(), key=lambda p: -p.duration):
+        print(f"{plan.mode:8} {plan.duration:6.2f}秒 {plan.resident_bytes // 1024:6}KB "
+              f"/ {plan.decoded_bytes // 1024:6}KB  {plan.audio_file}")
+    report = footprint(plans)
+    print(f"常駐: {report['resident_clips']}件 + 先頭のみ {report['hybrid_clips']}件 "
+          f"= {report['resident_bytes'] // 1024}KB "
+          f"(全部デコードすると {report['all_decoded_bytes'] // 1024}KB、"
+          f"ストリーミング {report['streamed_bytes'] // 1024}KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
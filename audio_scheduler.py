@@ -0,0 +1,191 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+音声スケジューラ for お世話ぬいぐるみプロジェクト
+AudioPlayerの上で、音声の種類ごとの優先度に従って再生・割り込み・待ち合わせ・破棄を決める
+
+音声の種類 (優先度は AUDIO_POLICIES で設定):
+    care     : お世話の返事 (タッチ)
+    level_up : レベルアップ
+    alert    : 空腹・さみしい・低電圧のお知らせ
+    system   : 電源オンなど
+
+再生中に別の音声が来た時の扱い:
+    preempt : 再生中の音声を止めて再生
+    overlay : 再生中の音声の音量を下げ (ダッキング)、別チャンネルで重ねて再生
+    queue   : 再生中の音声が終わってから再生 (AUDIO_QUEUE_MAX_LATENCY を過ぎたら破棄)
+    drop    : 再生しない
+"""
+
+import heapq
+import time
+import threading
+from typing import Callable, Optional
+import config
+
+CARE = "care"
+LEVEL_UP = "level_up"
+ALERT = "alert"
+SYSTEM = "system"
+
+PREEMPT = "preempt"
+OVERLAY = "overlay"
+QUEUE = "queue"
+DROP = "drop"
+
+_COUNTERS = ("played", "queued", "dropped", "preempted", "overlaid", "expired")
+
+
+class AudioScheduler:
+    """優先度付きで音声の再生を調停するスケジューラ"""
+
+    def __init__(self, player, policies: Optional[dict] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            player: AudioPlayer
+            policies: 種類 -> {"priority", "on_lower", "on_busy"} (省略時はAUDIO_POLICIES)
+            clock: 待ち時間の計測に使う時計
+        """
+        self.player = player
+        self.policies = policies if policies is not None else config.AUDIO_POLICIES
+        self.clock = clock
+        # 再生が最後まで終わった時に音声ファイル名を渡して呼ばれる
+        self.on_finished: Optional[Callable[[str], None]] = None
+        self._main_kind = None     # メインで再生中の音声の種類
+        self._overlay_kind = None  # 重ねて再生中の音声の種類
+        self._queue = []           # (-優先度, 通し番号, 期限, 種類, 音声ファイル, 登録時刻)
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._counts = {kind: dict.fromkeys(_COUNTERS, 0) for kind in self.policies}
+        self._max_wait = 0.0
+        player.on_finished = self._on_main_finished
+        player.on_overlay_finished = self._on_overlay_finished
+
+    def _priority(self, kind: Optional[str]) -> int:
+        if kind is None:
+            return -1
+        return self.policies[kind]["priority"]
+
+    def _busy_priority(self) -> int:
+        # 再生中の音声のうち最も高い優先度 (何も鳴っていなければ-1)
+        main = self._main_kind if self.player.is_playing else None
+        overlay = self._overlay_kind if self.player.is_overlay_playing else None
+        return max(self._priority(main), self._priority(overlay))
+
+    def _decide(self, kind: str) -> Optional[str]:
+        # 今この種類の音声が来たらどうするか (Noneならそのまま再生)
+        busy = self._busy_priority()
+        if busy < 0:
+            return None
+        policy = self.policies[kind]
+        if policy["priority"] > busy:
+            action = policy.get("on_lower", PREEMPT)
+            if action == OVERLAY and (self.player.is_overlay_playing or not self.player.is_playing):
+                # 重ねる先が空いていなければメインを使う
+                action = PREEMPT if not self.player.is_playing else QUEUE
+            return action
+        return policy.get("on_busy", DROP)
+
+    def admit(self, kind: str) -> bool:
+        """この種類の音声を今受け付けるか判定 (受け付けなければ破棄として数える)"""
+        with self._lock:
+            if self._decide(kind) == DROP:
+                self._counts[kind]["dropped"] += 1
+                return False
+            return True
+
+    def play(self, audio_file: str, kind: str = CARE) -> bool:
+        """音声の再生を依頼
+
+        Args:
+            audio_file: AUDIO_DIRからの相対パス
+            kind: 音声の種類 (CARE / LEVEL_UP / ALERT / SYSTEM)
+
+        Returns:
+            bool: 再生を始めたか待ち合わせに入れたらTrue、破棄したらFalse
+        """
+        with self._lock:
+            action = self._decide(kind)
+            counts = self._counts[kind]
+            if action == DROP:
+                counts["dropped"] += 1
+                return False
+            if action == QUEUE:
+                return self._enqueue(audio_file, kind)
+            if action == OVERLAY:
+                if not self.player.play_overlay(audio_file):
+                    return False
+                self._overlay_kind = kind
+                self.player.duck(config.AUDIO_DUCK_VOLUME)
+                counts["overlaid"] += 1
+                counts["played"] += 1
+                return True
+            if action == PREEMPT and self.player.is_playing and self._main_kind:
+                self._counts[self._main_kind]["preempted"] += 1
+            return self._play_main(audio_file, kind)
+
+    def _play_main(self, audio_file: str, kind: str) -> bool:
+        if not self.player.play(audio_file):
+            return False
+        self._main_kind = kind
+        self._counts[kind]["played"] += 1
+        return True
+
+    def _enqueue(self, audio_file: str, kind: str) -> bool:
+        now = self.clock()
+        if len(self._queue) >= config.AUDIO_QUEUE_MAX_SIZE:
+            # いっぱいなら最も優先度の低いものを捨てる (新しい方が低ければ新しい方)
+            lowest = max(self._queue)
+            if -lowest[0] >= self._priority(kind):
+                self._counts[kind]["dropped"] += 1
+                return False
+            self._queue.remove(lowest)
+            heapq.heapify(self._queue)
+            self._counts[lowest[3]]["dropped"] += 1
+        self._seq += 1
+        heapq.heappush(self._queue, (-self._priority(kind), self._seq,
+                                     now + config.AUDIO_QUEUE_MAX_LATENCY,
+                                     kind, audio_file, now))
+        self._counts[kind]["queued"] += 1
+        return True
+
+    def _drain(self):
+        # メインが空いたら待ち合わせ中の音声を優先度順に再生 (期限切れは捨てる)
+        now = self.clock()
+        while self._queue and not self.player.is_playing:
+            _, _, deadline, kind, audio_file, queued_at = heapq.heappop(self._queue)
+            if now > deadline:
+                self._counts[kind]["expired"] += 1
+                continue
+            self._max_wait = max(self._max_wait, now - queued_at)
+            self._play_main(audio_file, kind)
+
+    def _on_main_finished(self, audio_file: str):
+        # 再生終了イベント (ディスパッチャのスレッドから呼ばれる)
+        with self._lock:
+            self._main_kind = None
+            self._drain()
+        if self.on_finished:
+            self.on_finished(audio_file)
+
+    def _on_overlay_finished(self, audio_file: str):
+        with self._lock:
+            self._overlay_kind = None
+            self.player.unduck()
+            self._drain()
+        if self.on_finished:
+            self.on_finished(audio_file)
+
+    def get_stats(self) -> dict:
+        """種類ごとの再生・待ち合わせ・破棄・割り込みの回数
+
+        Returns:
+            dict: 種類 -> 回数の辞書、待ち合わせ中の件数、最大待ち時間[秒]
+        """
+        with self._lock:
+            return {
+                'kinds': {kind: dict(counts) for kind, counts in self._counts.items()},
+                'queue_depth': len(self._queue),
+                'max_queue_wait': self._max_wait,
+            }
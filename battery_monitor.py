@@ -0,0 +1,265 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+電圧監視モジュール for お世話ぬいぐるみプロジェクト
+Raspberry Piの低電圧・スロットリング状態を、プロセスを起動せずに読み取る
+
+読み取り元 (バックエンド) は差し替え可能:
+    - HwmonBackend    : /sys/class/hwmon の rpi_volt (in0_lcrit_alarm) を開きっぱなしで読む
+    - MailboxBackend  : /dev/vcio のVideoCoreメールボックスに GET_THROTTLED を問い合わせる
+    - VcgencmdBackend : vcgencmd get_throttled を実行 (他が使えない時だけ。毎回forkする)
+    - StaticBackend   : 任意の値を返す (テスト・シミュレーション用)
+
+チェック間隔は状態に応じて変える。低電圧中は短く、安定が続くほど長くする
+読み取り結果は subscribe() した購読者に配信し、latest でいつでも参照できる
+"""
+
+import os
+import glob
+import shutil
+import struct
+import threading
+import subprocess
+from typing import Callable, List, NamedTuple, Optional
+import config
+from clock import SYSTEM_CLOCK
+from audio_scheduler import ALERT
+
+# get_throttled のビット
+UNDER_VOLTAGE = 0x1          # 現在低電圧
+FREQ_CAPPED = 0x2            # 現在周波数制限中
+THROTTLED = 0x4              # 現在スロットリング中
+UNDER_VOLTAGE_OCCURRED = 0x10000  # 起動後に低電圧があった
+
+
+class BatteryReading(NamedTuple):
+    """電圧の読み取り結果"""
+    timestamp: float
+    throttled: int  # get_throttled 形式のビット列
+
+    @property
+    def under_voltage(self) -> bool:
+        return bool(self.throttled & UNDER_VOLTAGE)
+
+    @property
+    def throttling(self) -> bool:
+        return bool(self.throttled & (FREQ_CAPPED | THROTTLED))
+
+
+class ThrottleBackend:
+    """低電圧状態の読み取り元 (このクラス自体は何も読めない環境用で、常にNoneを返す)"""
+
+    name = "none"
+
+    def read(self) -> Optional[int]:
+        """get_throttled 形式のビット列を返す (読めなければNone)"""
+        return None
+
+    def close(self):
+        pass
+
+
+class HwmonBackend(ThrottleBackend):
+    """rpi_volt hwmon の低電圧アラームを読む"""
+
+    name = "hwmon"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+
+    @classmethod
+    def find(cls) -> Optional['HwmonBackend']:
+        for name_file in glob.glob("/sys/class/hwmon/hwmon*/name"):
+            try:
+                with open(name_file) as f:
+                    if f.read().strip() != "rpi_volt":
+                        continue
+                return cls(os.path.join(os.path.dirname(name_file), "in0_lcrit_alarm"))
+            except OSError:
+                continue
+        return None
+
+    def read(self) -> Optional[int]:
+        try:
+            value = os.pread(self._fd, 8, 0)
+        except OSError:
+            return None
+        return UNDER_VOLTAGE if value.strip() == b"1" else 0
+
+    def close(self):
+        os.close(self._fd)
+
+
+class MailboxBackend(ThrottleBackend):
+    """VideoCoreメールボックスのプロパティ GET_THROTTLED を読む"""
+
+    name = "mailbox"
+    DEVICE = "/dev/vcio"
+    TAG_GET_THROTTLED = 0x00030046
+    RESPONSE_OK = 0x80000000
+    # _IOWR(100, 0, char *)
+    IOCTL_MBOX_PROPERTY = (3 << 30) | (struct.calcsize("P") << 16) | (100 << 8)
+
+    def __init__(self):
+        import fcntl
+        self._ioctl = fcntl.ioctl
+        self._fd = os.open(self.DEVICE, os.O_RDWR)
+        # 初回の問い合わせが通らなければ使わない
+        if self.read() is None:
+            os.close(self._fd)
+            raise OSError("GET_THROTTLED に応答がありません")
+
+    def read(self) -> Optional[int]:
+        import array
+
+        # サイズ, 要求, タグ, 値バッファ長, 要求長, 値, 終端タグ
+        buf = array.array("I", [7 * 4, 0, self.TAG_GET_THROTTLED, 4, 0, 0, 0])
+        try:
+            self._ioctl(self._fd, self.IOCTL_MBOX_PROPERTY, buf, True)
+        except OSError:
+            return None
+        if buf[1] != self.RESPONSE_OK:
+            return None
+        return buf[5]
+
+    def close(self):
+        os.close(self._fd)
+
+
+class VcgencmdBackend(ThrottleBackend):
+    """vcgencmd get_throttled を実行して読む (毎回forkする)"""
+
+    name = "vcgencmd"
+
+    def read(self) -> Optional[int]:
+        try:
+            result = subprocess.check_output(["vcgencmd", "get_throttled"], text=True)
+            return int(result.strip().split('=')[1], 16)
+        except Exception:
+            return None
+
+
+class StaticBackend(ThrottleBackend):
+    """値を外から設定できるバックエンド (テスト・シミュレーション用)"""
+
+    name = "static"
+
+    def __init__(self, throttled: Optional[int] = 0):
+        self.throttled = throttled
+        self.reads = 0
+
+    def read(self) -> Optional[int]:
+        self.reads += 1
+        return self.throttled
+
+
+def detect_backend(kind: str = config.BATTERY_BACKEND) -> ThrottleBackend:
+    """使える読み取り元を選ぶ
+
+    Args:
+        kind: "auto" / "hwmon" / "mailbox" / "vcgencmd" / "none"
+
+    Returns:
+        ThrottleBackend: 読み取り元 (どれも使えなければ常にNoneを返すもの)
+    """
+    candidates = {
+        "hwmon": HwmonBackend.find,
+        "mailbox": MailboxBackend,
+        "vcgencmd": lambda: VcgencmdBackend() if shutil.which("vcgencmd") else None,
+    }
+    order = list(candidates) if kind == "auto" else [kind]
+    for name in order:
+        factory = candidates.get(name)
+        if factory is None:
+            continue
+        try:
+            backend = factory()
+        except (OSError, ImportError):
+            backend = None
+        if backend is not None:
+            return backend
+    return ThrottleBackend()
+
+
+class BatteryMonitor(threading.Thread):
+    """電圧を監視して購読者に配信するスレッド"""
+
+    def __init__(self, player, backend: Optional[ThrottleBackend] = None, clock=None):
+        """
+        Args:
+            player: 低電圧のお知らせを鳴らすAudioScheduler
+            backend: 読み取り元 (省略時は detect_backend())
+            clock: 読み取り時刻の時計 (省略時は本物の時刻)
+        """
+        super().__init__(daemon=True, name="battery")
+        self.player = player
+        self.backend = backend or detect_backend()
+        self.clock = clock or SYSTEM_CLOCK
+        self.interval = config.BATTERY_CHECK_INTERVAL  # 次のチェックまでの秒数
+        self.latest: Optional[BatteryReading] = None
+        self.last_alert_time = 0
+        self.last_low_time = None
+        self.checks = 0
+        self._subscribers: List[Callable[[BatteryReading], None]] = []
+        self._stop_event = threading.Event()
+        if config.DEBUG:
+            print(f"電圧監視: {self.backend.name}")
+
+    def subscribe(self, callback: Callable[[BatteryReading], None]):
+        """読み取り結果を受け取る関数を登録"""
+        self._subscribers.append(callback)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.check()
+            self._stop_event.wait(self.interval)
+
+    def stop(self, timeout: float = 2.0):
+        """監視を止める (読み取り中なら終わるのを待ってから読み取り元を閉じる)"""
+        self._stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout=timeout)
+            if self.is_alive():
+                # 読み取りが戻らないので閉じずに残す (daemonスレッドなので終了時に片付く)
+                return
+        self.backend.close()
+
+    def check(self) -> Optional[BatteryReading]:
+        """電圧を1回チェックし、購読者に配信して次の間隔を決める"""
+        self.checks += 1
+        throttled = self.backend.read()
+        if throttled is None:
+            # 読めない環境では滅多に見に行かない
+            self.interval = config.BATTERY_CHECK_INTERVAL_MAX
+            return None
+
+        now = self.clock.time()
+        reading = BatteryReading(now, throttled)
+        self.latest = reading
+        if reading.under_voltage:
+            self.last_low_time = now
+            if now - self.last_alert_time > config.BATTERY_ALERT_COOLDOWN:
+                if config.BATTERY_ALERT_AUDIO_ENABLED:
+                    self.player.play(config.BATTERY_LOW_AUDIO, ALERT)
+                self.last_alert_time = now
+        self.interval = self._next_interval(reading, now)
+
+        for callback in self._subscribers:
+            try:
+                callback(reading)
+            except Exception as e:
+                if config.DEBUG:
+                    print(f"電圧通知エラー: {e}")
+        return reading
+
+    def _next_interval(self, reading: BatteryReading, now: float) -> float:
+        if reading.under_voltage:
+            return config.BATTERY_CHECK_INTERVAL_MIN
+        if self.last_low_time is not None and \
+           now - self.last_low_time < config.BATTERY_ALERT_COOLDOWN:
+            # 低電圧が収まった直後は通常間隔で様子を見る
+            return config.BATTERY_CHECK_INTERVAL
+        # 安定している間は間隔を倍々に延ばす
+        return min(config.BATTERY_CHECK_INTERVAL_MAX,
+                   max(config.BATTERY_CHECK_INTERVAL, self.interval * 2))
@@ -0,0 +1,8 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+ベンチマーク for お世話ぬいぐるみプロジェクト
+偽のNFCリーダー・ミキサーを使い、実機なしで応答性能を計測する
+
+    python -m benchmarks.tap_latency
+"""
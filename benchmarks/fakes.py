@@ -0,0 +1,492 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+偽のnfc / pygameモジュール
+実機・音声デバイスなしでお世話ぬいぐるみを動かすためのスタブ
+install() を main / nfc_reader / audio_player のimportより先に呼ぶこと
+"""
+
+import sys
+import time
+import errno
+import types
+import queue
+import wave
+import threading
+from typing import List, Optional
+
+
+class FakeTap:
+    """台本上の1回のタッチ"""
+
+    __slots__ = ('uid', 'hold', 'placed_at', 'detected_at', 'path')
+
+    def __init__(self, uid: bytes, hold: float = 0.0, path: str = 'usb'):
+        self.uid = uid
+        self.hold = hold
+        self.path = path
+        self.placed_at = None
+        self.detected_at = None
+
+
+class FakeTag:
+    """nfc.tag.Tag の代わり"""
+
+    def __init__(self, identifier: bytes, release_at: float):
+        self.identifier = identifier
+        self._release_at = release_at
+
+    @property
+    def is_present(self) -> bool:
+        return time.perf_counter() < self._release_at
+
+    def release(self):
+        self._release_at = 0.0
+
+
+class CommunicationError(Exception):
+    """nfc.clf.CommunicationError の代わり"""
+
+
+class TimeoutError(CommunicationError):
+    """nfc.clf.TimeoutError の代わり"""
+
+
+class FaultPlan:
+    """偽リーダーに起こす障害の台本
+
+    inject() で積んだ障害を、次に開く時 / 次の connect() で順に起こす
+        "open"          : ContactlessFrontend() が OSError(ENODEV) で失敗
+        "timeout"       : connect() が TimeoutError
+        "communication" : connect() が CommunicationError
+        "device"        : connect() が OSError(EIO) (USBが抜けた時など)
+    """
+
+    def __init__(self):
+        self._opens = 0
+        self._connects = []
+        self._lock = threading.Lock()
+
+    def inject(self, kind: str, count: int = 1):
+        with self._lock:
+            if kind == "open":
+                self._opens += count
+            else:
+                self._connects.extend([kind] * count)
+
+    def take_open(self) -> Optional[Exception]:
+        with self._lock:
+            if not self._opens:
+                return None
+            self._opens -= 1
+        return OSError(errno.ENODEV, "No such device")
+
+    def take_connect(self) -> Optional[Exception]:
+        with self._lock:
+            if not self._connects:
+                return None
+            kind = self._connects.pop(0)
+        if kind == "timeout":
+            return TimeoutError("timeout")
+        if kind == "communication":
+            return CommunicationError("communication error")
+        return OSError(errno.EIO, "Input/output error")
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._opens + len(self._connects)
+
+
+class FakeContactlessFrontend:
+    """nfc.ContactlessFrontend の代わり
+
+    place() で置かれたタグを connect() が検知する。パスごとに別のキューを持つ
+    """
+
+    taps = {}  # path -> queue.Queue
+    faults = FaultPlan()
+    opened: List['FakeContactlessFrontend'] = []
+    detected: List[FakeTap] = []
+    _lock = threading.Lock()
+
+    def __init__(self, path: str = 'usb'):
+        error = self.faults.take_open()
+        if error is not None:
+            raise error
+        self.path = path
+        self.closed = False
+        self.queue = self.tap_queue(path)
+        self.device = types.SimpleNamespace(mute=lambda: None)
+        with self._lock:
+            self.opened.append(self)
+
+    @classmethod
+    def tap_queue(cls, path: str) -> queue.Queue:
+        with cls._lock:
+            return cls.taps.setdefault(path, queue.Queue())
+
+    @classmethod
+    def place(cls, uid: bytes, hold: float = 0.0, path: str = 'usb') -> FakeTap:
+        """タグをリーダーに置く"""
+        tap = FakeTap(uid, hold, path)
+        tap.placed_at = time.perf_counter()
+        cls.tap_queue(path).put(tap)
+        return tap
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls.taps = {}
+            cls.opened = []
+            cls.detected = []
+            cls.faults = FaultPlan()
+
+    def close(self):
+        self.closed = True
+
+    def connect(self, **options):
+        rdwr = options.get('rdwr') or {}
+        terminate = options.get('terminate') or (lambda: False)
+        interval = rdwr.get('interval', 0.5)
+        iterations = rdwr.get('iterations', 5)
+        on_connect = rdwr.get('on-connect', lambda tag: True)
+        on_release = rdwr.get('on-release', lambda tag: True)
+
+        while not terminate():
+            for _ in range(iterations):
+                # 注入された障害は検知の途中でも起こす
+                error = self.faults.take_connect()
+                if error is not None:
+                    raise error
+                try:
+                    tap = self.queue.get(timeout=interval)
+                except queue.Empty:
+                    if terminate():
+                        return None
+                    continue
+                tap.detected_at = time.perf_counter()
+                with self._lock:
+                    self.detected.append(tap)
+                tag = FakeTag(tap.uid, tap.detected_at + tap.hold)
+                if not on_connect(tag):
+                    return tag
+                # nfcpyと同様にタグが離れるまで待つ
+                while tag.is_present and not terminate():
+                    time.sleep(min(0.01, tap.hold))
+                on_release(tag)
+                return True
+        return None
+
+
+class MixerLog:
+    """偽ミキサーの load / play 記録"""
+
+    def __init__(self):
+        self.loads = []  # (timestamp, path)
+        self.plays = []  # (timestamp, name)
+        self.channel_plays = {}  # チャンネル番号 -> [(timestamp, name)] (musicはNone)
+        self.playback_scale = 0.0  # 0なら再生は即終了扱い
+        self._lock = threading.Lock()
+
+    def record_load(self, path):
+        with self._lock:
+            self.loads.append((time.perf_counter(), path))
+
+    def record_play(self, name, channel=None):
+        now = time.perf_counter()
+        with self._lock:
+            self.plays.append((now, name))
+            self.channel_plays.setdefault(channel, []).append((now, name))
+        return now
+
+    def reset(self):
+        with self._lock:
+            self.loads = []
+            self.plays = []
+            self.channel_plays = {}
+
+
+MIXER_LOG = MixerLog()
+
+
+def _wav_length(path) -> float:
+    try:
+        with wave.open(str(path)) as w:
+            return w.getnframes() / w.getframerate()
+    except Exception:
+        return 1.0
+
+
+def _build_pygame():
+    pygame = types.ModuleType('pygame')
+    pygame.USEREVENT = 32850
+    mixer = types.ModuleType('pygame.mixer')
+    music = types.ModuleType('pygame.mixer.music')
+    event = types.ModuleType('pygame.event')
+    display = types.ModuleType('pygame.display')
+    state = {'init': None, 'reserved': 0, 'channels': 8}
+    events = queue.Queue()
+    event_types = [pygame.USEREVENT]
+
+    class error(RuntimeError):
+        pass
+
+    class Event:
+        def __init__(self, event_type, **attrs):
+            self.type = event_type
+            self.__dict__.update(attrs)
+
+    def custom_type():
+        event_types[0] += 1
+        return event_types[0]
+
+    def post(ev):
+        events.put(ev)
+        # 再生時間を縮めているので、実機のように鳴り終わりの見込みまで待たせずにディスパッチャを起こす
+        player = sys.modules.get('audio_player')
+        dispatcher = player and player.PlaybackEventDispatcher._instance
+        if dispatcher:
+            dispatcher.wake()
+        return True
+
+    def wait(timeout=0):
+        try:
+            return events.get(timeout=timeout / 1000.0 if timeout else None)
+        except queue.Empty:
+            return Event(0)
+
+    def get():
+        drained = []
+        while True:
+            try:
+                drained.append(events.get_nowait())
+            except queue.Empty:
+                return drained
+
+    def schedule_end(event_type, duration, still_playing):
+        # 実機と同様に再生終了時にイベントを送る
+        if not event_type:
+            return
+        if duration <= 0:
+            post(Event(event_type))
+            return
+
+        def fire():
+            if still_playing():
+                post(Event(event_type))
+        timer = threading.Timer(duration, fire)
+        timer.daemon = True
+        timer.start()
+
+    event.Event = Event
+    event.custom_type = custom_type
+    event.post = post
+    event.wait = wait
+    event.get = get
+    event.set_allowed = lambda *args: None
+    event.set_blocked = lambda *args: None
+    display.init = lambda: None
+    pygame.event = event
+    pygame.display = display
+
+    def init(frequency=44100, size=-16, channels=2, buffer=512, **kwargs):
+        state['init'] = (frequency, size, channels)
+
+    def get_init():
+        return state['init']
+
+    def _check_init():
+        # 本物と同じく、ミキサーを閉じている間に触るとエラーにする
+        if state['init'] is None:
+            raise error("mixer not initialized")
+
+    def mixer_get_busy():
+        _check_init()
+        return any(time.perf_counter() < until for until in Channel._busy_until.values())
+
+    def quit():
+        state['init'] = None
+
+    def set_reserved(count):
+        state['reserved'] = count
+        return count
+
+    def set_num_channels(count):
+        state['channels'] = count
+
+    def get_num_channels():
+        return state['channels']
+
+    class Sound:
+        def __init__(self, file=None, buffer=None):
+            if buffer is not None:
+                frequency, size, channels = state['init']
+                self._length = len(buffer) / (frequency * channels * (abs(size) // 8))
+                self.name = '<buffer>'
+            else:
+                self._length = _wav_length(file)
+                self.name = str(file)
+            self._volume = 1.0
+
+        def get_length(self):
+            return self._length
+
+        def set_volume(self, volume):
+            self._volume = volume
+
+        def get_volume(self):
+            return self._volume
+
+        def play(self, *args, **kwargs):
+            channel = Channel(state['channels'] - 1)
+            channel.play(self)
+            return channel
+
+    class Channel:
+        _busy_until = {}
+        _endevents = {}
+
+        def __init__(self, index):
+            self.index = index
+
+        def play(self, sound, loops=0, maxtime=0, fade_ms=0):
+            started = MIXER_LOG.record_play(sound.name, self.index)
+            duration = sound.get_length() * MIXER_LOG.playback_scale
+            until = started + duration
+            self._busy_until[self.index] = until
+            schedule_end(self._endevents.get(self.index), duration,
+                         lambda: self._busy_until.get(self.index) == until)
+
+        def stop(self):
+            if self.get_busy() and self._endevents.get(self.index):
+                post(Event(self._endevents[self.index]))
+            self._busy_until[self.index] = 0.0
+
+        def fadeout(self, ms):
+            self.stop()
+
+        def get_busy(self):
+            return time.perf_counter() < self._busy_until.get(self.index, 0.0)
+
+        def set_volume(self, *volume):
+            pass
+
+        def set_endevent(self, event_type=0):
+            self._endevents[self.index] = event_type
+
+    music_state = {'path': None, 'busy_until': 0.0, 'volume': 1.0, 'endevent': 0}
+
+    def music_load(path):
+        with open(path, 'rb'):
+            pass
+        MIXER_LOG.record_load(path)
+        music_state['path'] = path
+
+    def music_play(loops=0, start=0.0, fade_ms=0):
+        started = MIXER_LOG.record_play(music_state['path'])
+        duration = _wav_length(music_state['path']) * MIXER_LOG.playback_scale
+        until = started + duration
+        music_state['busy_until'] = until
+        schedule_end(music_state['endevent'], duration,
+                     lambda: music_state['busy_until'] == until)
+
+    def music_stop():
+        if music_get_busy() and music_state['endevent']:
+            post(Event(music_state['endevent']))
+        music_state['busy_until'] = 0.0
+
+    def music_set_endevent(event_type=0):
+        music_state['endevent'] = event_type
+
+    def music_get_busy():
+        _check_init()
+        return time.perf_counter() < music_state['busy_until']
+
+    def music_set_volume(volume):
+        music_state['volume'] = volume
+
+    def music_get_volume():
+        return music_state['volume']
+
+    def music_noop(*args, **kwargs):
+        pass
+
+    mixer.init = init
+    mixer.pre_init = music_noop
+    mixer.get_init = get_init
+    mixer.get_busy = mixer_get_busy
+    mixer.quit = quit
+    mixer.set_reserved = set_reserved
+    mixer.set_num_channels = set_num_channels
+    mixer.get_num_channels = get_num_channels
+    mixer.Sound = Sound
+    mixer.Channel = Channel
+    music.load = music_load
+    music.play = music_play
+    music.stop = music_stop
+    music.get_busy = music_get_busy
+    music.set_volume = music_set_volume
+    music.get_volume = music_get_volume
+    music.queue = music_noop
+    music.set_endevent = music_set_endevent
+    mixer.music = music
+    pygame.mixer = mixer
+    pygame.error = error
+    return {'pygame': pygame, 'pygame.mixer': mixer, 'pygame.mixer.music': music,
+            'pygame.event': event, 'pygame.display': display}
+
+
+def _build_nfc():
+    nfc = types.ModuleType('nfc')
+    clf = types.ModuleType('nfc.clf')
+    clf.CommunicationError = CommunicationError
+    clf.TimeoutError = TimeoutError
+    clf.ContactlessFrontend = FakeContactlessFrontend
+    nfc.clf = clf
+    nfc.ContactlessFrontend = FakeContactlessFrontend
+    return {'nfc': nfc, 'nfc.clf': clf}
+
+
+def install(playback_scale: float = 0.0) -> MixerLog:
+    """偽のnfc / pygameをsys.modulesに登録
+
+    Args:
+        playback_scale: 偽の再生時間の倍率 (0なら再生は即終了)
+
+    Returns:
+        MixerLog: 偽ミキサーの記録
+    """
+    for name, module in {**_build_pygame(), **_build_nfc()}.items():
+        sys.modules[name] = module
+    MIXER_LOG.playback_scale = playback_scale
+    return MIXER_LOG
+
+
+def match_latencies(taps: List[FakeTap], plays, window: Optional[float] = None):
+    """各タッチを、検知後最初の再生開始と対応付ける
+
+    Args:
+        taps: 検知済みのタッチ (検知時刻順)
+        plays: MixerLog.plays
+        window: 対応付ける最大時間 (省略時は次のタッチの検知まで)
+
+    Returns:
+        list: 各タッチの (検知→再生開始, 設置→再生開始) 秒。再生なしはNone
+    """
+    taps = sorted((t for t in taps if t.detected_at is not None),
+                  key=lambda t: t.detected_at)
+    starts = sorted(t for t, _ in plays)
+    results = []
+    j = 0
+    for i, tap in enumerate(taps):
+        limit = taps[i + 1].detected_at if i + 1 < len(taps) else float('inf')
+        if window is not None:
+            limit = min(limit, tap.detected_at + window)
+        while j < len(starts) and starts[j] < tap.detected_at:
+            j += 1
+        if j < len(starts) and starts[j] < limit:
+            results.append((starts[j] - tap.detected_at, starts[j] - tap.placed_at))
+            j += 1
+        else:
+            results.append(None)
+    return results
@@ -0,0 +1,133 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+複数台モードの負荷試験
+
+ぬいぐるみの台数を変えて HostMode を偽のリーダー・ミキサーで動かし、
+全員が同時にタッチされた時のタグ検知→再生開始のレイテンシがどう伸びるかを出力する
+
+    python -m benchmarks.host_load --plushes 1,2,4,8 --rounds 50 --json host.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+
+from benchmarks import fakes
+from benchmarks.tap_latency import summarize
+
+
+def _uids(config):
+    return [bytes.fromhex(tag_id.replace(':', '')) for tag_id in config.TAG_TO_CARE_TYPE]
+
+
+def run_load(host, config, mixer_log, rounds: int, gap: float, hold: float) -> dict:
+    """全員を同時にタッチする、を rounds 回繰り返す"""
+    frontend = fakes.FakeContactlessFrontend
+    frontend.detected = []
+    mixer_log.reset()
+    uids = _uids(config)
+    count = len(host.apps)
+    for r in range(rounds):
+        for i, app in enumerate(host.apps):
+            frontend.place(uids[(r + i) % len(uids)], hold=hold, path=app.reader.path)
+        deadline = time.perf_counter() + 10.0
+        while len(frontend.detected) < (r + 1) * count and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        time.sleep(gap)
+        for app in host.apps:
+            # 状態が飽和してFULL音声ばかりにならないよう毎回戻す
+            app.pet.set(hunger=config.DEFAULT_HUNGER, attention=config.DEFAULT_ATTENTION)
+    time.sleep(0.05)
+
+    all_latencies = []
+    per_plush = {}
+    for i, app in enumerate(host.apps):
+        taps = [t for t in frontend.detected if t.path == app.reader.path]
+        # ぬいぐるみ i のメインチャンネルは 2*i
+        plays = mixer_log.channel_plays.get(2 * i, [])
+        latencies = [m[0] for m in fakes.match_latencies(taps, plays) if m]
+        all_latencies.extend(latencies)
+        per_plush[app.name] = summarize(latencies)
+    return {
+        'plushes': count,
+        'taps': rounds * count,
+        'detected': len(frontend.detected),
+        'played': len(all_latencies),
+        'detect_to_play': summarize(all_latencies),
+        'per_plush': per_plush,
+    }
+
+
+def print_report(result: dict, out=sys.stdout):
+    """結果を人が読める形式で出力"""
+    print("==== 複数台モード 負荷試験 ====", file=out)
+    print(f"python={result['python']}", file=out)
+    for run in result['runs']:
+        s = run['detect_to_play']
+        worst = max((p['p99_ms'] for p in run['per_plush'].values()), default=float('nan'))
+        print(f"plushes={run['plushes']}: taps={run['taps']} played={run['played']} "
+              f"p50={s['p50_ms']:.3f}ms p95={s['p95_ms']:.3f}ms p99={s['p99_ms']:.3f}ms "
+              f"worst_plush_p99={worst:.3f}ms", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="複数台モードの負荷試験")
+    parser.add_argument('--plushes', default="1,2,4,8", help="台数 (カンマ区切り)")
+    parser.add_argument('--rounds', type=int, default=50, help="全員同時タッチの回数")
+    parser.add_argument('--gap', type=float, default=0.005, help="タッチ間隔[秒]")
+    parser.add_argument('--hold', type=float, default=0.0, help="タグを置いておく時間[秒]")
+    parser.add_argument('--verbose', action='store_true', help="アプリの出力を表示")
+    parser.add_argument('--json', help="結果をJSONで保存するパス")
+    args = parser.parse_args(argv)
+
+    mixer_log = fakes.install()
+    sink = None if args.verbose else open(os.devnull, 'w')
+    redirect = contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext()
+
+    runs = []
+    with redirect:
+        import config
+        config.DEBUG = args.verbose
+        config.NFC_SCAN_MODE = "continuous"
+        config.STATE_PERSIST_ENABLED = False
+        from host_mode import HostMode
+
+        for count in (int(n) for n in args.plushes.split(',')):
+            fakes.FakeContactlessFrontend.reset()
+            instances = [{"name": f"plush{i + 1}", "path": f"usb:fake:{i}",
+                          "pan": -1.0 + 2.0 * i / max(1, count - 1)} for i in range(count)]
+            host = HostMode(instances)
+            host.setup()
+            host.running = True
+            for app in host.apps:
+                app.running = True
+                app.reader.start(callback=app.on_tag_read)
+            try:
+                runs.append(run_load(host, config, mixer_log, args.rounds, args.gap, args.hold))
+            finally:
+                host.running = False
+                for app in host.apps:
+                    app.running = False
+                    app.reader.stop()
+
+    if sink:
+        sink.close()
+    result = {
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'runs': runs,
+    }
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+NFCリーダーの障害シナリオ
+
+偽のContactlessFrontendに障害を注入し、NFCReaderの状態遷移と開き直しの回数を確認する
+    1. タイムアウトが続く     -> 開き直さない
+    2. 通信エラーが少しだけ   -> degraded を経て healthy に戻る
+    3. USBが抜けて開けない    -> reopening / failed を経て、間隔を延ばしながら開き直す
+
+    python -m benchmarks.reader_faults
+"""
+
+import os
+import time
+import argparse
+import contextlib
+
+from benchmarks import fakes
+
+
+def _wait(predicate, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def _detects(frontend, uid: bytes, timeout: float = 2.0) -> bool:
+    # タグを置いて検知されるか
+    before = len(frontend.detected)
+    frontend.place(uid)
+    return _wait(lambda: len(frontend.detected) > before, timeout)
+
+
+def run_scenarios(reader, config, uid: bytes) -> list:
+    """障害シナリオを順に実行
+
+    Returns:
+        list: (シナリオ名, 成否, 詳細) のリスト
+    """
+    frontend = fakes.FakeContactlessFrontend
+    health = reader.health
+    results = []
+
+    # 1. タイムアウトだけなら開き直さない
+    opens = len(frontend.opened)
+    frontend.faults.inject("timeout", 20)
+    _wait(lambda: not frontend.faults.pending(), 5.0)
+    ok = len(frontend.opened) == opens and health.state == "healthy" and _detects(frontend, uid)
+    results.append(("timeouts", ok, health.get_report()))
+
+    # 2. 通信エラーが閾値未満なら開き直さずに回復
+    frontend.faults.inject("communication", config.NFC_DEGRADED_ERRORS - 1)
+    _wait(lambda: not frontend.faults.pending(), 5.0)
+    ok = len(frontend.opened) == opens and _detects(frontend, uid) \
+        and _wait(lambda: health.state == "healthy", 2.0)
+    results.append(("communication", ok, health.get_report()))
+
+    # 3. デバイスエラーの後、しばらく開けない
+    failures = config.NFC_REOPEN_MAX_ATTEMPTS + 1
+    frontend.faults.inject("open", failures)
+    frontend.faults.inject("device")
+    started = time.perf_counter()
+    reached_failed = _wait(lambda: health.state == "failed", 30.0)
+    recovered = _wait(lambda: len(frontend.opened) > opens, 60.0)
+    elapsed = time.perf_counter() - started
+    ok = reached_failed and recovered and _detects(frontend, uid) \
+        and _wait(lambda: health.state == "healthy", 2.0)
+    report = health.get_report()
+    report['recover_seconds'] = round(elapsed, 3)
+    results.append(("device", ok, report))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NFCリーダーの障害シナリオ")
+    parser.add_argument('--backoff-base', type=float, default=0.01,
+                        help="NFC_REOPEN_BACKOFF_BASE[秒]")
+    parser.add_argument('--backoff-max', type=float, default=0.2,
+                        help="NFC_REOPEN_BACKOFF_MAX[秒]")
+    parser.add_argument('--verbose', action='store_true', help="リーダーの出力を表示")
+    args = parser.parse_args(argv)
+
+    fakes.install()
+    sink = None if args.verbose else open(os.devnull, 'w')
+    redirect = contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext()
+
+    with redirect:
+        import config
+        config.DEBUG = args.verbose
+        config.NFC_SCAN_MODE = "continuous"
+        config.POWER_SAVE_MODE = False
+        config.NFC_REOPEN_BACKOFF_BASE = args.backoff_base
+        config.NFC_REOPEN_BACKOFF_MAX = args.backoff_max
+        from nfc_reader import NFCReader
+        from care_table import parse_tag_id
+
+        uid = parse_tag_id(next(iter(config.TAG_TO_CARE_TYPE)))
+        reader = NFCReader()
+        reader.start(callback=lambda uid: None)
+        try:
+            results = run_scenarios(reader, config, uid)
+        finally:
+            reader.stop()
+
+    if sink:
+        sink.close()
+    print("==== NFCリーダー 障害シナリオ ====")
+    for name, ok, report in results:
+        print(f"{name}: {'OK' if ok else 'NG'} {report}")
+    return all(ok for _, ok, _ in results)
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
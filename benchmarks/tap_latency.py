@@ -0,0 +1,184 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+タッチ→発音 レイテンシベンチマーク
+
+偽のContactlessFrontendにタグIDを台本どおり流し、NFCReader経由で
+OsewaNuigurumiMain.on_tag_readを動かす。偽ミキサーのload/play時刻から
+タグ検知→再生開始のp50/p95/p99と、連打時のスループット (音が鳴ったタッチの数/秒) を出力する
+
+    python -m benchmarks.tap_latency --taps 200 --burst 50 --json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+
+from benchmarks import fakes
+
+
+def percentile(values, pct: float) -> float:
+    """最近傍順位法によるパーセンタイル"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies) -> dict:
+    """レイテンシ(秒)の一覧を集計 (ミリ秒)"""
+    values = [v * 1000.0 for v in latencies]
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50),
+        'p95_ms': percentile(values, 95),
+        'p99_ms': percentile(values, 99),
+        'max_ms': max(values) if values else float('nan'),
+    }
+
+
+def _uids(config):
+    return [bytes.fromhex(tag_id.replace(':', '')) for tag_id in config.TAG_TO_CARE_TYPE]
+
+
+def _wait_detected(frontend, count: int, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while len(frontend.detected) < count and time.perf_counter() < deadline:
+        time.sleep(0.001)
+
+
+def run_latency(app, config, mixer_log, taps: int, gap: float, hold: float) -> dict:
+    """1回ずつ間隔を空けてタッチした時のレイテンシ"""
+    frontend = fakes.FakeContactlessFrontend
+    frontend.detected = []
+    mixer_log.reset()
+    uids = _uids(config)
+    for i in range(taps):
+        frontend.place(uids[i % len(uids)], hold=hold)
+        _wait_detected(frontend, i + 1, timeout=10.0 + config.SCAN_INTERVAL)
+        time.sleep(gap)
+        # 状態が飽和してFULL音声ばかりにならないよう毎回戻す
+        app.pet.set(hunger=config.DEFAULT_HUNGER, attention=config.DEFAULT_ATTENTION)
+    time.sleep(0.05)
+    matched = fakes.match_latencies(frontend.detected, mixer_log.plays)
+    detect_to_play = [m[0] for m in matched if m]
+    place_to_play = [m[1] for m in matched if m]
+    return {
+        'taps': taps,
+        'played': len(detect_to_play),
+        'detect_to_play': summarize(detect_to_play),
+        'place_to_play': summarize(place_to_play),
+    }
+
+
+def run_burst(app, config, mixer_log, size: int, hold: float) -> dict:
+    """間隔なしの連打を流した時のスループット"""
+    frontend = fakes.FakeContactlessFrontend
+    frontend.detected = []
+    mixer_log.reset()
+    uids = _uids(config)
+    app.pet.set(hunger=config.DEFAULT_HUNGER, attention=config.DEFAULT_ATTENTION)
+    started = time.perf_counter()
+    for i in range(size):
+        frontend.place(uids[i % len(uids)], hold=hold)
+    _wait_detected(frontend, size, timeout=30.0 + size * config.SCAN_INTERVAL)
+    elapsed = time.perf_counter() - started
+    time.sleep(0.05)
+    matched = fakes.match_latencies(frontend.detected, mixer_log.plays)
+    played = [m[0] for m in matched if m]
+    # 検知した数ではなく、音が鳴った (処理できた) タッチの数で割る
+    return {
+        'taps': size,
+        'detected': len(frontend.detected),
+        'played': len(played),
+        'dropped': len(frontend.detected) - len(played),
+        'drop_rate': (len(frontend.detected) - len(played)) / len(frontend.detected)
+                     if frontend.detected else float('nan'),
+        'elapsed_s': elapsed,
+        'played_per_s': len(played) / elapsed if elapsed > 0 else float('nan'),
+        'detected_per_s': len(frontend.detected) / elapsed if elapsed > 0 else float('nan'),
+        'detect_to_play': summarize(played),
+    }
+
+
+def print_report(result: dict, out=sys.stdout):
+    """結果を人が読める形式で出力"""
+    print("==== タッチ→発音 レイテンシ ====", file=out)
+    print(f"mode={result['mode']} python={result['python']}", file=out)
+    lat = result['latency']
+    for key in ('detect_to_play', 'place_to_play'):
+        s = lat[key]
+        print(f"{key}: n={s['count']} p50={s['p50_ms']:.3f}ms "
+              f"p95={s['p95_ms']:.3f}ms p99={s['p99_ms']:.3f}ms "
+              f"max={s['max_ms']:.3f}ms", file=out)
+    burst = result['burst']
+    s = burst['detect_to_play']
+    print(f"burst: taps={burst['taps']} played={burst['played']} "
+          f"dropped={burst['dropped']} ({burst['drop_rate']:.0%}) "
+          f"{burst['played_per_s']:.1f} played/s (detected {burst['detected_per_s']:.1f}/s) "
+          f"p99={s['p99_ms']:.3f}ms", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="タッチ→発音 レイテンシベンチマーク")
+    parser.add_argument('--taps', type=int, default=200, help="レイテンシ計測のタッチ回数")
+    parser.add_argument('--gap', type=float, default=0.005, help="タッチ間隔[秒]")
+    parser.add_argument('--hold', type=float, default=0.0, help="タグを置いておく時間[秒]")
+    parser.add_argument('--burst', type=int, default=100, help="連打のタッチ回数")
+    parser.add_argument('--mode', choices=('continuous', 'poll'), default='continuous',
+                        help="NFC_SCAN_MODE")
+    parser.add_argument('--scan-interval', type=float, default=0.0,
+                        help="pollモード時のSCAN_INTERVAL[秒]")
+    parser.add_argument('--playback-scale', type=float, default=0.0,
+                        help="偽の再生時間の倍率 (0なら再生は即終了)")
+    parser.add_argument('--verbose', action='store_true', help="アプリの出力を表示")
+    parser.add_argument('--json', help="結果をJSONで保存するパス")
+    args = parser.parse_args(argv)
+
+    mixer_log = fakes.install(playback_scale=args.playback_scale)
+    sink = None if args.verbose else open(os.devnull, 'w')
+    redirect = contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext()
+
+    with redirect:
+        import config
+        config.DEBUG = args.verbose
+        config.NFC_SCAN_MODE = args.mode
+        config.SCAN_INTERVAL = args.scan_interval
+        config.STATE_PERSIST_ENABLED = False
+        import main as app_main
+
+        app = app_main.OsewaNuigurumiMain()
+        app.setup()
+        app.player.preload(background=False)
+        app.running = True
+        app.reader.start(callback=app.on_tag_read)
+        try:
+            latency = run_latency(app, config, mixer_log, args.taps, args.gap, args.hold)
+            burst = run_burst(app, config, mixer_log, args.burst, args.hold)
+        finally:
+            app.running = False
+            app.reader.stop()
+
+    if sink:
+        sink.close()
+    result = {
+        'mode': args.mode,
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'latency': latency,
+        'burst': burst,
+    }
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
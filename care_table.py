@@ -0,0 +1,127 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+お世話テーブル for お世話ぬいぐるみプロジェクト
+config のタグ・お世話タイプ・音声の対応を起動時に1回だけ組み立て、タグのUID(バイト列)で引ける表にする
+
+- タグごとにお世話タイプ・食べ物かどうか・音声の候補・FULL音声・上限時の音声を持つ
+- 参照している音声ファイルは組み立て時に存在を確認し、見つからないものは候補から外す
+- タッチ時は辞書を1回引くだけで、文字列の組み立てやファイルの確認はしない
+"""
+
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional
+import config
+from clip_selector import ClipSelector
+
+
+class CareEntry(NamedTuple):
+    """タグ1つ分のお世話内容"""
+    uid: bytes
+    tag_id: str                  # "04:1E:72:..." 形式 (表示用)
+    care_type: str
+    is_food: bool                # Trueなら空腹度、Falseなら仲良し度が上がる
+    clips: tuple                 # 再生候補の音声
+    full_audio: Optional[str]    # 同じタグが続いた時の音声
+    alert_audio: Optional[str]   # 空腹度・仲良し度が上限の時の音声
+
+
+def parse_tag_id(tag_id: str) -> bytes:
+    """"04:1E:72:..." 形式のタグIDをUIDのバイト列に変換"""
+    return bytes.fromhex(tag_id.replace(':', ''))
+
+
+def format_tag_id(uid: bytes) -> str:
+    """UIDのバイト列を "04:1E:72:..." 形式に変換"""
+    return uid.hex(':').upper()
+
+
+class CareTable:
+    """UID -> CareEntry の読み取り専用の表"""
+
+    def __init__(self, entries: Dict[bytes, CareEntry], missing: Iterable[str] = ()):
+        self._entries = MappingProxyType(dict(entries))
+        self.missing = tuple(missing)  # 見つからなかった音声ファイル
+
+    def get(self, uid: bytes) -> Optional[CareEntry]:
+        """UIDからお世話内容を引く (未登録ならNone)"""
+        return self._entries.get(uid)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, uid: bytes) -> bool:
+        return uid in self._entries
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    @property
+    def pools(self) -> Mapping[str, tuple]:
+        """お世話タイプ -> 再生候補の音声 (ClipSelector用)"""
+        return MappingProxyType({entry.care_type: entry.clips for entry in self})
+
+    @property
+    def audio_files(self) -> List[str]:
+        """表から参照している音声ファイル (存在するものだけ、重複なし)"""
+        files = []
+        for entry in self:
+            files.extend(entry.clips)
+            files.extend(f for f in (entry.full_audio, entry.alert_audio) if f)
+        return list(dict.fromkeys(files))
+
+
+class CareRules(NamedTuple):
+    """お世話テーブルと、それを元に作った音声の選び方の組
+
+    タッチの処理はこれを1回だけ読むので、設定の読み直しで1回の代入で差し替えれば
+    古い表と新しい選び方を組み合わせて使うことはない
+    """
+    table: CareTable
+    selector: ClipSelector
+
+
+def build_care_table(check_files: bool = True, source=None) -> CareTable:
+    """config の対応表からお世話テーブルを組み立てる
+
+    Args:
+        check_files: Trueなら音声ファイルの存在を確認し、見つからないものを外す
+        source: 対応表を読むモジュール (省略時は config。設定の読み直しでは新しい設定を渡す)
+
+    Returns:
+        CareTable: 組み立てたテーブル
+    """
+    source = source or config
+    checked = {}
+
+    def exists(audio_file: Optional[str]) -> bool:
+        if not audio_file:
+            return False
+        if not check_files:
+            return True
+        if audio_file not in checked:
+            checked[audio_file] = (source.AUDIO_DIR / audio_file).exists()
+        return checked[audio_file]
+
+    entries = {}
+    for tag_id, care_type in source.TAG_TO_CARE_TYPE.items():
+        is_food = care_type in source.FOOD_CARE_TYPES
+        clips = tuple(f for f in source.CARE_TYPE_AUDIO_FILES.get(care_type, ()) if exists(f))
+        full_audio = next(
+            (f for f in source.FULL_TAG_AUDIO.get(care_type, ()) if exists(f)), None)
+        alert_audio = source.FULL_HUNGRY_AUDIO if is_food else source.FULL_ATTENTION_AUDIO
+        uid = parse_tag_id(tag_id)
+        entries[uid] = CareEntry(
+            uid=uid,
+            tag_id=format_tag_id(uid),
+            care_type=care_type,
+            is_food=is_food,
+            clips=clips,
+            full_audio=full_audio,
+            alert_audio=alert_audio if exists(alert_audio) else None,
+        )
+
+    missing = [f for f, ok in checked.items() if not ok]
+    for audio_file in missing:
+        print(f"[WARN] 音声ファイルが見つかりません: {audio_file}")
+    return CareTable(entries, missing)
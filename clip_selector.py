@@ -0,0 +1,169 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+音声選択モジュール for お世話ぬいぐるみプロジェクト
+お世話タイプごとの音声から、最近再生したものを避けて重み付きで1つ選ぶ
+
+- 重みはエイリアス法の表を起動時に作っておき、1回の抽選は定数時間
+- 直近 window 回に選んだ音声は、音声ごとの最終選択番号で定数時間で判定して引き直す
+- 再生履歴は固定長のリングバッファなので、長期間動かしてもメモリは増えない
+"""
+
+import random
+from typing import Dict, Iterable, List, Optional
+import config
+
+# 引き直しの上限 (超えたら候補を順に見て決める)
+MAX_ATTEMPTS = 8
+
+
+class RingBuffer:
+    """固定長のリングバッファ (古いものから上書き)"""
+
+    __slots__ = ('_items', '_next', '_count')
+
+    def __init__(self, size: int):
+        self._items = [None] * max(1, size)
+        self._next = 0
+        self._count = 0
+
+    def append(self, item):
+        """要素を追加 (満杯なら最も古い要素を上書き)"""
+        self._items[self._next] = item
+        self._next = (self._next + 1) % len(self._items)
+        if self._count < len(self._items):
+            self._count += 1
+
+    def last(self):
+        """最後に追加した要素 (空ならNone)"""
+        if not self._count:
+            return None
+        return self._items[self._next - 1]
+
+    def to_list(self) -> list:
+        """古い順のリストに変換"""
+        size = len(self._items)
+        start = (self._next - self._count) % size
+        return [self._items[(start + i) % size] for i in range(self._count)]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+
+def build_alias_table(weights: List[float]):
+    """Vose のエイリアス法の表を作る
+
+    Args:
+        weights: 各要素の重み (正の数)
+
+    Returns:
+        tuple: (確率の表, エイリアスの表)
+    """
+    n = len(weights)
+    total = float(sum(weights))
+    scaled = [w * n / total for w in weights]
+    prob = [0.0] * n
+    alias = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1.0 - scaled[s]
+        (small if scaled[l] < 1.0 else large).append(l)
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
+
+
+class _Pool:
+    """お世話タイプ1つ分の候補と最近の選択状況"""
+
+    __slots__ = ('clips', 'weights', 'prob', 'alias', 'last_seq', 'seq', 'window')
+
+    def __init__(self, clips: Iterable[str], weights: Dict[str, float], window: int):
+        self.clips = tuple(clips)
+        self.weights = tuple(max(0.0, float(weights.get(c, 1.0))) for c in self.clips)
+        if not any(self.weights):
+            self.weights = (1.0,) * len(self.clips)
+        self.prob, self.alias = build_alias_table(
+            [w if w > 0 else 1e-12 for w in self.weights])
+        # 候補が足りない時は全部避けてしまわないようにする
+        self.window = max(0, min(window, len(self.clips) - 1))
+        self.seq = 0
+        self.last_seq = [-self.window - 1] * len(self.clips)
+
+
+class ClipSelector:
+    """直近の重複を避けて音声を選ぶエンジン"""
+
+    def __init__(self, pools: Optional[Dict[str, List[str]]] = None,
+                 window: int = config.CLIP_NO_REPEAT_WINDOW,
+                 weights: Optional[Dict[str, float]] = None,
+                 rng: Optional[random.Random] = None):
+        """
+        Args:
+            pools: お世話タイプ -> 音声ファイルのリスト (省略時はCARE_TYPE_AUDIO_FILES)
+            window: 同じ音声を避ける直近の選択回数
+            weights: 音声ファイル -> 重み (省略時はCLIP_WEIGHTS、未指定の音声は1.0)
+            rng: 乱数生成器 (テストで固定したい時に渡す)
+        """
+        if pools is None:
+            pools = config.CARE_TYPE_AUDIO_FILES
+        if weights is None:
+            weights = config.CLIP_WEIGHTS
+        self.rng = rng or random.Random()
+        self._pools = {care_type: _Pool(clips, weights, window)
+                       for care_type, clips in pools.items() if clips}
+
+    def select(self, care_type: str) -> Optional[str]:
+        """音声を1つ選び、最近の選択として記録
+
+        Args:
+            care_type: お世話タイプ
+
+        Returns:
+            str or None: 音声ファイル名 (候補がなければNone)
+        """
+        pool = self._pools.get(care_type)
+        if pool is None:
+            return None
+        rng = self.rng.random
+        n = len(pool.clips)
+        horizon = pool.seq - pool.window
+        index = -1
+        for _ in range(MAX_ATTEMPTS):
+            u = rng() * n
+            i = int(u)
+            candidate = i if (u - i) < pool.prob[i] else pool.alias[i]
+            if pool.last_seq[candidate] <= horizon and pool.weights[candidate] > 0:
+                index = candidate
+                break
+        if index < 0:
+            index = self._fallback(pool, horizon)
+        pool.seq += 1
+        pool.last_seq[index] = pool.seq
+        return pool.clips[index]
+
+    def _fallback(self, pool: _Pool, horizon: int) -> int:
+        # 引き直しが続いた時は、避ける対象でない候補から重み付きで選ぶ
+        eligible = [i for i in range(len(pool.clips))
+                    if pool.last_seq[i] <= horizon and pool.weights[i] > 0]
+        if not eligible:
+            eligible = range(len(pool.clips))
+        total = sum(pool.weights[i] for i in eligible) or len(eligible)
+        r = self.rng.random() * total
+        for i in eligible:
+            r -= pool.weights[i] or 1.0
+            if r < 0:
+                return i
+        return eligible[-1]
+
+    def pool(self, care_type: str) -> tuple:
+        """お世話タイプの候補となる音声ファイル"""
+        pool = self._pools.get(care_type)
+        return pool.clips if pool else ()
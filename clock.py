@@ -0,0 +1,55 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+時計 for お世話ぬいぐるみプロジェクト
+時刻の取得と待機を差し替えられるようにする
+
+    SystemClock  : 本物の時刻 (通常の動作)
+    VirtualClock : 仮想時刻 (シミュレーション用。sleep() は待たずに時刻を進める)
+"""
+
+import time
+
+
+class SystemClock:
+    """本物の時刻"""
+
+    def time(self) -> float:
+        """UNIX時刻[秒]"""
+        return time.time()
+
+    def monotonic(self) -> float:
+        """単調増加する時刻[秒] (間隔の計測用)"""
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """仮想時刻 (進めない限り止まっている)"""
+
+    def __init__(self, start: float = 0.0):
+        self._start = start
+        self._elapsed = 0.0
+
+    def time(self) -> float:
+        return self._start + self._elapsed
+
+    def monotonic(self) -> float:
+        return self._elapsed
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        """時刻を seconds 秒進める"""
+        if seconds > 0:
+            self._elapsed += seconds
+
+    def advance_to(self, monotonic: float):
+        """時刻を monotonic() が指定の値になるまで進める (戻しはしない)"""
+        self._elapsed = max(self._elapsed, monotonic)
+
+
+SYSTEM_CLOCK = SystemClock()
@@ -118,6 +118,11 @@ CARE_TYPE_AUDIO_FILES = {
         "neapolitan/neapolitan_03.wav"
     ],
 }
+# 食べ物のお世話タイプ (空腹度が上がる。それ以外は仲良し度が上がる)
+FOOD_CARE_TYPES = frozenset({
+    "bread", "curry", "cookie", "strawberry", "hamburger_steak", "neapolitan",
+})
+
 # FULL回タグを読み取った時の音声ファイル
 FULL_TAG_AUDIO = {
     "sleep": ["status/full_sleep.wav"],
@@ -169,8 +174,21 @@ ATTENTION_ALERT_THRESHOLD = 0 # 仲良し閾値
 
 SAME_TAG_LIMIT = 5  #同じタグ連続読み取り可能回数
 
+# 音声選択の設定
+PLAY_HISTORY_SIZE = 32  # 再生履歴として残す件数
+CLIP_NO_REPEAT_WINDOW = 1  # 同じお世話で直近何回分の音声を避けるか
+CLIP_WEIGHTS = {
+    # "song/song_04.wav": 0.5,  # 音声ごとの選ばれやすさ (未指定は1.0)
+}
+
+STATUS_PRINT_INTERVAL = 10  # ステータス出力間隔[秒]
+
 BATTERY_CHECK_INTERVAL = 30        # 秒
 BATTERY_ALERT_COOLDOWN = 300       # 秒
+BATTERY_CHECK_INTERVAL_MIN = 5     # 低電圧中のチェック間隔[秒]
+BATTERY_CHECK_INTERVAL_MAX = 240   # 安定時に延ばす上限[秒]
+BATTERY_BACKEND = "auto"  # "auto" / "hwmon" / "mailbox" / "vcgencmd" / "none"
+BATTERY_ALERT_AUDIO_ENABLED = False  # 低電圧時にBATTERY_LOW_AUDIOを再生する
 
 LEVEL_UP_CONDITIONS = {
     2: {"care_count": 10, "hunger_ratio": 0.0, "attention_ratio": 0.0},
@@ -181,24 +199,182 @@ LEVEL_UP_CONDITIONS = {
 
 
 
+# 状態の保存設定
+STATE_PERSIST_ENABLED = True  # 電源が切れても状態を復元する
+STATE_DIR = PROJECT_ROOT / "state"
+STATE_FSYNC_INTERVAL = 30  # fsyncの最大間隔[秒]
+STATE_FSYNC_BYTES = 4096  # 未同期のバイト数がこれを超えたらすぐfsync
+STATE_JOURNAL_MAX_BYTES = 64 * 1024  # これを超えたらスナップショットに畳み込む
+
 """
 ----------起動モードの設定----------
 """
 # NFCリーダーのシミュレーション設定
 SIMULATE_NFC = False
 SIMULATE_NFC_IDS = list(TAG_TO_CARE_TYPE.keys())
+# 実機のタッチを記録するファイル (simulation.py で再生できる。Noneなら記録しない)
+TAP_TRACE_FILE = None  # 例: STATE_DIR / "taps.jsonl"
 
 # 音声再生設定
 AUDIO_VOLUME = 1.0  # 0.0 ~ 1.0
 
+# ミキサーの出力形式 (音声コンパイラもこの形式に変換する)
+MIXER_FREQUENCY = 24000  # サンプリング周波数[Hz]
+MIXER_SIZE = -16  # ビット深度 (負の値は符号付き)
+MIXER_CHANNELS = 1  # 1=モノラル, 2=ステレオ
+MIXER_BUFFER = 512  # バッファサイズ[サンプル]
+
+# ミキサーのプロファイル (mixer_profile.py)
+# python mixer_profile.py で測った周波数・バッファサイズがあれば、上の設定の代わりに使う
+MIXER_PROFILE_ENABLED = True
+MIXER_PROFILE_FILE = STATE_DIR / "mixer_profile.json"
+MIXER_CALIBRATION_BUFFERS = (128, 256, 512, 1024, 2048)  # 校正で試すバッファサイズ[サンプル]
+MIXER_UNDERRUN_TOLERANCE = 0.1  # 鳴り終わりがこれ以上遅れたら途切れたとみなす[秒]
+MIXER_UNDERRUN_LIMIT = 3  # 動作中に途切れがこの回数続いたらバッファを大きくする
+MIXER_UNDERRUN_WINDOW = 600  # 途切れを数える期間[秒]
+MIXER_BUFFER_MAX = 4096  # 途切れで大きくするバッファサイズの上限[サンプル]
+
+# コンパイル済み音声の設定 (python audio_compiler.py で生成)
+USE_COMPILED_AUDIO = True  # コンパイル済み音声があればそちらを再生する
+AUDIO_COMPILED_DIR = PROJECT_ROOT / "audio_compiled"
+AUDIO_MANIFEST_FILE = AUDIO_COMPILED_DIR / "manifest.json"
+SILENCE_THRESHOLD = 300  # 無音とみなす振幅 (16bit換算)
+SILENCE_PADDING_MS = 20  # 無音カット後に残す余白[ミリ秒]
+
+# 音声バンクの設定 (python audio_bank.py build で生成)
+USE_AUDIO_BANK = True  # 音声バンクがあればmmapして読み込む
+AUDIO_BANK_FILE = AUDIO_COMPILED_DIR / "clips.bank"
+AUDIO_BANK_VERIFY = False  # 起動時に全音声のCRCを検査する
+
+# 音声の優先度と、再生中に別の音声が来た時の扱い
+# priority が大きいほど優先。再生中の音声より優先度が高ければ on_lower、
+# 同じか低ければ on_busy の扱いになる ("preempt" / "overlay" / "queue" / "drop")
+AUDIO_POLICIES = {
+    "care":     {"priority": 0, "on_lower": "drop",    "on_busy": "drop"},   # タッチへの返事
+    "level_up": {"priority": 1, "on_lower": "queue",   "on_busy": "queue"},  # お世話の返事の後に鳴らす
+    "alert":    {"priority": 2, "on_lower": "overlay", "on_busy": "queue"},  # 空腹・さみしい・低電圧
+    "system":   {"priority": 3, "on_lower": "preempt", "on_busy": "queue"},  # 電源オンなど
+}
+# 終了イベントは音声の長さから見込んだ時刻に1回だけ確かめる。長さが分からない音声と、
+# 見込みを過ぎても鳴っている間だけ、この間隔で確かめ続ける[秒] (大きくすると起きる回数は減るが、
+# 鳴り終わってから次のタッチを受け付けるまでが最大でこの分遅れる)
+AUDIO_END_POLL_INTERVAL = 0.02
+AUDIO_QUEUE_MAX_SIZE = 4  # 再生待ちにできる音声の数
+AUDIO_QUEUE_MAX_LATENCY = 5.0  # 再生待ちの最大時間[秒] (過ぎたら鳴らさない)
+AUDIO_DUCK_VOLUME = 0.3  # 重ねて再生する間のメインの音量 (倍率)
+
+# 音声キャッシュ設定
+AUDIO_CACHE_ENABLED = True  # 起動時に音声をメモリへ先読みする
+AUDIO_CACHE_MAX_BYTES = 64 * 1024 * 1024  # デコード済み音声の上限[バイト]
+# 長い音声 (お歌など) は先頭だけデコードしておき、残りはストリーミングする (audio_policy.py)
+AUDIO_RESIDENT_MAX_SECONDS = 8.0  # これ以下の音声は全体をメモリに常駐させる
+AUDIO_STREAM_HEAD_SECONDS = 0.3  # 長い音声でメモリに置いておく先頭の長さ[秒]
+# 先頭と残りのつなぎ目で重ねる長さ[秒] (残りはこの分だけ前から書き出し、先頭が終わる前に鳴らし始める)
+AUDIO_TAIL_CROSSFADE = 0.03
+
+# メトリクス設定 (metrics.py)
+METRICS_ENABLED = False  # Trueなら処理時間・回数・状態を記録する
+METRICS_EXPORT = "textfile"  # "textfile" / "socket" / "none"
+METRICS_TEXTFILE = STATE_DIR / "osewa.prom"  # Prometheusのtextfile collector用
+METRICS_SOCKET = STATE_DIR / "metrics.sock"  # 接続すると現在の値を返す
+METRICS_EXPORT_INTERVAL = 15  # textfileの書き出し間隔[秒]
+
 # 省エネ設定
 POWER_SAVE_MODE = True
 POWER_SAVE_TIMEOUT = 60  # 秒単位、この時間何も操作がなければスリープモードに
+POWER_SAVE_BACKOFF_STEP = 10  # スリープ後、この秒数ごとに検知間隔を倍にする
+POWER_SAVE_IDLE_INTERVAL = 1.0  # スリープ中の検知間隔の上限（秒）
+POWER_SAVE_POLL_IDLE_INTERVAL = 12.0  # pollモードでのスリープ中の読み取り間隔の上限（秒、SCAN_INTERVALから倍にしていく）
+POWER_SAVE_RF_OFF = True  # スリープ中は検知の合間にリーダーのRFを止める
 SCAN_INTERVAL = 3.0  # NFC読み取り間隔（秒）
 
+# NFC読み取り方式
+# "continuous": nfcpyのconnectで連続検知 (タグを置いた瞬間に反応)
+# "poll": SCAN_INTERVALごとにスリープしてから読み取り (従来方式)
+NFC_SCAN_MODE = "continuous"
+NFC_SENSE_INTERVAL = 0.05  # 連続検知時のポーリング間隔（秒）
+NFC_SENSE_ITERATIONS = 20  # 停止確認までのポーリング回数
+NFC_DEBOUNCE_SECONDS = 0.3  # 離れてからこの時間内に同じタグが戻ったら、置いたままとみなす
+
+# NFCリーダーのエラー時の設定 (reader_health.py)
+NFC_DEGRADED_ERRORS = 3  # 通信エラーがこの回数続いたらリーダーを開き直す
+NFC_REOPEN_BACKOFF_BASE = 0.5  # 開き直しの最初の待ち時間[秒] (失敗するたびに倍)
+NFC_REOPEN_BACKOFF_MAX = 60.0  # 開き直しの待ち時間の上限[秒]
+NFC_REOPEN_MAX_ATTEMPTS = 5  # 開き直しがこの回数続けて失敗したらfailed扱い
+
+# 起動設定
+# Trueなら電源オンセリフの再生とNFCリーダーの準備を並行して行う
+FAST_STARTUP = True
+STARTUP_BUDGET_SECONDS = 3.0  # 起動から最初の発音までの目標[秒]
+
+# 実行方式
+# "thread": 定期処理ごとにスレッドを立てる (従来方式)
+# "asyncio": 1つのイベントループで定期処理をまとめて動かし、CPUの起床回数を減らす
+RUNTIME_MODE = "thread"
+
+# 複数台モード (python host_mode.py)
+# 1台のボードで複数のNFCリーダーとぬいぐるみを動かす。ぬいぐるみごとに状態を持ち、音声のキャッシュは共有する
+# name: 名前 (状態は STATE_DIR/name に保存)、path: nfcpyのデバイス指定、pan: 左右の振り分け (-1.0=左〜1.0=右)
+HOST_INSTANCES = [
+    {"name": "plush1", "path": "usb:001:004", "pan": -1.0},
+    {"name": "plush2", "path": "usb:001:005", "pan": 1.0},
+]
+# 複数台モードの出力 (2=ステレオにして左右のスピーカーに振り分ける)
+# MIXER_CHANNELS (モノラル) でコンパイルした音声・音声バンクとは形式が合わないので、
+# 複数台モードでは元の音声をデコードして鳴らす (1にすると使えるが、左右には振り分けない)
+HOST_MIXER_CHANNELS = 2
+
+# 設定の読み直し (config_reload.py)
+# 動かしたままタグ・お世話タイプ・音声の対応表などを差し替える。SIGHUP (kill -HUP <pid>) で読み直す
+CONFIG_RELOAD_ENABLED = True
+CONFIG_WATCH = True  # config.py の保存も検知して読み直す (inotify。Linuxのみ)
+CONFIG_RELOAD_DEBOUNCE = 0.5  # 保存を検知してから読み直すまでの待ち時間[秒]
+
+# 待機中の消費の計測 (idle_profiler.py)
+# 秒数を設定すると、起動して IDLE_PROFILE_WARMUP 秒後からその時間だけスレッドごとの起床・CPU時間を測って保存する
+IDLE_PROFILE_SECONDS = None  # Noneなら測らない 例: 300
+IDLE_PROFILE_WARMUP = 30  # 起動直後の読み込みを外すための待ち時間[秒]
+IDLE_PROFILE_DIR = STATE_DIR / "profiles"
+IDLE_PROFILE_EXIT = False  # Trueなら測り終えたら終了する
+
 # デバッグモード
 DEBUG = True
 
+# ログ設定 (event_log.py)
+# レベル: "debug" / "info" / "warn" / "error"
+LOG_LEVEL = None  # 全体のレベル (Noneなら DEBUG が True の時 "debug"、それ以外は "info")
+LOG_LEVELS = {}  # サブシステムごとのレベル 例: {"nfc": "warn", "audio": "debug"}
+LOG_STDOUT = True  # 標準出力 (journald) に書く
+LOG_FILE = None  # ログファイル (Noneなら書かない) 例: STATE_DIR / "osewa.log"
+LOG_FLUSH_INTERVAL = 0.5  # まとめて書き出す間隔[秒]
+LOG_QUEUE_MAX = 4096  # 書き出し待ちの最大件数 (超えたら古いものから捨てる)
+LOG_MAX_BYTES = 256 * 1024  # ログファイルがこれを超えたらローテーション
+LOG_BACKUP_COUNT = 3  # ローテーションで残す世代数
+LOG_FILE_WRITES_PER_HOUR = 60  # SDカードへの書き込みは1時間にこの回数まで
+LOG_FILE_BUFFER_MAX = 256 * 1024  # ファイルに書けずに溜めておく最大バイト数
+
+def get_all_audio_files():
+    """設定から参照されている全音声ファイルを重複なしで取得
+
+    Returns:
+        list: AUDIO_DIRからの相対パスのリスト (よく使う順)
+    """
+    files = []
+    for care_files in CARE_TYPE_AUDIO_FILES.values():
+        files.extend(care_files)
+    for full_files in FULL_TAG_AUDIO.values():
+        files.extend(full_files)
+    files.extend([
+        POWER_ON_AUDIO,
+        BATTERY_LOW_AUDIO,
+        HUNGRY_AUDIO,
+        LONELY_AUDIO,
+        FULL_HUNGRY_AUDIO,
+        FULL_ATTENTION_AUDIO,
+    ])
+    files.extend(LEVEL_AUDIO_BY_LEVEL.values())
+    return list(dict.fromkeys(files))
+
 # 設定の概要を表示
 def print_config():
     """現在の設定を表示"""
@@ -206,7 +382,10 @@ def print_config():
     print(f"音声ディレクトリ: {AUDIO_DIR}")
     print(f"NFCシミュレーション: {'有効' if SIMULATE_NFC else '無効'}")
     print(f"省エネモード: {'有効' if POWER_SAVE_MODE else '無効'}")
+    print(f"NFC読み取り方式: {NFC_SCAN_MODE}")
     print(f"スキャン間隔: {SCAN_INTERVAL}秒")
+    print(f"音声キャッシュ: {'有効' if AUDIO_CACHE_ENABLED else '無効'} "
+          f"(上限 {AUDIO_CACHE_MAX_BYTES // (1024 * 1024)}MB)")
     print(f"登録済みタグ数: {len(TAG_TO_CARE_TYPE)}")
     print("登録済みお世話内容:")
     for care_type, files in CARE_TYPE_AUDIO_FILES.items():
@@ -215,7 +394,3 @@ def print_config():
     for care_type, files in FULL_TAG_AUDIO.items():
         print(f"  - {care_type}: {len(files)}個の音声")
     print("=========================================")
-
-
-
-print_config()
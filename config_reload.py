@@ -0,0 +1,315 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+設定の読み直し for お世話ぬいぐるみプロジェクト
+動かしたまま config.py の対応表 (タグ・お世話タイプ・音声) を差し替える
+
+- きっかけは SIGHUP (kill -HUP <pid>) と、CONFIG_WATCH なら config.py の保存 (inotify)
+- 新しい config.py は別のモジュールとして読み込み、動作中の config には触らずに検査する
+- お世話テーブルと音声選択の表は "config-reload" スレッドで組み立て、新しく参照された音声も先に読んでおく
+- 差し替えは属性の代入だけ。タッチの処理はロックも待ちもなく、古い表か新しい表のどちらかを使う
+- 検査に失敗したら何も変えない (ログに理由を残して古い設定のまま動く)
+- ミキサーやリーダーの設定など、再起動しないと反映できない値は変わっていても警告だけ出す
+
+    python config_reload.py   # config.py を検査して差し替え対象の概要を表示 (動作中の本体には触らない)
+"""
+
+import os
+import sys
+import ctypes
+import ctypes.util
+import signal
+import struct
+import threading
+import importlib.util
+from types import ModuleType
+from typing import List
+import config
+import event_log
+import metrics
+from care_table import CareRules, CareTable, build_care_table
+from clip_selector import ClipSelector
+
+LOG = event_log.get_logger("config")
+
+CONFIG_RELOADS = metrics.counter(
+    "config_reloads_total", "設定を読み直して差し替えた回数")
+CONFIG_RELOAD_FAILURES = metrics.counter(
+    "config_reload_failures_total", "検査に失敗して差し替えなかった回数")
+
+# お世話テーブル・音声選択の表を組み立て直して差し替える値
+TABLE_NAMES = (
+    "TAG_TO_CARE_TYPE", "FOOD_CARE_TYPES", "CARE_TYPE_AUDIO_FILES", "FULL_TAG_AUDIO",
+    "FULL_HUNGRY_AUDIO", "FULL_ATTENTION_AUDIO", "CLIP_WEIGHTS", "CLIP_NO_REPEAT_WINDOW",
+)
+# 使う時に config から読んでいるので、代入するだけで反映される値
+LIVE_NAMES = (
+    "HUNGRY_AUDIO", "LONELY_AUDIO", "LEVEL_AUDIO_BY_LEVEL", "LEVEL_UP_CONDITIONS",
+    "HUNGER_GAIN", "ATTENTION_GAIN", "HUNGER_DECAY", "ATTENTION_DECAY",
+    "HUNGER_ALERT_THRESHOLD", "ATTENTION_ALERT_THRESHOLD", "SAME_TAG_LIMIT",
+    "LOG_LEVEL", "LOG_LEVELS",
+)
+
+# inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class ConfigError(Exception):
+    """新しい設定が使えない"""
+
+
+class Candidate:
+    """検査と組み立てが済んだ新しい設定"""
+
+    def __init__(self, module: ModuleType, table: CareTable, changed: List[str],
+                 restart_required: List[str], new_files: List[str]):
+        self.module = module
+        self.table = table
+        self.changed = changed                    # 差し替える値の名前
+        self.restart_required = restart_required  # 変わったが再起動まで反映されない値の名前
+        self.new_files = new_files                # 新しく参照された音声ファイル
+
+
+def load_module(path=None) -> ModuleType:
+    """config.py を動作中の config とは別のモジュールとして読み込む"""
+    path = path or config.__file__
+    spec = importlib.util.spec_from_file_location("config_candidate", path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except Exception as e:
+        raise ConfigError(f"読み込めません: {e!r}") from e
+    return module
+
+
+def _setting_names(module: ModuleType) -> List[str]:
+    return [name for name in vars(module) if name.isupper()]
+
+
+def validate(module: ModuleType):
+    """対応表の形と参照を確かめる (使えなければ ConfigError)"""
+    for name in TABLE_NAMES + LIVE_NAMES:
+        if not hasattr(module, name):
+            raise ConfigError(f"{name} がありません")
+    if not isinstance(module.TAG_TO_CARE_TYPE, dict) or \
+       not isinstance(module.CARE_TYPE_AUDIO_FILES, dict):
+        raise ConfigError("TAG_TO_CARE_TYPE / CARE_TYPE_AUDIO_FILES は dict にしてください")
+    for tag_id, care_type in module.TAG_TO_CARE_TYPE.items():
+        try:
+            bytes.fromhex(tag_id.replace(":", ""))
+        except (AttributeError, ValueError):
+            raise ConfigError(f"タグIDの形式が違います: {tag_id!r}") from None
+        if care_type not in module.CARE_TYPE_AUDIO_FILES:
+            raise ConfigError(f"{tag_id} のお世話タイプ {care_type!r} に音声がありません")
+    for name in ("LEVEL_AUDIO_BY_LEVEL", "LEVEL_UP_CONDITIONS", "LOG_LEVELS"):
+        if not isinstance(getattr(module, name), dict):
+            raise ConfigError(f"{name} は dict にしてください")
+    levels = list(module.LOG_LEVELS.values())
+    if module.LOG_LEVEL is not None:
+        levels.append(module.LOG_LEVEL)
+    for level in levels:
+        if level not in event_log.LEVELS:
+            raise ConfigError(f"ログのレベルが違います: {level!r}")
+
+
+def prepare(module: ModuleType) -> Candidate:
+    """新しい設定を検査し、お世話テーブルを組み立てる (動作中の状態は変えない)"""
+    validate(module)
+    try:
+        table = build_care_table(source=module)
+        # 重みの検査を兼ねて一度組み立てておく
+        ClipSelector(pools=table.pools, window=module.CLIP_NO_REPEAT_WINDOW,
+                     weights=module.CLIP_WEIGHTS)
+        all_files = module.get_all_audio_files()
+    except Exception as e:
+        raise ConfigError(f"お世話テーブルを組み立てられません: {e!r}") from e
+
+    reloadable = set(TABLE_NAMES + LIVE_NAMES)
+    changed, restart_required = [], []
+    for name in _setting_names(module):
+        if getattr(config, name, None) == getattr(module, name):
+            continue
+        if name in reloadable:
+            changed.append(name)
+        elif name != "SIMULATE_NFC_IDS":  # タグの一覧から作られる値なので数えない
+            restart_required.append(name)
+    current = set(config.get_all_audio_files())
+    new_files = [f for f in all_files
+                 if f not in current and (module.AUDIO_DIR / f).exists()]
+    return Candidate(module, table, changed, restart_required, new_files)
+
+
+def prewarm(apps, new_files: List[str]):
+    """新しく参照された音声を先に読んでおく (初回のタッチで読み込みを待たせない)"""
+    if not new_files:
+        return
+    warmed = set()
+    for app in apps:
+        player = app.player
+        if player is None or id(player) in warmed:
+            continue
+        warmed.add(id(player))
+        player.register_known_files(new_files)
+        player.preload(new_files, background=False)
+
+
+def apply(apps, candidate: Candidate):
+    """組み立て済みの表に差し替える (代入だけなのでタッチの処理を止めない)"""
+    module = candidate.module
+    for app in apps:
+        # 表と選び方は組にして1回の代入で差し替える (タッチの処理は組を1回だけ読む)
+        app.care = CareRules(candidate.table,
+                             ClipSelector(pools=candidate.table.pools,
+                                          window=module.CLIP_NO_REPEAT_WINDOW,
+                                          weights=module.CLIP_WEIGHTS, rng=app.rng))
+    for name in TABLE_NAMES + LIVE_NAMES:
+        setattr(config, name, getattr(module, name))
+    event_log.configure()
+
+
+class ConfigReloader:
+    """SIGHUP・config.py の保存をきっかけに設定を読み直す"""
+
+    def __init__(self, apps, path=None, watch: bool = config.CONFIG_WATCH,
+                 debounce: float = config.CONFIG_RELOAD_DEBOUNCE):
+        """
+        Args:
+            apps: 差し替える OsewaNuigurumiMain のリスト
+            path: 読み直す設定ファイル (省略時は config.py)
+            watch: Trueなら inotify でファイルの保存を監視する
+            debounce: 保存を検知してから読み直すまでの待ち時間[秒] (続けて保存された分をまとめる)
+        """
+        self.apps = list(apps)
+        self.path = os.path.abspath(path or config.__file__)
+        self.watch = watch
+        self.debounce = debounce
+        self.reloads = 0
+        self.failures = 0
+        self._reason = None
+        self._request = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._watch_fd = None
+
+    def start(self):
+        """読み直しスレッドを起動し、SIGHUP とファイルの監視を登録する"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="config-reload", daemon=True)
+        self._thread.start()
+        if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.request("sighup"))
+        if self.watch:
+            self._start_watch()
+
+    def stop(self):
+        self._stop_event.set()
+        self._request.set()
+        if self._watch_fd is not None:
+            try:
+                os.close(self._watch_fd)
+            except OSError:
+                pass
+            self._watch_fd = None
+
+    def request(self, reason: str = "manual"):
+        """読み直しを頼む (すぐ戻る。実際の読み直しは "config-reload" スレッドで行う)"""
+        self._reason = reason
+        self._request.set()
+
+    def reload(self) -> bool:
+        """今すぐ読み直す (呼び出したスレッドで行う)
+
+        Returns:
+            bool: 差し替えたかどうか
+        """
+        try:
+            candidate = prepare(load_module(self.path))
+        except ConfigError as e:
+            self.failures += 1
+            CONFIG_RELOAD_FAILURES.inc()
+            LOG.error("reload_rejected", reason=e)
+            return False
+        if candidate.restart_required:
+            LOG.warn("restart_required", names=",".join(candidate.restart_required))
+        if not candidate.changed:
+            LOG.info("reload_unchanged")
+            return False
+        prewarm(self.apps, candidate.new_files)
+        apply(self.apps, candidate)
+        self.reloads += 1
+        CONFIG_RELOADS.inc()
+        LOG.info("reloaded", names=",".join(candidate.changed), tags=len(candidate.table),
+                 new_files=len(candidate.new_files), missing=len(candidate.table.missing))
+        return True
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._request.wait()
+            if self._stop_event.is_set():
+                return
+            # 保存が続いている間は待ってまとめる
+            while True:
+                self._request.clear()
+                if not self._stop_event.wait(self.debounce) and self._request.is_set():
+                    continue
+                break
+            if self._stop_event.is_set():
+                return
+            LOG.info("reload_requested", reason=self._reason)
+            try:
+                self.reload()
+            except Exception as e:
+                LOG.error("reload_error", error=e)
+
+    def _start_watch(self):
+        """config.py のあるディレクトリを inotify で監視する (使えなければ SIGHUP のみ)"""
+        libc_name = ctypes.util.find_library("c")
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1")
+            directory = os.path.dirname(self.path).encode()
+            if libc.inotify_add_watch(fd, directory, IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch")
+        except (OSError, AttributeError) as e:
+            LOG.warn("watch_unavailable", error=e)
+            return
+        self._watch_fd = fd
+        threading.Thread(target=self._watch_loop, args=(fd,), name="config-watch",
+                         daemon=True).start()
+
+    def _watch_loop(self, fd: int):
+        name = os.path.basename(self.path).encode()
+        while not self._stop_event.is_set():
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                return
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                start = offset + _EVENT_HEADER.size
+                if data[start:start + length].rstrip(b"\0") == name:
+                    self.request("watch")
+                offset = start + length
+
+
+def main(argv=None):
+    try:
+        candidate = prepare(load_module())
+    except ConfigError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    print(f"タグ: {len(candidate.table)}件 / 音声: {len(candidate.table.audio_files)}件")
+    for audio_file in candidate.table.missing:
+        print(f"  見つからない音声: {audio_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
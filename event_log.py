@@ -0,0 +1,309 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+ログ for お世話ぬいぐるみプロジェクト
+動作中のログを記録する。タッチの処理やNFCの読み取りスレッドを書き込みで止めない
+
+- 記録する側はキューに積むだけ (deque.append。ロックもI/Oもしない)
+- 書き込みスレッドはログが来るまで眠っていて、最初の1件から LOG_FLUSH_INTERVAL 待って
+  その間に来た分をまとめて標準出力・ファイルに書く (ログがなければ起きない)
+- ファイルは LOG_MAX_BYTES でローテーションし、SDカードへの書き込みは1時間に
+  LOG_FILE_WRITES_PER_HOUR 回まで (間に合わない分はメモリに溜めておく)
+- レベルはサブシステムごと (LOG_LEVELS)。レベル未満のログは値を文字列にする前に捨てる
+- 1件は (時刻, レベル, サブシステム, イベント名, 値) の構造化レコード
+  標準出力には1行のテキスト、ファイルには1行のJSONで書く
+
+    log = event_log.get_logger("nfc")
+    log.info("read", uid=uid)
+"""
+
+import sys
+import json
+import time
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional
+import config
+import metrics
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warn": WARN, "error": ERROR}
+_LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+_LEVEL_CHARS = {DEBUG: "D", INFO: "I", WARN: "W", ERROR: "E"}
+
+LOG_DROPPED = metrics.counter(
+    "log_dropped_total", "書き込みが間に合わずに捨てたログの件数")
+LOG_FILE_WRITES = metrics.counter(
+    "log_file_writes_total", "ログファイルへの書き込み回数")
+
+_queue = deque(maxlen=config.LOG_QUEUE_MAX)
+_pending = threading.Event()  # キューが空でなくなったら書き込みスレッドを起こす
+_loggers: Dict[str, 'Logger'] = {}
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _default_level() -> int:
+    if config.LOG_LEVEL is None:
+        return DEBUG if config.DEBUG else INFO
+    return LEVELS[config.LOG_LEVEL]
+
+
+class Logger:
+    """サブシステムごとのロガー"""
+
+    __slots__ = ("subsystem", "level")
+
+    def __init__(self, subsystem: str, level: int):
+        self.subsystem = subsystem
+        self.level = level
+
+    def enabled(self, level: int) -> bool:
+        """そのレベルのログを記録するか (値の用意が重い時に先に確かめる)"""
+        return level >= self.level
+
+    def log(self, level: int, event: str, /, **fields):
+        if level < self.level:
+            return
+        if len(_queue) == _queue.maxlen:
+            LOG_DROPPED.inc()
+        _queue.append((time.time(), level, self.subsystem, event, fields))
+        if not _pending.is_set():
+            _pending.set()
+
+    def debug(self, event: str, /, **fields):
+        if self.level <= DEBUG:
+            self.log(DEBUG, event, **fields)
+
+    def info(self, event: str, /, **fields):
+        if self.level <= INFO:
+            self.log(INFO, event, **fields)
+
+    def warn(self, event: str, /, **fields):
+        if self.level <= WARN:
+            self.log(WARN, event, **fields)
+
+    def error(self, event: str, /, **fields):
+        self.log(ERROR, event, **fields)
+
+
+def get_logger(subsystem: str) -> Logger:
+    """サブシステムのロガーを取得 (同じ名前なら同じロガー)"""
+    logger = _loggers.get(subsystem)
+    if logger is None:
+        level = config.LOG_LEVELS.get(subsystem)
+        logger = Logger(subsystem, LEVELS[level] if level else _default_level())
+        _loggers[subsystem] = logger
+    return logger
+
+
+def configure():
+    """設定のレベルを作成済みのロガーに反映する"""
+    default = _default_level()
+    for subsystem, logger in _loggers.items():
+        level = config.LOG_LEVELS.get(subsystem)
+        logger.level = LEVELS[level] if level else default
+
+
+def _format_value(value) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex(":").upper()  # タグのUID
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def format_text(record: tuple) -> str:
+    """1件を標準出力用の1行にする"""
+    timestamp, level, subsystem, event, fields = record
+    clock = time.strftime("%H:%M:%S", time.localtime(timestamp))
+    parts = [f"{clock}.{int(timestamp * 1000) % 1000:03d}",
+             _LEVEL_CHARS[level], subsystem, event]
+    parts.extend(f"{key}={_format_value(value)}" for key, value in fields.items())
+    return " ".join(parts)
+
+
+def format_json(record: tuple) -> str:
+    """1件をファイル用のJSON1行にする"""
+    timestamp, level, subsystem, event, fields = record
+    line = {"t": round(timestamp, 3), "lv": _LEVEL_NAMES[level],
+            "sub": subsystem, "ev": event}
+    for key, value in fields.items():
+        line[key] = value if isinstance(value, (int, float, bool, type(None))) \
+            else _format_value(value)
+    return json.dumps(line, ensure_ascii=False)
+
+
+class RotatingFile:
+    """サイズでローテーションし、書き込み回数を制限するログファイル"""
+
+    def __init__(self, path: Path, max_bytes: int = config.LOG_MAX_BYTES,
+                 backup_count: int = config.LOG_BACKUP_COUNT,
+                 writes_per_hour: int = config.LOG_FILE_WRITES_PER_HOUR,
+                 buffer_max: int = config.LOG_FILE_BUFFER_MAX,
+                 clock=time.monotonic):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.writes_per_hour = writes_per_hour
+        self.min_gap = 3600.0 / writes_per_hour if writes_per_hour else 0.0
+        self.buffer_max = buffer_max
+        self.clock = clock
+        self.writes = 0
+        self.dropped = 0
+        self._lines = deque()
+        self._buffered = 0
+        self._urgent = False
+        self._window_start = clock()
+        self._window_writes = 0
+        self._last_write = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def add(self, line: str, urgent: bool = False):
+        """1行を溜める (urgent なら次の機会にすぐ書く)"""
+        data = (line + "\n").encode("utf-8")
+        self._lines.append(data)
+        self._buffered += len(data)
+        self._urgent = self._urgent or urgent
+        while self._buffered > self.buffer_max and self._lines:
+            # 書き込み回数の上限で溜まりすぎたら古いものから捨てる
+            self._buffered -= len(self._lines.popleft())
+            self.dropped += 1
+            LOG_DROPPED.inc()
+
+    def pending_delay(self) -> Optional[float]:
+        """溜めた分を書けるようになるまでの秒数 (溜めた分がなければNone)"""
+        if not self._lines:
+            return None
+        now = self.clock()
+        if self.writes_per_hour and self._window_writes >= self.writes_per_hour:
+            return max(0.0, self._window_start + 3600 - now)
+        if self._urgent or self._last_write is None:
+            return 0.0
+        return max(0.0, self._last_write + self.min_gap - now)
+
+    def maybe_write(self, force: bool = False) -> bool:
+        """書き込み回数の上限内なら溜めた分を書く
+
+        Returns:
+            bool: 書いたかどうか
+        """
+        if not self._lines:
+            return False
+        now = self.clock()
+        if now - self._window_start >= 3600:
+            self._window_start = now
+            self._window_writes = 0
+        if not force:
+            if self.writes_per_hour and self._window_writes >= self.writes_per_hour:
+                return False
+            # 警告以上は間隔を待たずに書く
+            if not self._urgent and self._last_write is not None and \
+               now - self._last_write < self.min_gap:
+                return False
+        data = b"".join(self._lines)
+        self._lines.clear()
+        self._buffered = 0
+        self._urgent = False
+        if self._size + len(data) > self.max_bytes and self._size:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self._last_write = now
+        self._window_writes += 1
+        self.writes += 1
+        LOG_FILE_WRITES.inc()
+        return True
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                src.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backup_count:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._file = open(self.path, "ab")
+        self._size = 0
+
+    def close(self):
+        self.maybe_write(force=True)
+        self._file.close()
+
+
+class LogWriter(threading.Thread):
+    """キューに積まれたログをまとめて書き出すスレッド"""
+
+    def __init__(self, stream=None, path: Optional[Path] = None,
+                 interval: float = config.LOG_FLUSH_INTERVAL):
+        super().__init__(daemon=True, name="log-writer")
+        self.stream = stream
+        self.file = RotatingFile(path) if path else None
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._flush_lock = threading.Lock()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            # ログが来るまで (ファイルに書けずに溜めた分があれば、書けるようになるまで) 眠る
+            delay = self.file.pending_delay() if self.file is not None else None
+            _pending.wait(delay)
+            if self._stop_event.wait(self.interval):
+                break
+            _pending.clear()
+            self.flush()
+
+    def flush(self, force: bool = False):
+        """キューの中身を書き出す"""
+        with self._flush_lock:
+            lines = []
+            while _queue:
+                record = _queue.popleft()
+                if self.stream is not None:
+                    lines.append(format_text(record))
+                if self.file is not None:
+                    self.file.add(format_json(record), urgent=record[1] >= WARN)
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass
+            if self.file is not None:
+                try:
+                    self.file.maybe_write(force=force)
+                except OSError:
+                    pass
+
+    def stop(self):
+        self._stop_event.set()
+        _pending.set()
+        self.flush(force=True)
+        if self.file is not None:
+            self.file.close()
+
+
+def start() -> LogWriter:
+    """書き込みスレッドを起動する (起動済みならそれを返す)"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            stream = sys.stdout if config.LOG_STDOUT else None
+            _writer = LogWriter(stream, config.LOG_FILE)
+            _writer.start()
+        return _writer
+
+
+def flush():
+    """溜まっているログを今すぐ書き出す (終了時用。書き込み回数の上限は無視する)"""
+    if _writer is not None:
+        _writer.flush(force=True)
@@ -0,0 +1,179 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+複数台モード for お世話ぬいぐるみプロジェクト
+1台のボードで複数のNFCリーダーとぬいぐるみを動かす (教室・施設向け)
+
+- ぬいぐるみごとに OsewaNuigurumiMain を1つ作り、状態は STATE_DIR/名前 に別々に保存する
+- ミキサーとデコード済み音声のキャッシュは全員で共有する
+- NFCリーダーはそれぞれ専用のスレッドで同時に読み取る (nfcpyのconnectはブロッキングのため)
+- 音声はぬいぐるみごとに専用のミキサーチャンネルで鳴らし、左右の振り分け (pan) で出力先を分ける
+
+ミキサーはプロセスに1つなので、別々のサウンドカードに出したい時はぬいぐるみごとにプロセスを分けること
+左右に振り分けるためミキサーはステレオで開くので、モノラルでコンパイルした音声・音声バンクは使わず、
+元の音声をデコードして鳴らす (起動時に警告をログに出す)
+
+    python host_mode.py
+"""
+
+import time
+import threading
+from typing import List, Optional
+import config
+import metrics
+import event_log
+import idle_profiler
+import mixer_profile
+import audio_assets
+from battery_monitor import BatteryMonitor
+from main import OsewaNuigurumiMain
+
+LOG = event_log.get_logger("host")
+
+
+class HostMode:
+    """複数のぬいぐるみを1つのプロセスで動かす"""
+
+    def __init__(self, instances: Optional[List[dict]] = None):
+        """
+        Args:
+            instances: ぬいぐるみの構成 {"name", "path", "pan"} のリスト (省略時はHOST_INSTANCES)
+        """
+        self.instances = instances if instances is not None else config.HOST_INSTANCES
+        self.apps: List[OsewaNuigurumiMain] = []
+        self.cache = None
+        self.battery = None
+        self.metrics_exporter = None
+        self.config_reloader = None
+        self.idle_profiler = None
+        self.running = False
+
+    def setup(self):
+        """ミキサー・共有キャッシュ・各ぬいぐるみを準備"""
+        if self.apps:
+            return
+        import pygame
+        from audio_cache import AudioCache
+        from audio_player import AudioPlayer
+        from nfc_reader import NFCReader
+
+        # 全員で1つのミキサーを使う (チャンネルはぬいぐるみごとに2本ずつ)
+        pygame.mixer.init(**mixer_profile.output_settings(channels=config.HOST_MIXER_CHANNELS))
+        pygame.mixer.set_num_channels(2 * len(self.instances))
+        self._check_compiled_format(pygame.mixer.get_init())
+        if config.AUDIO_CACHE_ENABLED:
+            self.cache = AudioCache(config.AUDIO_CACHE_MAX_BYTES)
+
+        for i, spec in enumerate(self.instances):
+            name = spec["name"]
+            # musicのストリーミングは1本しかないので、全員チャンネルで再生する
+            player = AudioPlayer(cache=self.cache, channels=(2 * i, 2 * i + 1),
+                                 pan=spec.get("pan"), streaming=False)
+            if i == 0 and self.cache:
+                # 音声バンクがあればそこから読む
+                self.cache.loader = player.load_sound
+            reader = NFCReader(spec["path"], name=f"nfc-reader-{name}")
+            self.apps.append(OsewaNuigurumiMain(
+                name=name, reader=reader, player=player,
+                state_dir=config.STATE_DIR / name))
+
+        # 共有キャッシュへの先読みは1回だけ (各ぬいぐるみの先読みはすぐ終わる)
+        if self.cache:
+            self.cache.preload(config.get_all_audio_files(), background=False)
+        # リーダーのUSB認識は全員並行して行う
+        threads = [threading.Thread(target=app.setup, name=f"setup-{app.name}", daemon=True)
+                   for app in self.apps]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _check_compiled_format(self, mixer_init):
+        """コンパイル済み音声がミキサーの形式と合わず使えない時に警告する"""
+        if not config.USE_COMPILED_AUDIO:
+            return
+        manifest = audio_assets.load_manifest()
+        if manifest is None:
+            return
+        fmt = manifest.get("format", {})
+        compiled = (fmt.get("frequency"), fmt.get("size"), fmt.get("channels"))
+        if compiled != tuple(mixer_init):
+            LOG.warn("compiled_audio_unused", compiled=compiled, mixer=tuple(mixer_init),
+                     hint="元の音声をデコードして鳴らします (HOST_MIXER_CHANNELSを確認)")
+
+    def start(self):
+        """複数台モード開始"""
+        print(f"[START] 複数台モード: {len(self.instances)}台")
+        self.setup()
+        config.print_config()
+
+        self.running = True
+        for app in self.apps:
+            app.running = True
+        event_log.start()
+        self.metrics_exporter = metrics.start_exporter()
+        if config.CONFIG_RELOAD_ENABLED:
+            from config_reload import ConfigReloader
+            self.config_reloader = ConfigReloader(self.apps)
+            self.config_reloader.start()
+        self.idle_profiler = idle_profiler.start()
+        # 電圧はボード1つ分なので1つだけ監視し、お知らせは最初のぬいぐるみで鳴らす
+        self.battery = BatteryMonitor(self.apps[0].audio)
+        self.battery.subscribe(self.apps[0]._on_battery_reading)
+        self.battery.start()
+
+        threading.Thread(target=self._status_loop, name="status", daemon=True).start()
+        threading.Thread(target=self._decay_loop, name="decay", daemon=True).start()
+        for app in self.apps:
+            app.reader.start(callback=app.on_tag_read, on_event=app.on_tag_event)
+
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        """全員を停止"""
+        if not self.running:
+            return
+        self.running = False
+        for app in self.apps:
+            app.stop()
+        if self.battery:
+            self.battery.stop()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        if self.config_reloader:
+            self.config_reloader.stop()
+        if self.idle_profiler:
+            self.idle_profiler.stop()
+
+    def _status_loop(self):
+        while self.running:
+            for app in self.apps:
+                app.print_status()
+            time.sleep(config.STATUS_PRINT_INTERVAL)
+
+    def _decay_loop(self):
+        while self.running:
+            time.sleep(config.STATUS_DECAY_INTERVAL)
+            for app in self.apps:
+                app.decay_tick()
+
+    def get_status(self) -> dict:
+        """ぬいぐるみごとのステータス
+
+        Returns:
+            dict: 名前 -> get_status() の結果
+        """
+        return {app.name: app.get_status() for app in self.apps}
+
+
+def main():
+    host = HostMode()
+    host.start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+待機中の消費の計測 for お世話ぬいぐるみプロジェクト
+ぬいぐるみを置いたまま触らずにいる間、どのスレッドがCPUを起こしているかを数える
+
+- /proc/self/task/<tid> からスレッドごとのCPU時間・起床回数・システムコール回数を読む
+    CPU時間          : schedstat (なければ stat の utime + stime)
+    起床回数         : status の voluntary_ctxt_switches (待ちから起きた回数)
+    割り込まれた回数 : status の nonvoluntary_ctxt_switches
+    システムコール   : io の syscr + syscw (読み書き系のみ。全種類はカーネルからは数えられない)
+- スレッド名は threading の名前 (battery, status, decay, nfc-reader, audio-events など) で集計する
+- 計測の始めと終わりの2回だけ読むので、計測自体はほとんど起床を増やさない
+- 結果は設定値と一緒に JSON で保存し、リリースや設定 (SCAN_INTERVAL、POWER_SAVE_MODE など) ごとに比べられる
+
+    python idle_profiler.py --window 300                      # 起動して5分間測り、保存して終了
+    python idle_profiler.py --window 300 --set SCAN_INTERVAL=1.0 --set POWER_SAVE_MODE=false
+    python idle_profiler.py --host --window 300               # 複数台モードで測る
+    python idle_profiler.py --compare a.json b.json           # 2つの結果を比べる
+
+本体の動作中に測る場合は config.py の IDLE_PROFILE_SECONDS を設定する
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+import config
+
+# event_log・metrics はここでは読み込まない。import 時に config の値 (METRICS_ENABLED、
+# LOG_FLUSH_INTERVAL など) を使うので、コマンドの --set を反映してから読み込む
+
+_TASK_DIR = Path("/proc/self/task")
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+# 結果に一緒に残す設定 (待機中の消費に効くもの)
+PROFILE_CONFIG_NAMES = (
+    "RUNTIME_MODE", "SCAN_INTERVAL", "NFC_SCAN_MODE", "NFC_SENSE_INTERVAL",
+    "POWER_SAVE_MODE", "POWER_SAVE_TIMEOUT", "POWER_SAVE_IDLE_INTERVAL", "POWER_SAVE_RF_OFF",
+    "BATTERY_CHECK_INTERVAL", "BATTERY_CHECK_INTERVAL_MAX", "STATUS_PRINT_INTERVAL",
+    "STATUS_DECAY_INTERVAL", "LOG_FLUSH_INTERVAL", "METRICS_ENABLED", "METRICS_EXPORT",
+    "METRICS_EXPORT_INTERVAL", "CONFIG_WATCH", "SIMULATE_NFC",
+)
+
+
+class ThreadSample(NamedTuple):
+    """ある時点のスレッド1本分の累計値"""
+    tid: int
+    name: str
+    cpu: float           # CPU時間[秒]
+    wakeups: int         # 自分から待って起きた回数
+    preempted: int       # 割り込まれた回数
+    syscalls: int        # 読み書き系のシステムコール回数
+
+
+def _thread_names() -> Dict[int, str]:
+    return {t.native_id: t.name for t in threading.enumerate() if t.native_id}
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _fields(text: Optional[str]) -> Dict[str, int]:
+    values = {}
+    for line in (text or "").splitlines():
+        key, _, value = line.partition(":")
+        value = value.split()
+        if value and value[0].isdigit():
+            values[key] = int(value[0])
+    return values
+
+
+def read_thread(tid: int, name: Optional[str] = None) -> Optional[ThreadSample]:
+    """1本のスレッドの累計値を読む (終了していたらNone)"""
+    task = _TASK_DIR / str(tid)
+    stat = _read(task / "stat")
+    if stat is None:
+        return None
+    # comm に空白や括弧が入っていても崩れないよう、最後の ")" から後ろを分ける
+    comm = stat[stat.index("(") + 1:stat.rindex(")")]
+    rest = stat[stat.rindex(")") + 2:].split()
+    schedstat = _read(task / "schedstat")
+    if schedstat:
+        cpu = int(schedstat.split()[0]) / 1e9
+    else:
+        cpu = (int(rest[11]) + int(rest[12])) / _CLK_TCK  # utime + stime
+    status = _fields(_read(task / "status"))
+    io = _fields(_read(task / "io"))
+    return ThreadSample(
+        tid=tid,
+        name=name or f"native:{comm}",  # SDLの音声スレッドなど Python 以外のスレッド
+        cpu=cpu,
+        wakeups=status.get("voluntary_ctxt_switches", 0),
+        preempted=status.get("nonvoluntary_ctxt_switches", 0),
+        syscalls=io.get("syscr", 0) + io.get("syscw", 0),
+    )
+
+
+def sample() -> Dict[int, ThreadSample]:
+    """プロセスの全スレッドの累計値を読む"""
+    names = _thread_names()
+    samples = {}
+    try:
+        tids = [int(tid) for tid in os.listdir(_TASK_DIR)]
+    except OSError:
+        return samples
+    for tid in tids:
+        thread = read_thread(tid, names.get(tid))
+        if thread is not None:
+            samples[tid] = thread
+    return samples
+
+
+def diff(before: Dict[int, ThreadSample], after: Dict[int, ThreadSample],
+         window: float) -> List[dict]:
+    """2回の読み取りの差をスレッドごとにまとめる (途中で始まったスレッドは0から数える)"""
+    rows = []
+    for tid, end in after.items():
+        start = before.get(tid)
+        cpu = end.cpu - (start.cpu if start else 0.0)
+        wakeups = end.wakeups - (start.wakeups if start else 0)
+        preempted = end.preempted - (start.preempted if start else 0)
+        syscalls = end.syscalls - (start.syscalls if start else 0)
+        rows.append({
+            "name": end.name,
+            "tid": tid,
+            "cpu_seconds": round(cpu, 6),
+            "cpu_percent": round(100.0 * cpu / window, 4),
+            "wakeups": wakeups,
+            "wakeups_per_sec": round(wakeups / window, 3),
+            "preempted": preempted,
+            "syscalls": syscalls,
+            "syscalls_per_sec": round(syscalls / window, 3),
+        })
+    rows.sort(key=lambda row: (-row["wakeups"], -row["cpu_seconds"]))
+    return rows
+
+
+def _total(rows: List[dict], window: float) -> dict:
+    cpu = sum(row["cpu_seconds"] for row in rows)
+    wakeups = sum(row["wakeups"] for row in rows)
+    syscalls = sum(row["syscalls"] for row in rows)
+    return {
+        "cpu_seconds": round(cpu, 6),
+        "cpu_percent": round(100.0 * cpu / window, 4),
+        "wakeups": wakeups,
+        "wakeups_per_sec": round(wakeups / window, 3),
+        "syscalls": syscalls,
+        "syscalls_per_sec": round(syscalls / window, 3),
+    }
+
+
+def profile(window: float, stop_event: Optional[threading.Event] = None) -> dict:
+    """window 秒間測って結果を返す
+
+    Args:
+        window: 計測時間[秒]
+        stop_event: セットされたらそこで打ち切る (結果はそこまでの時間で割る)
+    """
+    started_at = time.time()
+    before = sample()
+    started = time.monotonic()
+    if stop_event is not None:
+        stop_event.wait(window)
+    else:
+        time.sleep(window)
+    after = sample()
+    elapsed = max(time.monotonic() - started, 1e-9)
+    rows = diff(before, after, elapsed)
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started_at)),
+        "window": round(elapsed, 3),
+        "config": {name: getattr(config, name, None) for name in PROFILE_CONFIG_NAMES},
+        "threads": rows,
+        "total": _total(rows, elapsed),
+    }
+
+
+def save_report(report: dict, directory: Optional[Path] = None) -> Path:
+    """結果をJSONで保存"""
+    directory = Path(directory or config.IDLE_PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = report["started_at"].replace(":", "").replace("-", "")
+    path = directory / f"idle-{stamp}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1, default=str)
+    return path
+
+
+def _group(rows: List[dict]) -> Dict[str, dict]:
+    # 同じ名前のスレッド (native:python など) はまとめる
+    groups = {}
+    for row in rows:
+        group = groups.setdefault(row["name"], {"cpu_percent": 0.0, "wakeups_per_sec": 0.0,
+                                                "syscalls_per_sec": 0.0})
+        for key in group:
+            group[key] += row[key]
+    return groups
+
+
+def print_report(report: dict, out=sys.stdout):
+    """結果を表で出力"""
+    print(f"==== 待機中の消費 ({report['window']:.0f}秒) ====", file=out)
+    print(f"{'スレッド':24} {'起床/秒':>8} {'CPU%':>8} {'syscall/秒':>10}", file=out)
+    for name, row in _group(report["threads"]).items():
+        print(f"{name:24} {row['wakeups_per_sec']:8.2f} {row['cpu_percent']:8.3f} "
+              f"{row['syscalls_per_sec']:10.2f}", file=out)
+    total = report["total"]
+    print(f"{'合計':24} {total['wakeups_per_sec']:8.2f} {total['cpu_percent']:8.3f} "
+          f"{total['syscalls_per_sec']:10.2f}", file=out)
+
+
+def print_compare(a: dict, b: dict, out=sys.stdout):
+    """2つの結果をスレッドごとに並べる"""
+    changed = [name for name in PROFILE_CONFIG_NAMES
+               if a["config"].get(name) != b["config"].get(name)]
+    for name in changed:
+        print(f"  {name}: {a['config'].get(name)} -> {b['config'].get(name)}", file=out)
+    groups_a, groups_b = _group(a["threads"]), _group(b["threads"])
+    zero = {"cpu_percent": 0.0, "wakeups_per_sec": 0.0}
+    print(f"{'スレッド':24} {'起床/秒':>17} {'CPU%':>19}", file=out)
+    for name in dict.fromkeys(list(groups_a) + list(groups_b)):
+        ra, rb = groups_a.get(name, zero), groups_b.get(name, zero)
+        print(f"{name:24} {ra['wakeups_per_sec']:7.2f} -> {rb['wakeups_per_sec']:7.2f} "
+              f"{ra['cpu_percent']:8.3f} -> {rb['cpu_percent']:8.3f}", file=out)
+    ta, tb = a["total"], b["total"]
+    print(f"{'合計':24} {ta['wakeups_per_sec']:7.2f} -> {tb['wakeups_per_sec']:7.2f} "
+          f"{ta['cpu_percent']:8.3f} -> {tb['cpu_percent']:8.3f}", file=out)
+
+
+class IdleProfiler(threading.Thread):
+    """本体の起動後、落ち着くのを待ってから測って保存するスレッド"""
+
+    def __init__(self, window: float = None, warmup: float = None, exit_after: bool = None):
+        super().__init__(daemon=True, name="idle-profiler")
+        self.window = window if window is not None else config.IDLE_PROFILE_SECONDS
+        self.warmup = warmup if warmup is not None else config.IDLE_PROFILE_WARMUP
+        self.exit_after = config.IDLE_PROFILE_EXIT if exit_after is None else exit_after
+        self.report = None
+        self.path = None
+        self._stop_event = threading.Event()
+        import event_log
+        self.log = event_log.get_logger("profile")
+
+    def run(self):
+        if self._stop_event.wait(self.warmup):
+            return
+        self.log.info("profile_start", window=self.window)
+        self.report = profile(self.window, self._stop_event)
+        try:
+            self.path = save_report(self.report)
+        except OSError as e:
+            self.log.error("profile_save_error", error=e)
+        total = self.report["total"]
+        self.log.info("profile_done", path=self.path, wakeups_per_sec=total["wakeups_per_sec"],
+                 cpu_percent=total["cpu_percent"])
+        if self.exit_after and not self._stop_event.is_set():
+            # メインスレッドの待機を Ctrl+C と同じように止め、通常の終了処理を通す
+            os.kill(os.getpid(), signal.SIGINT)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start() -> Optional[IdleProfiler]:
+    """IDLE_PROFILE_SECONDS が設定されていれば計測を始める"""
+    if not config.IDLE_PROFILE_SECONDS:
+        return None
+    profiler = IdleProfiler()
+    profiler.start()
+    return profiler
+
+
+def _parse_value(text: str):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="待機中のスレッドごとの起床・CPU時間を測る")
+    parser.add_argument("--window", type=float, default=300.0, help="計測時間[秒]")
+    parser.add_argument("--warmup", type=float, default=config.IDLE_PROFILE_WARMUP,
+                        help="起動後、測り始めるまでの待ち時間[秒]")
+    parser.add_argument("--host", action="store_true", help="複数台モードで測る")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="config の値を変えて測る (値はJSON)")
+    parser.add_argument("--compare", nargs=2, metavar="JSON", help="2つの結果を比べる")
+    parser.add_argument("--show", metavar="JSON", help="保存した結果を表示")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        a, b = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare)
+        print_compare(a, b)
+        return 0
+    if args.show:
+        print_report(json.loads(Path(args.show).read_text(encoding="utf-8")))
+        return 0
+
+    # event_log・metrics・本体を読み込む前に反映する (import 時に読まれる値も変わるように)
+    for assignment in args.set:
+        name, _, value = assignment.partition("=")
+        if not hasattr(config, name):
+            raise SystemExit(f"configにない設定です: {name}")
+        setattr(config, name, _parse_value(value))
+    config.IDLE_PROFILE_SECONDS = args.window
+    config.IDLE_PROFILE_WARMUP = args.warmup
+    config.IDLE_PROFILE_EXIT = True
+
+    if args.host:
+        from host_mode import HostMode
+        app = HostMode()
+    else:
+        from main import OsewaNuigurumiMain
+        app = OsewaNuigurumiMain()
+    app.start()  # 計測が終わると止まる
+    profiler = getattr(app, "idle_profiler", None)
+    if profiler is None or profiler.report is None:
+        print("[ERROR] 計測できませんでした")
+        return 1
+    print_report(profiler.report)
+    if profiler.path:
+        print(f"保存しました: {profiler.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
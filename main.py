@@ -2,195 +2,373 @@
 # This software is released under the MIT License, see LICENSE.
 # main.py - 本番用お世話ぬいぐるみ起動スクリプト
 import time
+import queue
 import random
 import threading
-import subprocess
-from typing import List
+from pathlib import Path
+from typing import List, Optional
 
 import config
-from nfc_reader import NFCReader
-from audio_player import AudioPlayer
+import metrics
+import event_log
+import idle_profiler
+from clock import SYSTEM_CLOCK
+from startup_timer import StartupTimer
+from audio_scheduler import AudioScheduler, CARE, LEVEL_UP, ALERT, SYSTEM
+from care_table import CareRules, build_care_table
+from clip_selector import ClipSelector
+from battery_monitor import BatteryMonitor
+from tag_presence import DEPARTED
+from state_store import StateStore
+from pet_state import PetSnapshot, PetStateActor
+
+TAP_TO_PLAY_SECONDS = metrics.histogram(
+    "tap_to_play_seconds", "タグの検知から返事の再生開始までの時間")
+UNREGISTERED_TAGS = metrics.counter(
+    "unregistered_tags_total", "未登録のタグを読み取った回数")
+IGNORED_TAPS = metrics.counter(
+    "ignored_taps_total", "再生中のため無視したタッチの回数")
+LOG = event_log.get_logger("app")
 
-class BatteryMonitor(threading.Thread):
-    def __init__(self, player):
-        super().__init__(daemon=True)
-        self.player = player
-        self.last_alert_time = 0
-
-    def run(self):
-        while True:
-            if self._is_low_voltage():
-                now = time.time()
-                if now - self.last_alert_time > 300:  # 5分おき
-                    #self.player.play("system/battery_low.wav")
-                    self.last_alert_time = now
-            time.sleep(15)
-
-    def _is_low_voltage(self) -> bool:
-        try:
-            result = subprocess.check_output(["vcgencmd", "get_throttled"], text=True)
-            value = int(result.strip().split('=')[1], 16)
-            return (value & 0x1) != 0  # bit0 = 現在低電圧
-        except Exception:
-            return False
 
 class OsewaNuigurumiMain:
     """お世話ぬいぐるみ 本番運用用クラス"""
 
-    def __init__(self):
+    def __init__(self, name: Optional[str] = None, reader=None, player=None,
+                 state_dir: Optional[Path] = None, clock=None,
+                 rng: Optional[random.Random] = None, persist: Optional[bool] = None):
+        """
+        Args:
+            name: ぬいぐるみの名前 (複数台モードで表示・メトリクス名に使う)
+            reader: 使うNFCReader (省略時は setup() で作る)
+            player: 使うAudioPlayer (省略時は setup() で作る)
+            state_dir: 状態の保存先 (省略時はSTATE_DIR)
+            clock: 定期処理の時計 (省略時は本物の時刻。シミュレーションでは仮想時刻)
+            rng: 選曲・呼びかけに使う乱数生成器 (シミュレーションで固定したい時に渡す)
+            persist: 状態を保存するか (省略時はSTATE_PERSIST_ENABLED)
+        """
         #self.running = False
-        self.reader = NFCReader()
-        self.player = AudioPlayer()
+        self.name = name
+        self.log_fields = {"plush": name} if name else {}  # 複数台モードでログに付ける
+        # pygame / nfc のimportは重いので setup() まで遅らせる
+        self.reader = reader
+        self.player = player
+        self.audio = None  # 優先度付きで再生を調停する (再生は全てここを通す)
+        self.startup_timer = StartupTimer()
+        self.battery = None
+        self.clock = clock or SYSTEM_CLOCK
+        self.rng = rng or random.Random()
+        # タグ・お世話・音声の対応は起動時に1回だけ組み立てる (設定の読み直しでは丸ごと差し替える)
+        table = build_care_table()
+        self.care = CareRules(table, ClipSelector(pools=table.pools, rng=self.rng))
         self.tag_history: List[str] = []
 
         # ステータス
-        self.hunger = config.DEFAULT_HUNGER
-        self.attention = config.DEFAULT_ATTENTION
-        self.level = 1
         self.exp = 0
-        self.care_count = 0
         self.last_tag = None
         self.same_tag_count = 0
         self.running = False
+        self.metrics_exporter = None
+        self.config_reloader = None
+        self.idle_profiler = None
+
+        # 保存された状態があれば復元 (書き込みは別スレッドでまとめて行う)
+        initial = PetSnapshot(config.DEFAULT_HUNGER, config.DEFAULT_ATTENTION)
+        self.state_store = None
+        if persist is None:
+            persist = config.STATE_PERSIST_ENABLED
+        if persist:
+            self.state_store = StateStore(state_dir or config.STATE_DIR)
+            saved = self.state_store.load()
+            if saved:
+                initial = PetSnapshot(*saved)
+                print(f"[RESTORE] level={saved.level}, hunger={saved.hunger}, "
+                      f"attention={saved.attention}, care_count={saved.care_count}")
+            self.state_store.start()
+        # 状態を書き換えるのは pet-state スレッドだけ。読む時は self.pet.snapshot を使う
+        self.pet = PetStateActor(initial, store=self.state_store,
+                                 on_level_up=self._on_level_up, on_decayed=self._on_decayed,
+                                 name=f"pet-state-{name}" if name else "pet-state")
+        # ペットの状態は書き出す時に読みに行く
+        prefix = f"{name}_" if name else ""
+        metrics.gauge(prefix + "hunger", "空腹度", lambda: self.pet.snapshot.hunger)
+        metrics.gauge(prefix + "attention", "仲良し度", lambda: self.pet.snapshot.attention)
+        metrics.gauge(prefix + "level", "レベル", lambda: self.pet.snapshot.level)
+        metrics.gauge(prefix + "care_count", "お世話回数", lambda: self.pet.snapshot.care_count)
+        # 実機のタッチをシミュレーション用に記録
+        self.trace_recorder = None
+        if config.TAP_TRACE_FILE:
+            from simulation import TraceRecorder
+            self.trace_recorder = TraceRecorder(config.TAP_TRACE_FILE)
+
+    def setup(self):
+        """音声とNFCリーダーを準備し、電源オンセリフを再生"""
+        self.pet.start()
+        if self.audio and self.reader:
+            return
+        if config.FAST_STARTUP:
+            # NFCリーダーのUSB認識を待たずに電源オンセリフを鳴らす
+            reader_thread = threading.Thread(
+                target=self._setup_reader, name="nfc-setup", daemon=True)
+            reader_thread.start()
+            self._setup_audio()
+            reader_thread.join()
+        else:
+            self._setup_audio()
+            self._setup_reader()
+        # お世話で使う音声のパスを先に確認しておく
+        self.player.register_known_files(self.care.table.audio_files)
+        # 音声の再生が終わったら省エネ状態から速い検知に戻す
+        self.audio.on_finished = self._on_audio_finished
+        self.startup_timer.mark("ready")
+        if config.DEBUG:
+            self.startup_timer.report()
+
+    def _setup_audio(self):
+        with self.startup_timer.phase("import pygame"):
+            from audio_player import AudioPlayer
+        with self.startup_timer.phase("mixer init"):
+            if self.player is None:
+                self.player = AudioPlayer()
+            self.audio = AudioScheduler(self.player)
+        # 電源オンセリフ
+        with self.startup_timer.phase("power-on audio"):
+            self.audio.play(config.POWER_ON_AUDIO, SYSTEM)
+        self.startup_timer.mark("first sound")
+        # 音声をバックグラウンドでキャッシュに先読み
+        self.player.preload()
+
+    def _setup_reader(self):
+        if self.reader is not None:
+            self.reader.open()
+            return
+        with self.startup_timer.phase("import nfc"):
+            from nfc_reader import NFCReader
+        with self.startup_timer.phase("nfc frontend"):
+            reader = NFCReader()
+            reader.open()
+        self.reader = reader
+
+    def _on_audio_finished(self, audio_file: str):
+        if self.reader:
+            self.reader.wake_up()
 
     def start(self):
         """本番モード開始"""
-        config.print_config()
         print("[START] お世話ぬいぐるみが起動しました")
+        self.setup()
+        config.print_config()
+
+        self.running = True
+        event_log.start()
+        self.metrics_exporter = metrics.start_exporter()
+        if config.CONFIG_RELOAD_ENABLED:
+            from config_reload import ConfigReloader
+            self.config_reloader = ConfigReloader([self])
+            self.config_reloader.start()
+        self.idle_profiler = idle_profiler.start()
+        # 電圧の読み取り結果は購読して受け取る
+        self.battery = BatteryMonitor(self.audio, clock=self.clock)
+        self.battery.subscribe(self._on_battery_reading)
+        if config.RUNTIME_MODE == "asyncio":
+            # 1つのイベントループで全ての定期処理を動かす
+            from async_runtime import AsyncRuntime
+            try:
+                AsyncRuntime(self, self.battery).run()
+            except KeyboardInterrupt:
+                self.stop()
+            return
 
-        # 電源オンセリフ
-        self.player.play(config.POWER_ON_AUDIO)
         # 電圧チェックスレッド開始
-        BatteryMonitor(self.player).start()
+        self.battery.start()
 
-        self.running = True
-        threading.Thread(target=self._status_loop, daemon=True).start()
-        threading.Thread(target=self._decay_loop, daemon=True).start()
+        threading.Thread(target=self._status_loop, name="status", daemon=True).start()
+        threading.Thread(target=self._decay_loop, name="decay", daemon=True).start()
         # NFCリーダー読み取り開始
-        self.reader.start(callback=self.on_tag_read)
+        self.reader.start(callback=self.on_tag_read, on_event=self.on_tag_event)
 
+        # ミキサーの開き直しなど、メインのスレッドでやる処理を受け取る
+        main_calls = queue.SimpleQueue()
+        self.player.call_on_main = main_calls.put
         try:
             while True:
-                time.sleep(1)
+                try:
+                    main_calls.get(timeout=1)()
+                except queue.Empty:
+                    pass
         except KeyboardInterrupt:
             self.stop()
 
     def stop(self):
         #停止処理
+        if not self.running:
+            return
         self.running = False
-        self.reader.stop()
-        self.player.stop()
+        if self.reader:
+            self.reader.stop()
+        if self.player:
+            self.player.stop()
+        if self.battery:
+            self.battery.stop()
+        # 積まれた状態の変化を反映してから保存を閉じる
+        self.pet.stop()
+        if self.state_store:
+            self.state_store.close()
+        if self.trace_recorder:
+            self.trace_recorder.close()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        if self.config_reloader:
+            self.config_reloader.stop()
+        if self.idle_profiler:
+            self.idle_profiler.stop()
+        event_log.flush()
         print("[STOP] お世話ぬいぐるみを終了しました")
 
-    def on_tag_read(self, tag_id: str):
-        """タグ読み取り時の処理"""
-        if self.player.is_playing:
+    def on_tag_event(self, event):
+        """タグの置かれた・離れたイベント (タッチの処理は on_tag_read で行う)"""
+        if self.trace_recorder and event.kind == DEPARTED:
+            self.trace_recorder.record(event)
+        if event.kind == DEPARTED:
+            LOG.debug("tag_departed", uid=event.uid, hold=event.hold_duration,
+                      **self.log_fields)
+
+    def on_tag_read(self, uid: bytes):
+        """タグ読み取り時の処理
+
+        Args:
+            uid: タグのUID (バイト列)
+        """
+        if not self.audio.admit(CARE):
+            IGNORED_TAPS.inc()
             return  # 再生中は無視
 
-        care_type = config.TAG_TO_CARE_TYPE.get(tag_id)
-        if not care_type:
-            print(f"[INFO] 未登録のタグ: {tag_id}")
+        # 表と選び方は同じ組から取る (途中で設定が読み直されても混ざらない)
+        care = self.care
+        entry = care.table.get(uid)
+        if entry is None:
+            UNREGISTERED_TAGS.inc()
+            LOG.info("unregistered_tag", uid=uid, **self.log_fields)
             return
-        
+        care_type = entry.care_type
+
         # 同じタグ連続読み取り
-        if tag_id == self.last_tag:
+        if uid == self.last_tag:
             self.same_tag_count += 1
         else:
-            self.last_tag = tag_id
+            self.last_tag = uid
             self.same_tag_count = 1
-        full_audio = config.FULL_TAG_AUDIO.get(care_type, [])
-        care_audio_files = config.CARE_TYPE_AUDIO_FILES.get(care_type, [])
-        # 音声履歴に応じて同じ音声の連続再生を避ける
-        play_history = self.player.get_play_history()
-        last_played = play_history[-1] if play_history else None
-
-        #ステータス
-        if care_type in ["bread", "curry", "cookie", "strawberry", "hamburger_steak","neapolitan"] and self.hunger >= config.MAX_HUNGER:
-            self.player.play(config.FULL_HUNGRY_AUDIO)
-            print(f"[FULL_HUNGRY] {config.FULL_HUNGRY_AUDIO}")
+
+        #ステータス (書き換えは pet-state スレッドで行うので、ここでは読むだけ)
+        pet = self.pet.snapshot
+        if entry.is_food and pet.hunger >= config.MAX_HUNGER:
+            if entry.alert_audio:
+                self.audio.play(entry.alert_audio, CARE)
+            LOG.info("full_hungry", file=entry.alert_audio, **self.log_fields)
             return
 
-        if care_type not in ["bread", "curry", "cookie", "strawberry", "hamburger_steak","neapolitan"] and self.attention >= config.MAX_ATTENTION:
-            self.player.play(config.FULL_ATTENTION_AUDIO)
-            print(f"[FULL_ATTENTION] {config.FULL_ATTENTION_AUDIO}")
+        if not entry.is_food and pet.attention >= config.MAX_ATTENTION:
+            if entry.alert_audio:
+                self.audio.play(entry.alert_audio, CARE)
+            LOG.info("full_attention", file=entry.alert_audio, **self.log_fields)
             return
 
         # タグ連続
         if self.same_tag_count >= config.SAME_TAG_LIMIT:
-            if full_audio:
-                self.player.play(full_audio[0])
-                print(f"[FULL_TAG_REPEAT] {care_type} - {full_audio[0]}")
+            if entry.full_audio:
+                self.audio.play(entry.full_audio, CARE)
+                LOG.info("full_tag_repeat", care=care_type, file=entry.full_audio,
+                         **self.log_fields)
             return
 
-        # 音声履歴に応じて同じ音声の連続再生を避ける
-        available_files = [f for f in care_audio_files if f != last_played] or care_audio_files
-        selected = random.choice(available_files)
-        self.player.play(selected)
-        print(f"[PLAY] {care_type} - {selected}")
+        # 直近に再生した音声を避けて選ぶ
+        selected = care.selector.select(care_type)
+        if selected is None:
+            return
+        if self.audio.play(selected, CARE) and self.reader:
+            TAP_TO_PLAY_SECONDS.observe(time.perf_counter() - self.reader.last_detect_time)
+        LOG.info("play", care=care_type, file=selected, **self.log_fields)
 
-        # 状態の更新とFULL_xxx処理
-        incremented = False
+        # 状態の更新とレベルアップ判定 (キューに積むだけ)
+        self.pet.tap(entry.is_food)
 
-        if care_type in ["bread", "curry", "cookie", "strawberry", "hamburger_steak","neapolitan"]:
-            if self.hunger < config.MAX_HUNGER:
-                self.hunger = min(config.MAX_HUNGER, self.hunger + config.HUNGER_GAIN)
-                incremented = True
-        
-        else:
-            if self.attention < config.MAX_ATTENTION:
-                self.attention = min(config.MAX_ATTENTION, self.attention + config.ATTENTION_GAIN)
-                incremented = True
+    def _decay_loop(self):
+        while self.running:
+            self.clock.sleep(config.STATUS_DECAY_INTERVAL)
+            self.decay_tick()
 
-        if incremented:
-            self.care_count += 1
+    def decay_tick(self):
+        """空腹・仲良し度を1回分減らし、必要なら呼びかける"""
+        self.pet.decay()
 
-        self._check_level_up()
+    def _on_decayed(self, pet: PetSnapshot):
+        # 減った後の状態で呼びかけるか決める (pet-state スレッドから呼ばれる)
+        if pet.hunger < config.HUNGER_ALERT_THRESHOLD:
+            if self.rng.random() < 0.3:
+                self.audio.play(config.HUNGRY_AUDIO, ALERT)
+        
+        if pet.attention <= config.ATTENTION_ALERT_THRESHOLD:
+            if self.rng.random() < 0.3:
+                self.audio.play(config.LONELY_AUDIO, ALERT)
 
-    def _decay_loop(self):
-        while self.running:
-            time.sleep(config.STATUS_DECAY_INTERVAL)
-            self.hunger = max(0, self.hunger - config.HUNGER_DECAY)
-            self.attention = max(0, self.attention - config.ATTENTION_DECAY)
-            if self.hunger < config.HUNGER_ALERT_THRESHOLD:
-                if random.random() < 0.3:
-                    self.player.play(config.HUNGRY_AUDIO)
-            
-            if self.attention <= config.ATTENTION_ALERT_THRESHOLD:
-                if random.random() < 0.3:
-                    self.player.play(config.LONELY_AUDIO)
-
-    def _check_level_up(self):
-        thresholds = config.LEVEL_UP_CONDITIONS
-        level_audio = config.LEVEL_AUDIO_BY_LEVEL
-        next_level = self.level + 1
-        if next_level in thresholds:
-            condition = thresholds[next_level]
-            if self.care_count >= condition['care_count'] and \
-               self.hunger >= config.MAX_HUNGER * condition['hunger_ratio'] and \
-               self.attention >= config.MAX_ATTENTION * condition['attention_ratio']:
-                self.level = next_level
-                audio = level_audio.get(next_level, config.LEVEL_AUDIO_BY_LEVEL)
-                self.player.play(audio)
-                print(f"レベルアップしました → レベル{self.level}")
+    def _on_level_up(self, level: int):
+        # pet-state スレッドから呼ばれる
+        audio = config.LEVEL_AUDIO_BY_LEVEL.get(level)
+        if audio:
+            # お世話の返事を遮らず、終わってから鳴らす
+            self.audio.play(audio, LEVEL_UP)
+        LOG.info("level_up", level=level, **self.log_fields)
+
+    def _on_battery_reading(self, reading):
+        """電圧の読み取り結果を受け取る"""
+        if reading.under_voltage:
+            LOG.warn("under_voltage", throttled=hex(reading.throttled))
 
     def get_status(self):
+        # スナップショットは変更されないので、ロックなしでも揃った値が読める
+        pet = self.pet.snapshot
         return {
-            'level': self.level,
-            'care_count': self.care_count,
+            'level': pet.level,
+            'care_count': pet.care_count,
             'exp': self.exp,
-            'hunger': self.hunger,
-            'attention': self.attention
+            'hunger': pet.hunger,
+            'attention': pet.attention
         }
     
     def _status_loop(self):
-        """10秒ごとにステータスを出力するバックグラウンドループ"""
+        """STATUS_PRINT_INTERVAL秒ごとにステータスを出力するバックグラウンドループ"""
         while self.running:
-            status = self.get_status()
-            print(f"[STATUS] level={status['level']}, "
-                  f"hunger={status['hunger']}, "
-                  f"attention={status['attention']}, "
-                  f"care_count={status['care_count']}")
-            time.sleep(10)
+            self.print_status()
+            self.clock.sleep(config.STATUS_PRINT_INTERVAL)
+
+    def print_status(self):
+        """ステータスを出力"""
+        LOG.info("status", **self.get_status(), **self.log_fields)
+        if not LOG.enabled(event_log.DEBUG):
+            return
+        cache_stats = self.player.get_cache_stats()
+        if cache_stats:
+            LOG.debug("cache", hits=cache_stats['hits'], misses=cache_stats['misses'],
+                      entries=cache_stats['entries'], bytes=cache_stats['bytes'],
+                      heads=cache_stats['head_bytes'], **self.log_fields)
+        if self.audio:
+            # 種類ごとの 再生/待ち合わせ/破棄/割り込み
+            audio_stats = self.audio.get_stats()
+            counts = {kind: f"{c['played']}/{c['queued']}/{c['dropped']}/{c['preempted']}"
+                      for kind, c in audio_stats['kinds'].items()}
+            LOG.debug("audio", **counts, queue=audio_stats['queue_depth'],
+                      max_wait=audio_stats['max_queue_wait'], **self.log_fields)
+        if self.reader:
+            health = self.reader.health.get_report()
+            LOG.debug("nfc", state=health['state'], timeouts=health['timeout'],
+                      communication=health['communication'], device=health['device'],
+                      reopens=health['reopens'], **self.log_fields)
+        scheduler = self.reader.scheduler if self.reader else None
+        if scheduler:
+            report = scheduler.get_report()
+            LOG.debug("power", state=report['state'], active=report['active'],
+                      backoff=report['backoff'], idle=report['idle'],
+                      senses=report['senses'], wakeups=report['wakeups'], **self.log_fields)
 
 def main():
     app = OsewaNuigurumiMain()
@@ -0,0 +1,244 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+メトリクスモジュール for お世話ぬいぐるみプロジェクト
+処理時間のヒストグラム・回数のカウンタ・状態のゲージを記録し、Prometheus形式で書き出す
+
+- 記録側は起動時に作ったメトリクスの数値を増やすだけ (タッチ時にオブジェクトを作らない)
+- METRICS_ENABLED=False の時は何もしない共通のメトリクスを返すので、記録の負荷はほぼゼロ
+- 書き出しは METRICS_EXPORT で選ぶ
+    "textfile" : METRICS_TEXTFILE に一定間隔で書き出す (node_exporterのtextfile collector用)
+    "socket"   : METRICS_SOCKET に接続すると現在の値を返す (socat - UNIX-CONNECT:... で確認できる)
+
+記録はロックを取らないので、複数スレッドから同時に増やすとまれに1回分数え漏れることがある
+"""
+
+import os
+import socket
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+import config
+
+# 秒単位の処理時間用のバケット (0.5ms〜2.5s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Counter:
+    """増えるだけの回数"""
+
+    __slots__ = ('name', 'help', 'value')
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, self.value
+
+
+class Gauge:
+    """現在の値 (関数を渡すと書き出す時に値を取りに行く)"""
+
+    __slots__ = ('name', 'help', 'value', 'func')
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, func: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.func = func
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self):
+        value = self.value
+        if self.func is not None:
+            try:
+                value = self.func()
+            except Exception:
+                return
+        yield self.name, value
+
+
+class Histogram:
+    """値の分布 (バケットの数は作成時に固定)"""
+
+    __slots__ = ('name', 'help', 'bounds', 'counts', 'sum', 'count')
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # 最後は上限なし
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound}"}}', cumulative
+        yield f'{self.name}_bucket{{le="+Inf"}}', self.count
+        yield f'{self.name}_sum', self.sum
+        yield f'{self.name}_count', self.count
+
+
+class _NoopMetric:
+    """無効時に返すメトリクス (何もしない)"""
+
+    __slots__ = ()
+
+    def inc(self, amount: int = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+_NOOP = _NoopMetric()
+
+
+class Registry:
+    """メトリクスの登録先"""
+
+    def __init__(self, enabled: bool = config.METRICS_ENABLED, prefix: str = "osewa_"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._metrics: List = []
+
+    def _add(self, metric):
+        if not self.enabled:
+            return _NOOP
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str):
+        return self._add(Counter(self.prefix + name, help))
+
+    def gauge(self, name: str, help: str, func: Optional[Callable[[], float]] = None):
+        return self._add(Gauge(self.prefix + name, help, func))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        return self._add(Histogram(self.prefix + name, help, buckets))
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式に変換"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+class TextfileExporter(threading.Thread):
+    """一定間隔でメトリクスをファイルに書き出す (書き換えはrenameで一度に行う)"""
+
+    def __init__(self, path: Path, registry: Registry = REGISTRY,
+                 interval: float = config.METRICS_EXPORT_INTERVAL):
+        super().__init__(daemon=True, name="metrics")
+        self.path = Path(path)
+        self.registry = registry
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.write()
+
+    def write(self):
+        """現在の値を書き出す"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(self.registry.render())
+            tmp.replace(self.path)
+        except OSError as e:
+            if config.DEBUG:
+                print(f"メトリクスの書き出しに失敗: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        self.write()
+
+
+class SocketExporter(threading.Thread):
+    """Unixソケットに接続されたら現在の値を返す"""
+
+    def __init__(self, path: Path, registry: Registry = REGISTRY):
+        super().__init__(daemon=True, name="metrics")
+        self.path = Path(path)
+        self.registry = registry
+        self._sock = None
+
+    def run(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists():
+                self.path.unlink()
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.bind(str(self.path))
+            self._sock.listen(4)
+        except OSError as e:
+            if config.DEBUG:
+                print(f"メトリクスのソケットを開けません: {e}")
+            return
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return  # stop() で閉じられた
+            with conn:
+                try:
+                    conn.sendall(self.registry.render().encode())
+                except OSError:
+                    pass
+
+    def stop(self):
+        if self._sock:
+            self._sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def start_exporter(registry: Registry = REGISTRY):
+    """設定に従って書き出しを開始
+
+    Returns:
+        TextfileExporter / SocketExporter / None (無効時)
+    """
+    if not registry.enabled or config.METRICS_EXPORT == "none":
+        return None
+    if config.METRICS_EXPORT == "socket":
+        exporter = SocketExporter(config.METRICS_SOCKET, registry)
+    else:
+        exporter = TextfileExporter(config.METRICS_TEXTFILE, registry)
+    exporter.start()
+    return exporter
@@ -0,0 +1,225 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+ミキサーのプロファイル for お世話ぬいぐるみプロジェクト
+ボードごとに測ったミキサーの周波数・バッファサイズを保存し、起動時にその設定で初期化する
+
+- バッファが小さいほどタッチから音が出るまでが短いが、CPUが間に合わないと音が途切れる (アンダーラン)
+- 校正ではバッファサイズを順に試し、途切れなかった中で一番小さいものを保存する
+- 周波数は config.MIXER_FREQUENCY のまま (コンパイル済みの音声はこの周波数で作ってあるため)。
+  --frequencies を指定した時だけ他の周波数も候補にする
+- 遅延はバッファサイズからの推定値 (実際の発音タイミングは測っていない)
+- 途切れは「鳴らし終わるのが音声の長さより遅れた」ことで判定する (出力が止まっていた分だけ終わりが遅れる)
+- 動作中に途切れが続いたら、バッファを大きくした安全側の設定に切り替えてプロファイルにも残す (audio_player.py)
+
+    python mixer_profile.py                          # 既定の出力 (ALSA) で測って保存
+    python mixer_profile.py --driver dummy           # ダミーの出力で測る (スピーカーを鳴らさない)
+    python mixer_profile.py --device hw:Loopback,0   # ALSAのループバックで測る
+    python mixer_profile.py --dry-run                # 測るだけで保存しない
+    python mixer_profile.py --frequencies 24000,48000  # 周波数も変えてよい場合
+
+周波数が変わった場合は、音声コンパイラ (python audio_compiler.py) を実行し直してください
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import List, Optional
+import config
+
+# SDLは出力にバッファ2つ分を持つので、発音までの遅延はおおよそその分 (推定にだけ使う)
+_BUFFER_PERIODS = 2
+
+
+def default_settings() -> dict:
+    """config のミキサー設定"""
+    return {
+        "frequency": config.MIXER_FREQUENCY,
+        "size": config.MIXER_SIZE,
+        "channels": config.MIXER_CHANNELS,
+        "buffer": config.MIXER_BUFFER,
+    }
+
+
+def load_profile(path: Optional[Path] = None) -> Optional[dict]:
+    """保存したプロファイルを読む (なければNone)"""
+    path = Path(path or config.MIXER_PROFILE_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            profile = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[WARN] ミキサーのプロファイルを読めません: {path} ({e})")
+        return None
+    return profile if isinstance(profile, dict) else None
+
+
+def output_settings(channels: Optional[int] = None) -> dict:
+    """ミキサーを初期化する設定 (プロファイルがあれば周波数・バッファはそちらを使う)
+
+    Args:
+        channels: 出力チャンネル数 (複数台モードのステレオ出力など、設定と違う時に指定)
+    """
+    settings = default_settings()
+    profile = load_profile() if config.MIXER_PROFILE_ENABLED else None
+    if profile:
+        for key in ("frequency", "buffer"):
+            if isinstance(profile.get(key), int):
+                settings[key] = profile[key]
+    if channels is not None:
+        settings["channels"] = channels
+    return settings
+
+
+def save_profile(settings: dict, results: Optional[List[dict]] = None,
+                 path: Optional[Path] = None, **extra):
+    """プロファイルを保存 (書きかけのファイルが残らないよう置き換える)"""
+    path = Path(path or config.MIXER_PROFILE_FILE)
+    profile = {
+        "frequency": settings["frequency"],
+        "buffer": settings["buffer"],
+        "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if results is not None:
+        profile["results"] = results
+    profile.update(extra)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def safer_buffer(buffer: int) -> Optional[int]:
+    """途切れた時に切り替えるバッファサイズ (上限に達していればNone)"""
+    if buffer >= config.MIXER_BUFFER_MAX:
+        return None
+    return min(buffer * 2, config.MIXER_BUFFER_MAX)
+
+
+def record_fallback(buffer: int, underruns: int):
+    """動作中の途切れで切り替えたバッファサイズを残す (次の起動からもその設定にする)"""
+    profile = load_profile() or {}
+    settings = output_settings()
+    settings["buffer"] = buffer
+    save_profile(settings, profile.get("results"),
+                 fallback={"underruns": underruns, "time": time.strftime("%Y-%m-%dT%H:%M:%S")})
+
+
+def measure(frequency: int, buffer: int, seconds: float = 0.5, repeats: int = 5) -> dict:
+    """1つの設定でミキサーを開き直し、無音を繰り返し鳴らして遅延と途切れを測る
+
+    Returns:
+        dict: 設定と結果 (underruns: 途切れた回数、estimated_latency: バッファから推定した発音までの遅延[秒])
+    """
+    import pygame
+    size, channels = config.MIXER_SIZE, config.MIXER_CHANNELS
+    pygame.mixer.quit()
+    pygame.mixer.init(frequency=frequency, size=size, channels=channels, buffer=buffer)
+    result = {"frequency": frequency, "buffer": buffer}
+    actual = pygame.mixer.get_init()
+    if not actual or actual[0] != frequency:
+        result["unsupported"] = True
+        return result
+    frame_size = channels * (abs(size) // 8)
+    sound = pygame.mixer.Sound(buffer=bytes(int(seconds * frequency) * frame_size))
+    length = sound.get_length()
+    channel = pygame.mixer.Channel(0)
+    lates = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        channel.play(sound)
+        while channel.get_busy():
+            time.sleep(0.001)
+        lates.append(time.perf_counter() - started - length)
+    result.update(
+        underruns=sum(1 for late in lates if late > config.MIXER_UNDERRUN_TOLERANCE),
+        late_max=round(max(lates), 4),
+        estimated_latency=round(_BUFFER_PERIODS * buffer / frequency, 4),
+    )
+    return result
+
+
+def calibrate(frequencies=None, buffers=None, seconds: float = 0.5,
+              repeats: int = 5, verbose: bool = True) -> List[dict]:
+    """周波数とバッファサイズの組み合わせを全部測る (周波数の既定は config.MIXER_FREQUENCY だけ)"""
+    import pygame
+    frequencies = frequencies or (config.MIXER_FREQUENCY,)
+    buffers = buffers or config.MIXER_CALIBRATION_BUFFERS
+    results = []
+    try:
+        for frequency in frequencies:
+            for buffer in buffers:
+                result = measure(frequency, buffer, seconds, repeats)
+                results.append(result)
+                if verbose:
+                    print(format_result(result))
+    finally:
+        pygame.mixer.quit()
+    return results
+
+
+def choose(results: List[dict], change_frequency: bool = False) -> Optional[dict]:
+    """途切れなかった中で一番バッファの小さい設定
+
+    Args:
+        change_frequency: Trueなら config.MIXER_FREQUENCY 以外の周波数も選ぶ
+            (推定遅延が同じなら今の周波数を優先)
+    """
+    stable = [r for r in results if not r.get("unsupported") and r.get("underruns") == 0
+              and (change_frequency or r["frequency"] == config.MIXER_FREQUENCY)]
+    if not stable:
+        return None
+    return min(stable, key=lambda r: (r["estimated_latency"], r["frequency"] != config.MIXER_FREQUENCY))
+
+
+def format_result(result: dict) -> str:
+    head = f"{result['frequency']:6}Hz buffer={result['buffer']:5}"
+    if result.get("unsupported"):
+        return f"{head}  (この周波数では開けません)"
+    return (f"{head}  推定遅延 {result['estimated_latency'] * 1000:6.1f}ms  "
+            f"途切れ {result['underruns']}回  終了の遅れ最大 {result['late_max'] * 1000:6.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ミキサーのバッファサイズ・周波数を校正する")
+    parser.add_argument("--driver", help="SDL_AUDIODRIVER (dummy / alsa など)")
+    parser.add_argument("--device", help="ALSAの出力先 (AUDIODEV。例: hw:Loopback,0)")
+    parser.add_argument("--frequencies",
+                        help="試す周波数 (カンマ区切り。指定すると周波数も変える。既定は config.MIXER_FREQUENCY だけ)")
+    parser.add_argument("--buffers", help="試すバッファサイズ (カンマ区切り)")
+    parser.add_argument("--seconds", type=float, default=0.5, help="1回に鳴らす長さ[秒]")
+    parser.add_argument("--repeats", type=int, default=5, help="設定ごとに鳴らす回数")
+    parser.add_argument("--dry-run", action="store_true", help="保存しない")
+    args = parser.parse_args(argv)
+
+    if args.driver:
+        os.environ["SDL_AUDIODRIVER"] = args.driver
+    if args.device:
+        os.environ["AUDIODEV"] = args.device
+    frequencies = [int(v) for v in args.frequencies.split(",")] if args.frequencies else None
+    buffers = [int(v) for v in args.buffers.split(",")] if args.buffers else None
+
+    results = calibrate(frequencies, buffers, args.seconds, args.repeats)
+    best = choose(results, change_frequency=frequencies is not None)
+    if best is None:
+        print("[ERROR] 途切れずに鳴らせる設定がありませんでした")
+        return 1
+    print(f"選んだ設定: {format_result(best)}")
+    if args.dry_run:
+        return 0
+    previous = output_settings()
+    settings = dict(default_settings(), frequency=best["frequency"], buffer=best["buffer"])
+    save_profile(settings, results)
+    print(f"保存しました: {config.MIXER_PROFILE_FILE}")
+    if best["frequency"] != previous["frequency"]:
+        print("周波数が変わったので、python audio_compiler.py を実行し直してください")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,32 +5,83 @@ import threading
 from typing import Callable, Optional
 import nfc
 import config
+import metrics
+import event_log
+from reader_health import ReaderHealth
+from tag_presence import TagPresence, TagEvent, ARRIVED
+from scan_scheduler import ScanScheduler, ACTIVE
+
+# 連続検知ではconnectが省エネに切り替わるまで戻らないので、タグを見つけた回の
+# 検知を始めてからon-connectまでを測る (他のモードはconnectの呼び出し全体)
+NFC_CONNECT_SECONDS = metrics.histogram(
+    "nfc_connect_seconds", "1回の検知 (connect) にかかった時間")
+NFC_READ_FAILURES = metrics.counter(
+    "nfc_read_failures_total", "NFCの読み取りに失敗した回数")
+NFC_FRONTEND_REOPENS = metrics.counter(
+    "nfc_frontend_reopens_total", "NFCリーダーを開き直した回数")
+LOG = event_log.get_logger("nfc")
+
 
 class NFCReader:
-    def __init__(self):
+    def __init__(self, path: str = 'usb', name: str = "nfc-reader"):
+        #path: nfcpyのデバイス指定 ('usb' / 'usb:001:004' など)、name: 読み取りスレッドの名前
+        self.path = path
+        self.name = name
         self.running = False
         self.reader_thread = None
         self.callback = None
+        self.on_event = None  # タグの置かれた・離れたイベント (TagEvent) を受け取る
         self.clf = None        
-        self._retry_count = 0
-        self._max_retries = 3
+        # 置きっぱなしのタグで何度もタッチしたことにならないよう、置かれた・離れたを追跡する
+        self.presence = TagPresence()
+        self._held_tag = None  # pollモードで在否確認に使う、最後に読めたタグ
+        # エラーの種類と回数からリーダーの状態を決め、開き直しの間隔を延ばす
+        self.health = ReaderHealth()
+        self._stop_event = threading.Event()
+        # 省エネモード: 操作がない間は検知間隔を延ばす (pollモードは SCAN_INTERVAL から延ばす)
+        self.scheduler = None
+        if config.POWER_SAVE_MODE:
+            self.scheduler = (ScanScheduler(fast_interval=config.SCAN_INTERVAL,
+                                            idle_interval=config.POWER_SAVE_POLL_IDLE_INTERVAL)
+                              if self._polls() else ScanScheduler())
+        self.sleep_mode = False
+        self.last_activity_time = time.time()
+        self._wake_event = threading.Event()
+        self._tag_present = False
+        self._opened_once = False
+        self.last_detect_time = 0.0  # 最後にタグを検知した時刻 (perf_counter)
+        self._sense_started = None  # 連続検知で今の回の検知を始めた時刻 (perf_counter)
 
-    def start(self, callback: Callable[[str], None]):
-         #NFCリーダーの読み取りを開始
+    def start(self, callback: Callable[[bytes], None],
+              on_event: Optional[Callable[[TagEvent], None]] = None):
+         #NFCリーダーの読み取りを開始 (callbackはタグが置かれた時だけ呼ばれる)
          if self.running:
              return
         # まずここで ContactlessFrontend を初期化
          self._ensure_frontend()
          self.callback = callback
+         self.on_event = on_event
          self.running = True
-         self.reader_thread = threading.Thread(target=self._reader_loop, daemon=True)
+         self._stop_event.clear()
+         self.reader_thread = threading.Thread(target=self._reader_loop, name=self.name, daemon=True)
          self.reader_thread.start()
-         if config.DEBUG:
-             print("NFCリーダーを起動しました")
+         LOG.debug("started", path=self.path)
              
+    def run(self, callback: Callable[[bytes], None],
+            on_event: Optional[Callable[[TagEvent], None]] = None):
+        #呼び出したスレッドで読み取りを続ける (stop()されるまで戻らない)
+        self._ensure_frontend()
+        self.callback = callback
+        self.on_event = on_event
+        self.running = True
+        self._stop_event.clear()
+        self._reader_loop()
+
     def stop(self):
         #NFCリーダーの読み取りを停止
         self.running = False
+        self._wake_event.set()
+        self._stop_event.set()
         if self.reader_thread:
             self.reader_thread.join(timeout=1.0)
         if self.clf:
@@ -38,69 +89,272 @@ class NFCReader:
                 self.clf.close()
             except:
                 pass
-        if config.DEBUG:
-            print("NFCリーダーを停止しました")
+        LOG.debug("stopped", path=self.path)
             
-    def _ensure_frontend(self):
+    def open(self) -> bool:
+        #リーダーを開く (start前に呼べば、起動中に並行してUSBの認識を済ませられる)
+        self._ensure_frontend()
+        return self.clf is not None
+
+    def _ensure_frontend(self) -> bool:
         #clf が未作成 or クローズされているなら再オープンを試みる
         if self.clf:
-            return
+            return True
         try:
-            self.clf = nfc.ContactlessFrontend('usb')
-            if config.DEBUG:
-                print("NFC: frontend opened")
+            self.clf = nfc.ContactlessFrontend(self.path)
+            if self._opened_once:
+                NFC_FRONTEND_REOPENS.inc()
+            self._opened_once = True
+            LOG.debug("frontend_opened", path=self.path)
+            return True
         except Exception as e:
             self.clf = None
-            if config.DEBUG:
-                print(f"NFC init error: {e}")
+            LOG.warn("frontend_error", path=self.path, error=e)
+            return False
+
+    def _reopen(self) -> bool:
+        #開き直しの予定時刻まで待ってからリーダーを開く (失敗するたびに間隔が延びる)
+        self._stop_event.wait(self.health.reopen_delay())
+        if not self.running:
+            return False
+        if self._ensure_frontend():
+            self.health.on_reopened()
+            return True
+        self.health.on_reopen_failed()
+        return False
+
+    def _close_frontend(self):
+        if self.clf:
+            try: self.clf.close()
+            except: pass
+        self.clf = None
+
+    def _on_read_error(self, error: Exception):
+        #エラーを記録し、開き直しが必要ならリーダーを閉じる (タイムアウトでは閉じない)
+        NFC_READ_FAILURES.inc()
+        if self.health.on_error(error):
+            self._close_frontend()
+        else:
+            # 同じエラーで空回りしないよう少し待つ
+            self._stop_event.wait(config.NFC_SENSE_INTERVAL)
+
+    @staticmethod
+    def _polls() -> bool:
+        #connectに任せず、間隔を空けて読み取るかどうか
+        return config.NFC_SCAN_MODE != "continuous" or config.SIMULATE_NFC
 
     def _reader_loop(self):
+        if self._polls():
+            self._poll_loop()
+        else:
+            self._sense_loop()
+
+    def _sense_loop(self):
+        #nfcpyのconnectに連続検知を任せる (タグを置いた瞬間にon-connectが呼ばれる)
+        while self.running:
+            if not self.clf and not self._reopen():
+                continue
+            try:
+                if self.scheduler is None or self.scheduler.interval() <= self.scheduler.fast_interval:
+                    self._sense_active()
+                else:
+                    self._sense_idle()
+            except Exception as e:
+                LOG.debug("sense_failed", error=e)
+                self._on_read_error(e)
+            else:
+                self.health.on_success()
+
+    def _sense_active(self):
+        #速い間隔で検知し続ける (省エネモードなら操作がなくなった時点で戻る)
+        scheduler = self.scheduler
+        if scheduler:
+            scheduler.count_sense()
+        self._sense_started = time.perf_counter()
+        try:
+            self.clf.connect(
+                rdwr={
+                    'on-connect': self._on_connect,
+                    'on-release': self._on_release,
+                    'iterations': config.NFC_SENSE_ITERATIONS,
+                    'interval': config.NFC_SENSE_INTERVAL,
+                },
+                terminate=self._should_leave_active,
+            )
+        finally:
+            self._sense_started = None
+        self._flush_presence()
+
+    def _should_leave_active(self) -> bool:
+        #connectの合間に呼ばれる (離れ待ちのタグもここで確定させる)
+        # 次の検知はここから始まる
+        self._sense_started = time.perf_counter()
+        self._flush_presence()
+        if not self.running:
+            return True
+        scheduler = self.scheduler
+        return scheduler is not None and not self._tag_present \
+            and scheduler.interval() > scheduler.fast_interval
+
+    def _sense_idle(self):
+        #省エネ中: 1回だけ検知し、RFを止めて次の検知まで眠る
+        self.sleep_mode = True
+        self.scheduler.count_sense()
+        checks = [0]
+
+        def terminate():
+            # 最初の呼び出しは検知前なので続行、2回目以降 (1巡した後) で終了
+            # タグが置かれている間は離れるまで待つ
+            checks[0] += 1
+            self._flush_presence()
+            return not self.running or (checks[0] > 1 and not self._tag_present)
+
+        self._wake_event.clear()
+        started = time.perf_counter()
+        self.clf.connect(
+            rdwr={
+                'on-connect': self._on_connect,
+                'on-release': self._on_release,
+                'iterations': 1,
+                'interval': config.NFC_SENSE_INTERVAL,
+            },
+            terminate=terminate,
+        )
+        NFC_CONNECT_SECONDS.observe(time.perf_counter() - started)
+        self._flush_presence()
+        if self.scheduler.state == ACTIVE:
+            return
+        if config.POWER_SAVE_RF_OFF:
+            try:
+                self.clf.device.mute()
+            except Exception:
+                pass
+        # wake_up() されたらすぐ速い検知に戻る
+        self._wake_event.wait(self.scheduler.interval())
+
+    def _on_connect(self, tag) -> bool:
+        #タグ検知時 (nfcpyのスレッドから呼ばれる)
+        self.last_detect_time = time.perf_counter()
+        started, self._sense_started = self._sense_started, None
+        if started is not None:
+            NFC_CONNECT_SECONDS.observe(self.last_detect_time - started)
+        self._tag_present = True
+        self._on_activity()
+        LOG.debug("read", uid=tag.identifier)
+        # 文字列に変換せず、UIDのバイト列のまま渡す
+        self._dispatch(self.presence.seen(bytes(tag.identifier)))
+        # Trueを返すとタグが離れるまで待ち、置きっぱなしのタグを再検知しない
+        return True
+
+    def _dispatch(self, events):
+        #置かれた・離れたイベントを配信 (タッチとして扱うのは置かれた時だけ)
+        for event in events:
+            if self.on_event:
+                try:
+                    self.on_event(event)
+                except Exception as e:
+                    LOG.error("event_error", error=e)
+            if event.kind == ARRIVED:
+                try:
+                    self.callback(event.uid)
+                except Exception as e:
+                    LOG.error("callback_error", error=e)
+
+    def _flush_presence(self):
+        #離れ待ちのタグがdebounceを過ぎていれば離れたイベントを出す
+        if self.presence.lost_at is None:
+            return
+        event = self.presence.poll()
+        if event:
+            self._dispatch((event,))
+
+    def _on_release(self, tag):
+        #タグが離れた時 (debounceの間に戻らなければ離れたイベントになる)
+        self._tag_present = False
+        self.presence.lost()
+        self._on_activity()
+        LOG.debug("released", uid=tag.identifier)
+
+    def _poll_loop(self):
        while self.running:
+            self._poll_wait()
+            if not self.running:
+                break
+            # 前回 clf が失敗していたら、開き直しの予定時刻を待って開き直す
+            if not self.clf and not config.SIMULATE_NFC and not self._reopen():
+                continue
+            # タグが置かれたままなら、connectし直さずに在否だけ確認する
+            uid = self._check_held_tag()
+            if uid is None:
+                self.presence.lost()
+                uid = self._read_tag()
+            if uid:
+                # タグが置かれている間は速い間隔のまま
+                self._on_activity()
+                self._dispatch(self.presence.seen(uid))
+            self._flush_presence()
+
+    def _poll_wait(self):
+        #次の読み取りまで待つ (省エネモードなら操作がないほど長く待ち、wake_up() ですぐ戻る)
+        if self.scheduler is None:
             time.sleep(config.SCAN_INTERVAL)
-            # 前回 clf が失敗していたら毎ループ再初期化を試み
-            if not self.clf:
-                self._ensure_frontend()
-            tag_id = self._read_tag()
-            if not tag_id:
-                 continue
-            self.callback(tag_id)
-
-    def _read_tag(self) -> Optional[str]:
-         #タグ読み取り
+            return
+        interval = self.scheduler.interval()
+        self.sleep_mode = self.scheduler.state != ACTIVE
+        self._wake_event.clear()
+        self._wake_event.wait(interval)
+        self.scheduler.count_sense()
+
+    def _should_stop_read(self) -> bool:
+        #タグを待つ間に離れ待ちのタグを確定させる
+        self._flush_presence()
+        return not self.running
+
+    def _check_held_tag(self) -> Optional[bytes]:
+        if self._held_tag is None:
+            return None
+        try:
+            if self._held_tag.is_present:
+                return bytes(self._held_tag.identifier)
+        except Exception:
+            pass
+        self._held_tag = None
+        return None
+
+    def _read_tag(self) -> Optional[bytes]:
+         #タグ読み取り (エラーは記録するだけで、開き直しは読み取りループで行う)
          if config.SIMULATE_NFC or not self.clf:
              return None
 
          try:
-             tag = self.clf.connect(rdwr={'on-connect': lambda tag: False})
-             self._retry_count = 0
-             hex_id = tag.identifier.hex().upper()
-             return ':'.join(hex_id[i:i+2] for i in range(0, len(hex_id), 2))
-             if config.DEBUG:
-                 print(f"NFC read success:{tag_id}")
-             return tag_id
-
+             started = time.perf_counter()
+             tag = self.clf.connect(rdwr={'on-connect': lambda tag: False},
+                                    terminate=self._should_stop_read)
+             NFC_CONNECT_SECONDS.observe(time.perf_counter() - started)
          except Exception as e:
-             if config.DEBUG:
-                print(f"NFC read failed ({self._retry_count+1}/{self._max_retries}): {e}")
-
-             self._retry_count += 1
-             if self._retry_count <= self._max_retries:
-                 # 再オープンしてリトライ
-
-                try: self.clf.close()
-                except: pass
-                self.clf = None
-                self._ensure_frontend()
-                time.sleep(0.1)
-                return self._read_tag()
-             else:
-                 self._retry_count = 0
-                 return None
-
-    
-    def wake_up(self):
-        #スリープモードから強制的に復帰させる
+             LOG.debug("read_failed", error=e)
+             self._on_read_error(e)
+             return None
+
+         self.health.on_success()
+         if not tag:
+             return None
+         self._held_tag = tag
+         self.last_detect_time = time.perf_counter()
+         LOG.debug("read", uid=tag.identifier)
+         return bytes(tag.identifier)
+
+    def _on_activity(self):
+        #タッチ・音声イベントがあった (省エネ状態なら速い検知に戻す)
+        was_sleeping = self.sleep_mode
         self.sleep_mode = False
         self.last_activity_time = time.time()
-        if config.DEBUG:
-            print("省エネモード: 強制的に復帰しました")
+        if self.scheduler:
+            self.scheduler.on_activity()
+        self._wake_event.set()
+        return was_sleeping
+
+    def wake_up(self):
+        #スリープモードから強制的に復帰させる
+        if self._on_activity():
+            LOG.debug("woken_up")
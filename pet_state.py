@@ -0,0 +1,189 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+ペットの状態 for お世話ぬいぐるみプロジェクト
+空腹度・仲良し度・レベル・お世話回数を1本のスレッドだけが書き換える
+
+- タッチ・時間経過・レベルアップ判定はコマンドとしてキューに積む (積むだけなのでタッチの処理を待たせない)
+- 状態を書き換えるのは "pet-state" スレッドだけ。書き換えるたびに新しい PetSnapshot を作って差し替える
+- 読む側は snapshot を1回参照するだけ。スナップショットは変更できないので、ロックなしでも値が食い違わない
+- スレッドを起動する前 (シミュレーションなど) は、コマンドを呼び出したスレッドでそのまま実行する
+"""
+
+import queue
+import threading
+from typing import Callable, Optional
+import config
+import event_log
+from state_store import PetState, KIND_CARE, KIND_DECAY, KIND_LEVEL_UP
+
+LOG = event_log.get_logger("pet")
+
+# コマンド
+TAP = "tap"
+DECAY = "decay"
+CHECK_LEVEL = "check_level"
+SET = "set"
+
+_STOP = object()
+
+
+class PetSnapshot:
+    """ある時点のペットの状態 (作った後は変更できない)"""
+
+    __slots__ = ("hunger", "attention", "level", "care_count", "version")
+
+    def __init__(self, hunger: int, attention: int, level: int = 1,
+                 care_count: int = 0, version: int = 0):
+        setattr_ = object.__setattr__
+        setattr_(self, "hunger", hunger)
+        setattr_(self, "attention", attention)
+        setattr_(self, "level", level)
+        setattr_(self, "care_count", care_count)
+        setattr_(self, "version", version)  # 書き換えの通し番号
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PetSnapshot は変更できません")
+
+    def replace(self, **changes) -> 'PetSnapshot':
+        """一部の値を変えた新しいスナップショット (version は1つ進む)"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        values["version"] = self.version + 1
+        return PetSnapshot(**values)
+
+    def to_state(self) -> PetState:
+        """保存用の形式に変換"""
+        return PetState(self.hunger, self.attention, self.level, self.care_count)
+
+    def __repr__(self) -> str:
+        return (f"PetSnapshot(hunger={self.hunger}, attention={self.attention}, "
+                f"level={self.level}, care_count={self.care_count}, version={self.version})")
+
+
+class PetStateActor:
+    """ペットの状態を1本のスレッドで書き換える"""
+
+    def __init__(self, initial: PetSnapshot, store=None,
+                 on_level_up: Optional[Callable[[int], None]] = None,
+                 on_decayed: Optional[Callable[[PetSnapshot], None]] = None,
+                 name: str = "pet-state"):
+        """
+        Args:
+            initial: 最初の状態
+            store: 変化を記録する StateStore (省略時は保存しない)
+            on_level_up: レベルが上がった時に新しいレベルを渡して呼ぶ関数
+            on_decayed: 時間経過で減った後の状態を渡して呼ぶ関数 (呼びかけの判定用)
+            name: 書き換えスレッドの名前
+        """
+        self.snapshot = initial  # 読む側はこれを参照するだけ (差し替えは書き換えスレッドのみ)
+        self.store = store
+        self.on_level_up = on_level_up
+        self.on_decayed = on_decayed
+        self.name = name
+        self.commands = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def start(self):
+        """書き換えスレッドを起動 (以降のコマンドはキュー経由になる)"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """積まれたコマンドを処理し終えてからスレッドを止める"""
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def submit(self, command: str, *args):
+        """コマンドを積む (スレッド起動前はその場で実行)"""
+        if self._thread is None:
+            self._apply(command, args)
+        else:
+            self._queue.put((command, args))
+
+    def tap(self, is_food: bool):
+        """お世話した (食べ物なら空腹度、それ以外は仲良し度が上がる)"""
+        self.submit(TAP, is_food)
+
+    def decay(self):
+        """時間経過で空腹度・仲良し度を減らす"""
+        self.submit(DECAY)
+
+    def check_level(self):
+        """レベルアップの条件を確かめる"""
+        self.submit(CHECK_LEVEL)
+
+    def set(self, **values):
+        """値を直接書き換える (ベンチマークで状態を戻す時など。保存はしない)"""
+        self.submit(SET, values)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            try:
+                self._apply(*item)
+            except Exception as e:
+                LOG.error("command_error", command=item[0], error=e)
+
+    def _apply(self, command: str, args: tuple):
+        self.commands += 1
+        if command == TAP:
+            self._tap(*args)
+        elif command == DECAY:
+            self._decay()
+        elif command == CHECK_LEVEL:
+            self._check_level_up()
+        elif command == SET:
+            self.snapshot = self.snapshot.replace(**args[0])
+
+    def _save(self, kind: int):
+        if self.store:
+            self.store.record(kind, self.snapshot.to_state())
+
+    def _tap(self, is_food: bool):
+        state = self.snapshot
+        if is_food:
+            if state.hunger < config.MAX_HUNGER:
+                self.snapshot = state.replace(
+                    hunger=min(config.MAX_HUNGER, state.hunger + config.HUNGER_GAIN),
+                    care_count=state.care_count + 1)
+        elif state.attention < config.MAX_ATTENTION:
+            self.snapshot = state.replace(
+                attention=min(config.MAX_ATTENTION, state.attention + config.ATTENTION_GAIN),
+                care_count=state.care_count + 1)
+        if self.snapshot is not state:
+            self._save(KIND_CARE)
+        self._check_level_up()
+
+    def _decay(self):
+        state = self.snapshot
+        hunger = max(0, state.hunger - config.HUNGER_DECAY)
+        attention = max(0, state.attention - config.ATTENTION_DECAY)
+        if hunger != state.hunger or attention != state.attention:
+            # 下限に張り付いて変わらない間は記録しない (SDカードに同じ状態を書き続けない)
+            self.snapshot = state.replace(hunger=hunger, attention=attention)
+            self._save(KIND_DECAY)
+        if self.on_decayed:
+            self.on_decayed(self.snapshot)
+
+    def _check_level_up(self):
+        state = self.snapshot
+        next_level = state.level + 1
+        condition = config.LEVEL_UP_CONDITIONS.get(next_level)
+        if condition is None:
+            return
+        if state.care_count >= condition['care_count'] and \
+           state.hunger >= config.MAX_HUNGER * condition['hunger_ratio'] and \
+           state.attention >= config.MAX_ATTENTION * condition['attention_ratio']:
+            self.snapshot = state.replace(level=next_level)
+            self._save(KIND_LEVEL_UP)
+            if self.on_level_up:
+                self.on_level_up(next_level)
@@ -0,0 +1,130 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+NFCリーダーの健康状態 for お世話ぬいぐるみプロジェクト
+読み取りエラーの種類と回数からリーダーの状態を決め、開き直しの間隔を決める
+
+    HEALTHY   : 正常
+    DEGRADED  : 通信エラーが続いている (開き直しはまだしない)
+    REOPENING : 開き直し中。失敗するたびに待ち時間を倍にする (ゆらぎ付き)
+    FAILED    : 開き直しが NFC_REOPEN_MAX_ATTEMPTS 回続けて失敗 (最大間隔で試し続ける)
+
+タグがないだけのタイムアウトはエラーとして数えない
+USBが抜けた・デバイスが応答しないなどのエラーはすぐ開き直しに入る
+"""
+
+import random
+import time
+import threading
+from typing import Callable, Optional
+import nfc
+import config
+import event_log
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+REOPENING = "reopening"
+FAILED = "failed"
+
+# エラーの分類
+TIMEOUT = "timeout"            # タグがない・応答待ちの時間切れ
+COMMUNICATION = "communication"  # タグとの通信エラー (離すのが早かった等)
+DEVICE = "device"              # リーダー自体のエラー (USBが抜けた等)
+
+LOG = event_log.get_logger("nfc")
+
+
+def classify_error(error: BaseException) -> str:
+    """例外をTIMEOUT / COMMUNICATION / DEVICE に分類"""
+    if isinstance(error, nfc.clf.TimeoutError):
+        return TIMEOUT
+    if isinstance(error, nfc.clf.CommunicationError):
+        return COMMUNICATION
+    return DEVICE
+
+
+class ReaderHealth:
+    """リーダーの状態と開き直しの予定を管理"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic,
+                 rng: Optional[random.Random] = None):
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.state = HEALTHY
+        self.consecutive_errors = 0  # 続けて起きた通信・デバイスエラー
+        self.reopen_attempts = 0     # 続けて失敗した開き直し
+        self.next_reopen_at = 0.0
+        self.counts = {TIMEOUT: 0, COMMUNICATION: 0, DEVICE: 0, 'reopens': 0}
+        self._lock = threading.Lock()
+
+    def on_success(self):
+        """読み取り・検知が正常に終わった"""
+        with self._lock:
+            self.consecutive_errors = 0
+            self._set_state(HEALTHY)
+
+    def on_error(self, error: BaseException) -> bool:
+        """エラーを記録
+
+        Returns:
+            bool: 開き直しが必要ならTrue
+        """
+        kind = classify_error(error)
+        with self._lock:
+            self.counts[kind] += 1
+            if kind == TIMEOUT:
+                return False
+            self.consecutive_errors += 1
+            if kind == DEVICE or self.consecutive_errors >= config.NFC_DEGRADED_ERRORS:
+                self._schedule_reopen()
+                return True
+            self._set_state(DEGRADED)
+            return False
+
+    def on_reopen_failed(self):
+        """開き直しに失敗した (次の予定を延ばす)"""
+        with self._lock:
+            self.reopen_attempts += 1
+            self._schedule_reopen()
+
+    def on_reopened(self):
+        """開き直しに成功した (最初の読み取りが通るまではDEGRADED)"""
+        with self._lock:
+            self.counts['reopens'] += 1
+            self.reopen_attempts = 0
+            self.consecutive_errors = 0
+            self._set_state(DEGRADED)
+
+    def reopen_delay(self) -> float:
+        """次の開き直しまでの残り秒数"""
+        return max(0.0, self.next_reopen_at - self.clock())
+
+    def _schedule_reopen(self):
+        # 待ち時間は失敗のたびに倍 (上限あり)。複数台が同時に再接続しないよう半分〜1倍でゆらす
+        backoff = min(config.NFC_REOPEN_BACKOFF_MAX,
+                      config.NFC_REOPEN_BACKOFF_BASE * (2 ** min(self.reopen_attempts, 16)))
+        delay = backoff * (0.5 + 0.5 * self.rng.random())
+        self.next_reopen_at = self.clock() + delay
+        if self.reopen_attempts >= config.NFC_REOPEN_MAX_ATTEMPTS:
+            self._set_state(FAILED)
+        else:
+            self._set_state(REOPENING)
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        LOG.info("reader_state", state=state)
+
+    def get_report(self) -> dict:
+        """状態とエラーの回数
+
+        Returns:
+            dict: 状態、エラー種別ごとの回数、開き直した回数
+        """
+        with self._lock:
+            report = dict(self.counts)
+            report['state'] = self.state
+            report['consecutive_errors'] = self.consecutive_errors
+            report['reopen_attempts'] = self.reopen_attempts
+        return report
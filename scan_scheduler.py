@@ -0,0 +1,105 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+NFC検知スケジューラ for お世話ぬいぐるみプロジェクト
+操作直後は速く、操作がない時間が続くほどゆっくりNFCタグを探す (省エネモード)
+
+    ACTIVE  : 最後の操作から POWER_SAVE_TIMEOUT 秒まで。NFC_SENSE_INTERVAL で検知
+              (pollモードでは SCAN_INTERVAL から POWER_SAVE_POLL_IDLE_INTERVAL まで延ばす)
+    BACKOFF : その後 POWER_SAVE_BACKOFF_STEP 秒ごとに検知間隔を倍にする
+    IDLE    : 検知間隔が POWER_SAVE_IDLE_INTERVAL に達した状態
+
+タッチや音声の再生終了があれば on_activity() ですぐ ACTIVE に戻る
+"""
+
+import time
+import threading
+from typing import Callable, Optional
+import config
+import event_log
+
+ACTIVE = "active"
+BACKOFF = "backoff"
+IDLE = "idle"
+STATES = (ACTIVE, BACKOFF, IDLE)
+
+LOG = event_log.get_logger("nfc")
+
+
+class ScanScheduler:
+    """最後の操作からの経過時間で検知間隔を決めるスケジューラ"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic,
+                 fast_interval: Optional[float] = None, idle_interval: Optional[float] = None):
+        """
+        Args:
+            clock: 経過時間を測る時計
+            fast_interval: 操作直後の検知間隔[秒] (省略時は NFC_SENSE_INTERVAL)
+            idle_interval: 延ばす上限[秒] (省略時は POWER_SAVE_IDLE_INTERVAL)
+        """
+        self.clock = clock
+        self.fast_interval = config.NFC_SENSE_INTERVAL if fast_interval is None else fast_interval
+        if idle_interval is None:
+            idle_interval = config.POWER_SAVE_IDLE_INTERVAL
+        self.idle_interval = max(idle_interval, self.fast_interval)
+        self.timeout = config.POWER_SAVE_TIMEOUT
+        self.step = config.POWER_SAVE_BACKOFF_STEP
+        now = clock()
+        self.last_activity = now
+        self.state = ACTIVE
+        self.senses = 0      # 検知処理 (connect) を呼んだ回数
+        self.wakeups = 0     # 省エネ状態から操作で復帰した回数
+        self._state_since = now
+        self._time_in_state = {state: 0.0 for state in STATES}
+        self._lock = threading.Lock()
+
+    def interval(self, now: float = None) -> float:
+        """現在の検知間隔[秒] (状態の時間も更新する)"""
+        if now is None:
+            now = self.clock()
+        idle_for = now - self.last_activity
+        if idle_for < self.timeout:
+            state, interval = ACTIVE, self.fast_interval
+        else:
+            doublings = int((idle_for - self.timeout) // self.step) + 1
+            interval = min(self.idle_interval, self.fast_interval * (2 ** min(doublings, 32)))
+            state = IDLE if interval >= self.idle_interval else BACKOFF
+        self._set_state(state, now)
+        return interval
+
+    def on_activity(self):
+        """タッチ・音声イベントがあった時に呼ぶ (すぐ速い検知に戻る)"""
+        now = self.clock()
+        with self._lock:
+            if self.state != ACTIVE:
+                self.wakeups += 1
+            self.last_activity = now
+        self._set_state(ACTIVE, now)
+
+    def count_sense(self):
+        """検知を1回試みたことを記録"""
+        self.senses += 1
+
+    def _set_state(self, state: str, now: float):
+        with self._lock:
+            if state == self.state:
+                return
+            self._time_in_state[self.state] += now - self._state_since
+            self._state_since = now
+            self.state = state
+        LOG.debug("power_state", state=state)
+
+    def get_report(self) -> dict:
+        """状態ごとの滞在時間などを取得
+
+        Returns:
+            dict: 状態 -> 秒、検知回数、復帰回数
+        """
+        now = self.clock()
+        with self._lock:
+            report = dict(self._time_in_state)
+            report[self.state] += now - self._state_since
+            report['state'] = self.state
+            report['senses'] = self.senses
+            report['wakeups'] = self.wakeups
+        return report
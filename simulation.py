@@ -0,0 +1,412 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+シミュレーター for お世話ぬいぐるみプロジェクト
+仮想時刻でタッチの記録 (トレース) を再生し、何週間分の育ち方を数秒で確かめる
+
+- 時刻は VirtualClock で進め、待ち時間は発生しない (次の出来事の時刻まで一気に飛ぶ)
+- タッチは on_tag_read に、空腹・仲良し度の減少は STATUS_DECAY_INTERVAL ごとに decay_tick に渡す
+- 音声は鳴らさず、音声ファイルの長さだけ「再生中」にする (AudioScheduler の調停はそのまま動く)
+- 乱数は seed で固定するので、同じトレースと設定なら結果は毎回同じ
+- 状態の保存はしない (STATE_DIR には触らない)
+
+トレースは1行1タッチのJSON Lines形式:
+    {"t": 1760000000.0, "uid": "04:1E:A0:C2:3C:1A:91", "hold": 0.8}
+    {"t": 30.0, "care": "bread"}          # 手で書く時はお世話の種類でもよい
+t は秒 (最初のタッチからの相対時刻として扱う)
+実機のタッチは config.TAP_TRACE_FILE を設定すると記録される
+
+    python simulation.py --days 28 --taps-per-day 30 --seed 1
+    python simulation.py --trace taps.jsonl
+    python simulation.py --days 28 --sweep HUNGER_DECAY=5,10,20 --sweep STATUS_DECAY_INTERVAL=60,300
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import heapq
+import random
+import argparse
+import itertools
+import contextlib
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+import config
+from clock import SYSTEM_CLOCK, VirtualClock
+from care_table import parse_tag_id, format_tag_id
+
+DAY = 24 * 60 * 60
+STATUS_TAIL = 60 * 60  # トレースの最後のタッチの後も続けて動かす時間[秒]
+
+
+class Tap(NamedTuple):
+    """トレースの1タッチ"""
+    t: float      # 秒 (トレースの先頭からの相対時刻)
+    uid: bytes
+    hold: float   # 置いていた時間[秒] (分からなければ0.0)
+
+
+class TraceRecorder:
+    """実機のタッチをトレースとして追記する (タグが離れた時に1行書く)"""
+
+    def __init__(self, path: Path, clock=SYSTEM_CLOCK):
+        self.path = Path(path)
+        self.clock = clock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", buffering=1, encoding="utf-8")
+
+    def record(self, event):
+        """タグの離れたイベントからタッチを1行書く"""
+        # イベントの時刻は monotonic 基準なので、UNIX時刻に直してから置いた時刻まで戻す
+        now = self.clock.time() - (self.clock.monotonic() - event.timestamp)
+        line = {"t": round(now - event.hold_duration, 3),
+                "uid": format_tag_id(event.uid),
+                "hold": round(event.hold_duration, 3)}
+        self._file.write(json.dumps(line) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+def load_trace(path: Path) -> List[Tap]:
+    """トレースファイルを読み込む
+
+    Returns:
+        List[Tap]: 時刻順のタッチ (先頭が0秒)
+    """
+    by_care = _tags_by_care_type()
+    taps = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line)
+            if "uid" in item:
+                uid = parse_tag_id(item["uid"])
+            elif item.get("care") in by_care:
+                uid = by_care[item["care"]][0]
+            else:
+                print(f"[WARN] {path}:{line_no} タグが分かりません: {line}")
+                continue
+            taps.append(Tap(float(item["t"]), uid, float(item.get("hold", 0.0))))
+    taps.sort()
+    if taps:
+        start = taps[0].t
+        taps = [tap._replace(t=tap.t - start) for tap in taps]
+    return taps
+
+
+def scripted_trace(days: int, taps_per_day: int, seed: int = 0,
+                   wake_hours: tuple = (8, 21)) -> List[Tap]:
+    """起きている時間帯に何回かまとめてタッチする、を days 日分作る
+
+    Args:
+        days: 日数
+        taps_per_day: 1日のタッチ回数
+        seed: 乱数のシード
+        wake_hours: タッチする時間帯 (開始時, 終了時)
+
+    Returns:
+        List[Tap]: 時刻順のタッチ
+    """
+    rng = random.Random(seed)
+    uids = [uid for tags in _tags_by_care_type().values() for uid in tags]
+    begin, end = wake_hours[0] * 3600, wake_hours[1] * 3600
+    taps = []
+    for day in range(days):
+        remaining = taps_per_day
+        while remaining > 0:
+            # 1回の遊びで1~5回タッチし、タッチの間は少し空く
+            t = day * DAY + rng.uniform(begin, end)
+            for _ in range(min(remaining, rng.randint(1, 5))):
+                hold = rng.uniform(0.3, 2.0)
+                taps.append(Tap(t, rng.choice(uids), hold))
+                t += hold + rng.uniform(1.5, 8.0)
+                remaining -= 1
+    taps.sort()
+    return taps
+
+
+def _tags_by_care_type() -> Dict[str, List[bytes]]:
+    by_care: Dict[str, List[bytes]] = {}
+    for tag_id, care_type in config.TAG_TO_CARE_TYPE.items():
+        by_care.setdefault(care_type, []).append(parse_tag_id(tag_id))
+    return by_care
+
+
+class SimPlayer:
+    """音を出さないプレイヤー (音声ファイルの長さだけ再生中にする)"""
+
+    DEFAULT_LENGTH = 1.0  # 長さが分からない音声の長さ[秒]
+
+    def __init__(self, sim: 'Simulation'):
+        self.sim = sim
+        self.is_playing = False
+        self.is_overlay_playing = False
+        self.on_finished = None
+        self.on_overlay_finished = None
+        self.plays = 0
+        self._lengths: Dict[str, float] = {}
+        self._main_token = 0
+        self._overlay_token = 0
+
+    def length(self, audio_file: str) -> float:
+        """音声の長さ[秒] (WAVのヘッダーから読み、覚えておく)"""
+        length = self._lengths.get(audio_file)
+        if length is None:
+            try:
+                with wave.open(str(config.AUDIO_DIR / audio_file)) as w:
+                    length = w.getnframes() / w.getframerate()
+            except (OSError, EOFError, wave.Error):
+                length = self.DEFAULT_LENGTH
+            self._lengths[audio_file] = length
+        return length
+
+    def play(self, audio_file: str) -> bool:
+        # 再生中なら置き換える (前の音声の終了は通知しない)
+        self._main_token += 1
+        self.is_playing = True
+        self.plays += 1
+        self.sim.after(self.length(audio_file), self._end, self._main_token, audio_file)
+        return True
+
+    def play_overlay(self, audio_file: str) -> bool:
+        self._overlay_token += 1
+        self.is_overlay_playing = True
+        self.plays += 1
+        self.sim.after(self.length(audio_file), self._overlay_end,
+                       self._overlay_token, audio_file)
+        return True
+
+    def _end(self, token: int, audio_file: str):
+        if token != self._main_token or not self.is_playing:
+            return
+        self.is_playing = False
+        if self.on_finished:
+            self.on_finished(audio_file)
+
+    def _overlay_end(self, token: int, audio_file: str):
+        if token != self._overlay_token or not self.is_overlay_playing:
+            return
+        self.is_overlay_playing = False
+        if self.on_overlay_finished:
+            self.on_overlay_finished(audio_file)
+
+    def stop(self):
+        self._main_token += 1
+        self.is_playing = False
+
+    def duck(self, level: float):
+        pass
+
+    def unduck(self):
+        pass
+
+    def preload(self, audio_files=None, background: bool = True):
+        pass
+
+    def register_known_files(self, audio_files) -> list:
+        return []
+
+    def get_cache_stats(self) -> Optional[dict]:
+        return None
+
+
+class Simulation:
+    """仮想時刻でぬいぐるみ1体を動かす"""
+
+    def __init__(self, trace: List[Tap], seed: int = 0):
+        """
+        Args:
+            trace: 再生するタッチ (時刻順)
+            seed: 乱数のシード (選曲・呼びかけに使う)
+        """
+        from main import OsewaNuigurumiMain
+        from audio_scheduler import AudioScheduler
+
+        self.trace = trace
+        self.seed = seed
+        self.clock = VirtualClock()
+        self._events = []  # (時刻, 通し番号, 関数, 引数)
+        self._seq = itertools.count()
+        self.player = SimPlayer(self)
+        self.app = OsewaNuigurumiMain(player=self.player, clock=self.clock,
+                                      rng=random.Random(seed), persist=False)
+        self.app.audio = AudioScheduler(self.player, clock=self.clock.monotonic)
+        self.level_ups = []  # (秒, レベル)
+        self.ticks = 0
+        self.hungry_ticks = 0  # 空腹の呼びかけ対象だった回数
+        self.lonely_ticks = 0
+
+    def at(self, when: float, func, *args):
+        """仮想時刻 when に func(*args) を実行する"""
+        heapq.heappush(self._events, (when, next(self._seq), func, args))
+
+    def after(self, delay: float, func, *args):
+        """今から delay 秒後に func(*args) を実行する"""
+        self.at(self.clock.monotonic() + delay, func, *args)
+
+    def _tap(self, uid: bytes):
+        self.app.on_tag_read(uid)
+
+    def _decay(self):
+        self.app.decay_tick()
+        self.ticks += 1
+        pet = self.app.pet.snapshot
+        if pet.hunger < config.HUNGER_ALERT_THRESHOLD:
+            self.hungry_ticks += 1
+        if pet.attention <= config.ATTENTION_ALERT_THRESHOLD:
+            self.lonely_ticks += 1
+        self.after(config.STATUS_DECAY_INTERVAL, self._decay)
+
+    def run(self, duration: Optional[float] = None) -> dict:
+        """トレースを最後まで (または duration 秒まで) 再生する
+
+        Returns:
+            dict: レベルアップの時刻・呼びかけの回数・最終状態などのレポート
+        """
+        if duration is None:
+            duration = self.trace[-1].t + STATUS_TAIL if self.trace else DAY
+        started = time.perf_counter()
+        for tap in self.trace:
+            self.at(tap.t, self._tap, tap.uid)
+        self.at(config.STATUS_DECAY_INTERVAL, self._decay)
+
+        pet = self.app.pet  # スレッドを起動しないので、コマンドはその場で反映される
+        level = pet.snapshot.level
+        while self._events and self._events[0][0] <= duration:
+            when, _, func, args = heapq.heappop(self._events)
+            self.clock.advance_to(when)
+            func(*args)
+            if pet.snapshot.level != level:
+                level = pet.snapshot.level
+                self.level_ups.append((when, level))
+        self.clock.advance_to(duration)
+        return self._report(duration, time.perf_counter() - started)
+
+    def _report(self, duration: float, wall: float) -> dict:
+        stats = self.app.audio.get_stats()
+        kinds = stats['kinds']
+        care = kinds.get("care", {})
+        return {
+            'seed': self.seed,
+            'days': round(duration / DAY, 3),
+            'taps': len(self.trace),
+            'care_played': care.get('played', 0),
+            'care_dropped': care.get('dropped', 0),
+            'level_ups': [{'level': lv, 'day': round(t / DAY, 3)} for t, lv in self.level_ups],
+            'alerts': kinds.get("alert", {}).get('played', 0),
+            'hungry_ratio': round(self.hungry_ticks / self.ticks, 4) if self.ticks else 0.0,
+            'lonely_ratio': round(self.lonely_ticks / self.ticks, 4) if self.ticks else 0.0,
+            'final': self.app.get_status(),
+            'wall_seconds': round(wall, 3),
+        }
+
+
+@contextlib.contextmanager
+def overridden(values: dict):
+    """config の値を一時的に書き換える"""
+    saved = {name: getattr(config, name) for name in values}
+    try:
+        for name, value in values.items():
+            setattr(config, name, value)
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+
+def _parse_value(text: str):
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return text
+    if isinstance(value, dict) and all(k.isdigit() for k in value):
+        # LEVEL_UP_CONDITIONS のようにレベルがキーの辞書
+        value = {int(k): v for k, v in value.items()}
+    return value
+
+
+def _parse_assignment(text: str) -> tuple:
+    name, _, value = text.partition("=")
+    if not hasattr(config, name):
+        raise SystemExit(f"configにない設定です: {name}")
+    return name, value
+
+
+def print_report(report: dict, out=sys.stdout):
+    """結果を人が読める形式で出力"""
+    levels = ", ".join(f"Lv{u['level']}@{u['day']:.2f}日" for u in report['level_ups']) or "なし"
+    final = report['final']
+    print(f"days={report['days']:.1f} taps={report['taps']} "
+          f"played={report['care_played']} dropped={report['care_dropped']} "
+          f"alerts={report['alerts']} hungry={report['hungry_ratio']:.1%} "
+          f"lonely={report['lonely_ratio']:.1%} level_ups=[{levels}] "
+          f"final=Lv{final['level']}/care{final['care_count']} "
+          f"({report['wall_seconds']:.2f}s)", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="お世話ぬいぐるみのシミュレーター")
+    parser.add_argument('--trace', help="再生するトレース (省略時は台本を自動生成)")
+    parser.add_argument('--days', type=int, default=28, help="自動生成する日数")
+    parser.add_argument('--taps-per-day', type=int, default=30, help="自動生成する1日のタッチ回数")
+    parser.add_argument('--seed', type=int, default=0, help="乱数のシード")
+    parser.add_argument('--set', action='append', default=[], metavar="NAME=VALUE",
+                        help="configの値を変える (値はJSON。何度でも指定可)")
+    parser.add_argument('--sweep', action='append', default=[], metavar="NAME=V1,V2,...",
+                        help="configの値を変えて総当たりで実行 (何度でも指定可)")
+    parser.add_argument('--verbose', action='store_true', help="アプリの出力を表示")
+    parser.add_argument('--json', help="結果をJSONで保存するパス")
+    args = parser.parse_args(argv)
+
+    fixed = {name: _parse_value(value) for name, value in map(_parse_assignment, args.set)}
+    sweeps = [(name, [_parse_value(v) for v in values.split(",")])
+              for name, values in map(_parse_assignment, args.sweep)]
+    names = [name for name, _ in sweeps]
+    points = [dict(zip(names, combo)) for combo in
+              itertools.product(*(values for _, values in sweeps))]
+
+    sink = None if args.verbose else open(os.devnull, 'w')
+    redirect = contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext()
+    runs = []
+    error = None
+    with redirect, overridden({'DEBUG': args.verbose, **fixed}):
+        if args.trace:
+            try:
+                trace = load_trace(Path(args.trace))
+            except (OSError, ValueError, KeyError) as e:
+                error = f"トレースを読めません: {args.trace} ({e})"
+        else:
+            trace = scripted_trace(args.days, args.taps_per_day, args.seed)
+        for point in points:
+            if error:
+                break
+            with overridden(point):
+                report = Simulation(trace, seed=args.seed).run(
+                    None if args.trace else args.days * DAY)
+            report['config'] = point
+            runs.append(report)
+    if sink:
+        sink.close()
+    if error:
+        print(f"[ERROR] {error}")
+        return 1
+
+    print("==== お世話ぬいぐるみ シミュレーション ====")
+    for report in runs:
+        if report['config']:
+            print(" ".join(f"{k}={v}" for k, v in report['config'].items()), end=": ")
+        print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'set': {k: repr(v) for k, v in fixed.items()}, 'runs': runs},
+                      f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
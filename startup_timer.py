@@ -0,0 +1,82 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+起動時間計測モジュール for お世話ぬいぐるみプロジェクト
+プロセス起動から各起動フェーズ・最初の発音までの時間を記録する
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+import config
+
+
+def process_age() -> float:
+    """プロセス起動からの経過秒 (インタプリタの起動時間を含む)
+
+    Returns:
+        float: 経過秒 (取得できなければ0.0)
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # コマンド名に空白が入りうるので ")" の後ろから数える
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])  # 22番目: starttime
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class StartupTimer:
+    """起動フェーズごとの所要時間を記録するタイマー"""
+
+    def __init__(self):
+        self.origin = time.perf_counter() - process_age()
+        self.phases = []  # (名前, 開始秒, 所要秒, スレッド名)
+        self.marks = {}   # 名前 -> 起動からの秒
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        """プロセス起動からの経過秒"""
+        return time.perf_counter() - self.origin
+
+    @contextmanager
+    def phase(self, name: str):
+        """with文で囲んだ処理の所要時間を記録
+
+        Args:
+            name: フェーズ名
+        """
+        started = self.elapsed()
+        try:
+            yield
+        finally:
+            duration = self.elapsed() - started
+            with self._lock:
+                self.phases.append(
+                    (name, started, duration, threading.current_thread().name))
+
+    def mark(self, name: str):
+        """現在時刻を名前付きで記録 (例: 最初の発音)"""
+        with self._lock:
+            self.marks.setdefault(name, self.elapsed())
+
+    def report(self):
+        """記録したフェーズを表示"""
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p[1])
+            marks = dict(self.marks)
+        print("==== 起動時間 ====")
+        for name, started, duration, thread in phases:
+            print(f"  {started:7.3f}s +{duration:6.3f}s  {name} [{thread}]")
+        for name, at in sorted(marks.items(), key=lambda m: m[1]):
+            print(f"  {at:7.3f}s          * {name}")
+        first_sound = marks.get("first sound")
+        if first_sound is not None:
+            over = first_sound > config.STARTUP_BUDGET_SECONDS
+            print(f"  最初の発音まで {first_sound:.3f}秒 "
+                  f"(目標 {config.STARTUP_BUDGET_SECONDS}秒{' 超過' if over else ''})")
+        print("==================")
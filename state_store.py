@@ -0,0 +1,220 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+状態保存モジュール for お世話ぬいぐるみプロジェクト
+空腹度・仲良し度・レベル・お世話回数を追記型ジャーナルに保存し、電源が抜けても復元する
+
+- お世話・時間経過のたびに固定長レコードを1件キューに積むだけで、書き込みは別スレッド
+- fsyncは一定時間ごと、または未同期のバイト数が増えた時にまとめて行う
+- ジャーナルが大きくなったらスナップショットに畳み込んでジャーナルを空にする
+- 各レコードは通し番号とCRC32付き。起動時は最後の正しいレコードの状態に戻す
+"""
+
+import os
+import time
+import zlib
+import queue
+import struct
+import threading
+from pathlib import Path
+from typing import NamedTuple, Optional
+import config
+import event_log
+
+# レコード種別
+KIND_CARE = 1
+KIND_DECAY = 2
+KIND_LEVEL_UP = 3
+KIND_SNAPSHOT = 4
+
+# 種別(u8) 通し番号(u32) 時刻(f64) 空腹度(i16) 仲良し度(i16) レベル(u8) お世話回数(u32) CRC32(u32)
+RECORD = struct.Struct("<BIdhhBII")
+_BODY_SIZE = RECORD.size - 4
+
+JOURNAL_NAME = "journal.bin"
+SNAPSHOT_NAME = "snapshot.bin"
+
+_CLOSE = object()
+
+LOG = event_log.get_logger("state")
+
+
+class PetState(NamedTuple):
+    """保存・復元するペットの状態"""
+    hunger: int
+    attention: int
+    level: int
+    care_count: int
+
+
+def pack_record(kind: int, seq: int, timestamp: float, state: PetState) -> bytes:
+    """レコードをバイト列に変換"""
+    body = RECORD.pack(kind, seq, timestamp, state.hunger, state.attention,
+                       state.level, state.care_count, 0)[:_BODY_SIZE]
+    return body + struct.pack("<I", zlib.crc32(body))
+
+
+def read_records(data: bytes):
+    """バイト列から正しいレコードを順に取り出す (壊れたところで止まる)
+
+    Yields:
+        tuple: (種別, 通し番号, 時刻, PetState, 終端のオフセット)
+    """
+    for offset in range(0, len(data) - RECORD.size + 1, RECORD.size):
+        chunk = data[offset:offset + RECORD.size]
+        kind, seq, timestamp, hunger, attention, level, care_count, crc = RECORD.unpack(chunk)
+        if zlib.crc32(chunk[:_BODY_SIZE]) != crc:
+            return
+        yield kind, seq, timestamp, PetState(hunger, attention, level, care_count), offset + RECORD.size
+
+
+class StateStore:
+    """追記型ジャーナルとスナップショットによる状態の保存"""
+
+    def __init__(self, directory: Path = config.STATE_DIR):
+        self.directory = Path(directory)
+        self.journal_path = self.directory / JOURNAL_NAME
+        self.snapshot_path = self.directory / SNAPSHOT_NAME
+        self.seq = 0
+        self.latest: Optional[PetState] = None
+        self.records_written = 0
+        self.fsyncs = 0
+        self.compactions = 0
+        self.write_errors = 0
+        self._needs_compact = False
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._journal = None
+        self._journal_bytes = 0
+
+    def load(self) -> Optional[PetState]:
+        """スナップショットとジャーナルから最新の状態を復元
+
+        Returns:
+            PetState or None: 保存された状態がなければNone
+        """
+        best_seq, best = -1, None
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                data = path.read_bytes()
+            except OSError:
+                continue
+            valid_end = 0
+            for _, seq, _, state, end in read_records(data):
+                valid_end = end
+                if seq > best_seq:
+                    best_seq, best = seq, state
+            if path == self.journal_path and valid_end < len(data):
+                # 書き込み途中で電源が切れた末尾を捨てる
+                with open(path, "r+b") as f:
+                    f.truncate(valid_end)
+                LOG.warn("journal_truncated", bytes=len(data) - valid_end)
+        self.seq = max(best_seq, 0)
+        self.latest = best
+        return best
+
+    def start(self):
+        """書き込みスレッドを開始"""
+        if self._thread:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._journal = open(self.journal_path, "ab", buffering=0)
+        self._journal_bytes = self._journal.tell()
+        self._thread = threading.Thread(target=self._writer_loop, name="state-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, kind: int, state: PetState):
+        """状態の変化を記録 (キューに積むだけでI/Oはしない)
+
+        Args:
+            kind: レコード種別 (KIND_CARE など)
+            state: 変化後の状態
+        """
+        self._queue.put((kind, time.time(), state))
+
+    def close(self, timeout: float = 2.0):
+        """未書き込みの記録を書き出してfsyncし、スレッドを止める"""
+        if not self._thread:
+            return
+        self._queue.put(_CLOSE)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def _writer_loop(self):
+        pending = bytearray()
+        unsynced = 0
+        last_sync = time.monotonic()
+        while True:
+            # 未同期のデータがなければ次の記録まで眠る
+            timeout = None
+            if unsynced:
+                timeout = max(0.0, last_sync + config.STATE_FSYNC_INTERVAL - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            closing = item is _CLOSE
+            while item is not None and item is not _CLOSE:
+                kind, timestamp, state = item
+                self.seq += 1
+                self.latest = state
+                pending += pack_record(kind, self.seq, timestamp, state)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+                closing = closing or item is _CLOSE
+
+            try:
+                if pending:
+                    self._journal.write(pending)
+                    self._journal_bytes += len(pending)
+                    self.records_written += len(pending) // RECORD.size
+                    unsynced += len(pending)
+                    pending.clear()
+                due = time.monotonic() - last_sync >= config.STATE_FSYNC_INTERVAL
+                if unsynced and (closing or due or unsynced >= config.STATE_FSYNC_BYTES):
+                    os.fsync(self._journal.fileno())
+                    self.fsyncs += 1
+                    unsynced = 0
+                    last_sync = time.monotonic()
+                if self._needs_compact or self._journal_bytes >= config.STATE_JOURNAL_MAX_BYTES:
+                    self._compact()
+                    self._needs_compact = False
+            except OSError as e:
+                # SDカードが一杯・読み取り専用などで書けない。溜めた分は捨てて (最新の状態は
+                # self.latest に残る) 次の記録まで待つ。途中まで書いたレコードがあるかもしれないので、
+                # 次に書けた時にスナップショットに畳み込んでジャーナルを作り直す
+                self.write_errors += 1
+                pending.clear()
+                unsynced = 0
+                self._needs_compact = True
+                LOG.error("save_error", error=e, errors=self.write_errors)
+
+            if closing:
+                self._journal.close()
+                return
+
+    def _compact(self):
+        """最新の状態をスナップショットに書き、ジャーナルを空にする"""
+        if self.latest is None:
+            return
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(pack_record(KIND_SNAPSHOT, self.seq, time.time(), self.latest))
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(self.snapshot_path)
+        # リネームをディレクトリごと確定させてからジャーナルを消す
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        # 通し番号がスナップショット以下のレコードは復元時に無視されるので、
+        # ここで電源が切れても古い状態には戻らない
+        self._journal.truncate(0)
+        os.fsync(self._journal.fileno())
+        self._journal_bytes = 0
+        self.compactions += 1
@@ -0,0 +1,88 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+タグの在否判定 for お世話ぬいぐるみプロジェクト
+読み取り結果の並びから「置かれた」「離れた」の変化だけを取り出す
+
+- 置きっぱなしのタグを何度読んでも、置かれたイベントは1回だけ
+- 離れてから NFC_DEBOUNCE_SECONDS 以内に同じタグが戻ったら、離れなかったことにする
+  (ぬいぐるみが揺れて一瞬読めなくなった時に、2回タッチしたことにならない)
+- 離れたイベントには置かれていた時間 (hold_duration) が入る
+"""
+
+import time
+from typing import Callable, NamedTuple, Optional
+import config
+
+ARRIVED = "tag_arrived"
+DEPARTED = "tag_departed"
+
+
+class TagEvent(NamedTuple):
+    """タグの置かれた・離れたイベント"""
+    kind: str              # ARRIVED / DEPARTED
+    uid: bytes
+    timestamp: float       # time.monotonic() 基準
+    hold_duration: float   # 置かれていた時間[秒] (ARRIVEDでは0.0)
+
+
+class TagPresence:
+    """1台のリーダーに置かれているタグを追跡する"""
+
+    def __init__(self, debounce: float = config.NFC_DEBOUNCE_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.debounce = debounce
+        self.clock = clock
+        self.uid: Optional[bytes] = None  # 置かれているタグ (離れ待ちを含む)
+        self.arrived_at = 0.0
+        self.lost_at: Optional[float] = None  # 読めなくなった時刻 (離れ待ち)
+        self.suppressed = 0  # 揺れとして無視した再検知の回数
+
+    @property
+    def present(self) -> bool:
+        """タグが置かれているか (離れ待ちの間も含む)"""
+        return self.uid is not None
+
+    def seen(self, uid: bytes, now: Optional[float] = None) -> tuple:
+        """タグが読めた
+
+        Returns:
+            tuple: 起きたイベント (別のタグに替わった時は DEPARTED と ARRIVED の2つ)
+        """
+        if now is None:
+            now = self.clock()
+        if uid == self.uid:
+            if self.lost_at is not None:
+                self.suppressed += 1
+            self.lost_at = None
+            return ()
+        departed = None
+        if self.uid is not None:
+            # 離れ待ちのまま別のタグが来た
+            departed = self._depart(self.lost_at if self.lost_at is not None else now)
+        self.uid = uid
+        self.arrived_at = now
+        self.lost_at = None
+        arrived = TagEvent(ARRIVED, uid, now, 0.0)
+        return (departed, arrived) if departed else (arrived,)
+
+    def lost(self, now: Optional[float] = None):
+        """タグが読めなくなった (debounce後に poll() で離れたイベントになる)"""
+        if self.uid is not None and self.lost_at is None:
+            self.lost_at = self.clock() if now is None else now
+
+    def poll(self, now: Optional[float] = None) -> Optional[TagEvent]:
+        """離れ待ちが debounce を過ぎていれば離れたイベントを返す"""
+        if self.lost_at is None:
+            return None
+        if now is None:
+            now = self.clock()
+        if now - self.lost_at < self.debounce:
+            return None
+        return self._depart(self.lost_at)
+
+    def _depart(self, lost_at: float) -> TagEvent:
+        event = TagEvent(DEPARTED, self.uid, lost_at, lost_at - self.arrived_at)
+        self.uid = None
+        self.lost_at = None
+        return event
@@ -0,0 +1,7 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+テスト for お世話ぬいぐるみプロジェクト
+
+    python -m pytest tests
+"""
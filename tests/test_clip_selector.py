@@ -0,0 +1,78 @@
+# Copyright (c) 2025 sugar310sato
+# This software is released under the MIT License, see LICENSE.
+"""
+音声選択 (clip_selector.py) のテスト
+乱数を固定して、選ばれる頻度が重みどおりか、直近の音声を避けているかを確認する
+"""
+
+import random
+from collections import Counter
+
+import pytest
+
+import config
+from clip_selector import ClipSelector
+
+CLIPS = ["a.wav", "b.wav", "c.wav", "d.wav"]
+WEIGHTS = {"a.wav": 4.0, "b.wav": 2.0, "c.wav": 1.0, "d.wav": 1.0}
+DRAWS = 80000
+
+
+def _expected(weights, clips):
+    total = sum(weights.get(c, 1.0) for c in clips)
+    return {c: weights.get(c, 1.0) / total for c in clips}
+
+
+def test_frequencies_follow_clip_weights(monkeypatch):
+    # 重みを省略すると config.CLIP_WEIGHTS を使う
+    monkeypatch.setattr(config, "CLIP_WEIGHTS", WEIGHTS)
+    selector = ClipSelector(pools={"care": CLIPS}, window=0, rng=random.Random(1))
+    counts = Counter(selector.select("care") for _ in range(DRAWS))
+    for clip, p in _expected(WEIGHTS, CLIPS).items():
+        assert counts[clip] / DRAWS == pytest.approx(p, abs=0.01), clip
+
+
+def test_unweighted_clips_default_to_one():
+    weights = {"a.wav": 3.0}
+    selector = ClipSelector(pools={"care": CLIPS}, window=0, weights=weights,
+                            rng=random.Random(2))
+    counts = Counter(selector.select("care") for _ in range(DRAWS))
+    for clip, p in _expected(weights, CLIPS).items():
+        assert counts[clip] / DRAWS == pytest.approx(p, abs=0.01), clip
+
+
+@pytest.mark.parametrize("window", [1, 2, 3])
+def test_recent_clips_are_not_repeated(window):
+    # 重みが偏っていて引き直しが続く場合も避ける
+    weights = {"a.wav": 50.0}
+    selector = ClipSelector(pools={"care": CLIPS}, window=window, weights=weights,
+                            rng=random.Random(3))
+    history = [selector.select("care") for _ in range(5000)]
+    for i, clip in enumerate(history):
+        assert clip not in history[max(0, i - window):i], (i, history[i - window:i + 1])
+    # 避けていても全部の音声が選ばれる
+    assert set(history) == set(CLIPS)
+
+
+def test_window_is_capped_by_pool_size():
+    # 候補が window 以下なら、直前の1つ以外を避けきれないので順に回る
+    selector = ClipSelector(pools={"care": ["a.wav", "b.wav"]}, window=5,
+                            rng=random.Random(4))
+    history = [selector.select("care") for _ in range(100)]
+    assert all(x != y for x, y in zip(history, history[1:]))
+
+
+def test_config_pools_respect_window():
+    selector = ClipSelector(window=config.CLIP_NO_REPEAT_WINDOW, rng=random.Random(5))
+    for care_type, clips in config.CARE_TYPE_AUDIO_FILES.items():
+        if not clips:
+            continue
+        window = min(config.CLIP_NO_REPEAT_WINDOW, len(clips) - 1)
+        history = [selector.select(care_type) for _ in range(500)]
+        for i, clip in enumerate(history):
+            assert clip not in history[max(0, i - window):i], (care_type, i)
+
+
+def test_unknown_care_type_returns_none():
+    selector = ClipSelector(pools={"care": CLIPS}, rng=random.Random(6))
+    assert selector.select("unknown") is None